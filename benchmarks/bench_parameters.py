@@ -0,0 +1,226 @@
+r"""Benchmarks of the parameter hot paths.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_parameters --output results.json
+    python -m benchmarks.bench_parameters --compare results.json
+
+Every benchmark reports the per call time (in microseconds) of the best, median and mean repeat.
+"""
+__author__ = 'antonio'
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+from picamera_attributes import simulation
+from picamera_attributes.helpers import GainController, set_gain
+from picamera_attributes.variables import ParameterSet, AWBGains, Zoom
+
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    r"""Register a benchmark. The decorated function does the setup and returns the callable to time
+    """
+    def decorator(f):
+        BENCHMARKS[name] = f
+        return f
+    return decorator
+
+
+def _param_set(**overrides):
+    params = {
+        "zoom": (0, 0, 1, 1), "iso": 100, "shutter_speed": 25000, "exposure_mode": "off",
+        "awb_mode": "off", "awb_gains": (1.8, 1.5), "brightness": 60, "contrast": 10,
+        "analog_gain": 2.0, "digital_gain": 1.0,
+    }
+    params.update(overrides)
+    param_set = ParameterSet(params)
+    param_set.validate()
+    param_set.cross_verify()
+    return param_set
+
+
+@benchmark("parameterset_default")
+def bench_parameterset_default():
+    return lambda: ParameterSet({"iso": 100}, default=True)
+
+
+@benchmark("coerce_str")
+def bench_coerce_str():
+    param = AWBGains(value=(1, 1))
+    return lambda: param.coerce("1.8,1.5")
+
+
+@benchmark("coerce_tuple")
+def bench_coerce_tuple():
+    param = Zoom(value=(0, 0, 1, 1))
+    return lambda: param.coerce((0.1, 0.1, 0.8, 0.8))
+
+
+@benchmark("urlencode_restore_qs")
+def bench_urlencode_restore_qs():
+    param_set = _param_set()
+
+    def roundtrip():
+        # parsed every time, comparable with the runs before QS_CACHE
+        ParameterSet({}).restore_qs(param_set.urlencode(), cache=False)
+
+    return roundtrip
+
+
+@benchmark("urlencode_restore_qs_cached")
+def bench_urlencode_restore_qs_cached():
+    param_set = _param_set()
+
+    def roundtrip():
+        # every call after the first is a QS_CACHE hit
+        ParameterSet({}).restore_qs(param_set.urlencode())
+
+    return roundtrip
+
+
+@benchmark("pack_restore_bytes")
+def bench_pack_restore_bytes():
+    param_set = _param_set()
+
+    def roundtrip():
+        ParameterSet({}).restore_bytes(param_set.pack())
+
+    return roundtrip
+
+
+@benchmark("parameterset_eq")
+def bench_parameterset_eq():
+    a = _param_set()
+    b = _param_set()
+    return lambda: a == b
+
+
+@benchmark("parameterset_sub")
+def bench_parameterset_sub():
+    a = _param_set(iso=200, brightness=40)
+    b = _param_set()
+    return lambda: a - b
+
+
+@benchmark("cross_verify")
+def bench_cross_verify():
+    param_set = _param_set()
+    return param_set.cross_verify
+
+
+@benchmark("update_cam_simulated")
+def bench_update_cam_simulated():
+    camera = simulation.FakeCamera(gain_delay=0)
+    camera.exposure_mode = "off"
+    sets = [_param_set(iso=100, analog_gain=2.0), _param_set(iso=200, analog_gain=3.0)]
+    state = {"i": 0}
+
+    def update_cam():
+        # alternate between two sets so every call writes to the camera
+        state["i"] ^= 1
+        sets[state["i"]].update_cam(camera)
+
+    return update_cam
+
+
+@benchmark("set_gain")
+def bench_set_gain():
+    camera = simulation.FakeCamera(gain_delay=0)
+    camera.exposure_mode = "off"
+
+    def set_gains():
+        set_gain(camera, "analog_gain", 2.0, wait=False)
+        set_gain(camera, "digital_gain", 1.5, wait=False)
+
+    return set_gains
+
+
+@benchmark("gain_controller")
+def bench_gain_controller():
+    camera = simulation.FakeCamera(gain_delay=0)
+    camera.exposure_mode = "off"
+    controller = GainController(camera)
+    return lambda: controller.set(analog=2.0, digital=1.5, wait=False)
+
+
+def run(names=None, repeat=5, min_time=0.2):
+    r"""Run the benchmarks in names (all of them if None).
+    Returns a dictionary mapping every name to its timings in microseconds per call
+    """
+    results = {}
+    with simulation.install():
+        for name, setup in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+
+            timer = timeit.Timer(setup())
+            number, _ = timer.autorange()
+            number = max(1, int(number * min_time / 0.2))
+            times = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+            results[name] = {
+                "best_us": min(times), "median_us": statistics.median(times),
+                "mean_us": statistics.mean(times), "number": number, "repeat": repeat,
+            }
+    return results
+
+
+def compare(results, baseline):
+    r"""Return a list of (name, baseline best, current best, ratio) for the benchmarks in both runs
+    """
+    rows = []
+    for name, current in results.items():
+        if name in baseline:
+            before = baseline[name]["best_us"]
+            rows.append((name, before, current["best_us"], current["best_us"] / before))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, any of {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    # logging is part of the hot path, but not what we want to read here
+    logging.disable(logging.WARNING)
+
+    results = run(args.names, repeat=args.repeat, min_time=args.min_time)
+    report = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+    for name, r in results.items():
+        print(f"{name:<28} {r['best_us']:>12.2f} us/call (median {r['median_us']:.2f})")
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)["results"]
+        print()
+        for name, before, after, ratio in compare(results, baseline):
+            print(f"{name:<28} {before:>12.2f} -> {after:>12.2f} us/call  x{ratio:.2f}")
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
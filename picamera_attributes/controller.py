@@ -0,0 +1,136 @@
+__author__ = 'antonio'
+
+import concurrent.futures
+import logging
+import threading
+
+from picamera_attributes.variables import ParameterSet
+
+
+class CameraController:
+    r"""Owns a camera in a background thread and applies the updates submitted from any other thread.
+
+        with CameraController(camera) as controller:
+            controller.submit({"brightness": 60})
+            future = controller.submit(ParameterSet({"analog_gain": 2.0}))
+            future.result()         # ApplyResult
+
+    Updates submitted while a write is in flight are merged per parameter, the newest value wins,
+    and applied together once it is done. So the camera only sees the latest requested state
+    and a burst of submits does not queue up stale writes.
+
+    state is the latest state the camera accepted: parameters that failed to apply
+    keep their previous value, so they are written again with the next update.
+
+    camera: the picamera.PiCamera() instance you are configuring
+    initial: ParameterSet with the state the camera starts in
+    """
+
+    def __init__(self, camera, initial=None):
+        self.camera = camera
+        self.state = initial.copy() if initial is not None else ParameterSet({})
+        self.applies = 0
+
+        self._known = None
+        self._pending = {}
+        self._future = None
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="CameraController", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, drain=True, timeout=None):
+        r"""Stop the thread once the write in flight is done.
+        If drain is True, the pending updates are applied first, otherwise their futures are cancelled
+        """
+        with self._condition:
+            self._stopping = True
+            if not drain and self._future is not None:
+                self._future.cancel()
+                self._pending = {}
+                self._future = None
+            self._condition.notify()
+
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def submit(self, params):
+        r"""Queue an update without blocking.
+
+        params: ParameterSet or dictionary mapping parameter names to values
+
+        Returns a concurrent.futures.Future resolved with the ApplyResult
+        of the apply that includes the update. Updates merged together share the same future
+        """
+        if not isinstance(params, ParameterSet):
+            params = ParameterSet(params)
+
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("CameraController is stopped")
+
+            self._pending.update(params.items())
+            if self._future is None:
+                self._future = concurrent.futures.Future()
+            self._condition.notify()
+            return self._future
+
+    def pending(self):
+        r"""Return a ParameterSet with the updates not yet sent to the camera
+        """
+        with self._condition:
+            return ParameterSet(dict(self._pending))
+
+    def _accepted(self, merged, result):
+        r"""Return merged with the parameters the camera refused, or that were inactive and not written,
+        back at their value in state
+        """
+        rejected = list(result.failed.keys()) + result.inactive
+        if not rejected:
+            return merged
+
+        accepted = merged.copy()
+        for k in rejected:
+            if k in self.state.keys():
+                accepted[k] = self.state[k]
+            else:
+                accepted.pop(k)
+        return accepted
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+
+                pending, self._pending = self._pending, {}
+                future, self._future = self._future, None
+
+            # once running, the future cannot be cancelled by one of the callers sharing it.
+            # If it was cancelled already, the update is still applied, nobody waits for the result
+            waited = future.set_running_or_notify_cancel()
+            try:
+                merged = self.state.merge(pending)
+                result = merged.apply(self.camera, known=self._known)
+            except Exception as e:
+                logging.error(f"Could not apply {pending}")
+                logging.error(e)
+                if waited:
+                    future.set_exception(e)
+            else:
+                self.state = self._accepted(merged, result)
+                self._known = result.state
+                self.applies += 1
+                if waited:
+                    future.set_result(result)
@@ -0,0 +1,165 @@
+r"""Versioned snapshots and deltas of a ParameterSet, to stream small updates.
+
+    sender = DeltaSender()
+    receiver = DeltaReceiver(on_gap=lambda receiver: link.send(b"snapshot please"))
+
+    message = sender.update(param_set)      # None if nothing changed
+    receiver.receive(message)
+    receiver.state                          # ParameterSet equal to param_set
+
+A message is a small header followed by a sparse record of picamera_attributes.wire:
+
+    kind            B   SNAPSHOT or DELTA
+    stream          I   random id of the sender, a restarted sender numbers its versions from 1 again
+    version         I   version of the state after applying the message
+    base_version    I   version the delta applies to (equal to version for snapshots)
+
+Deltas are computed with ParameterSet.__sub__, so they carry only the changed parameters.
+A receiver that misses a delta, joins after the first snapshot or gets a delta from another stream,
+stops applying deltas until it gets a new snapshot, and calls on_gap (at most once every gap_interval seconds)
+for every delta it cannot apply. A snapshot of another stream is always applied.
+"""
+__author__ = 'antonio'
+
+import logging
+import random
+import struct
+import time
+
+from picamera_attributes import wire
+from picamera_attributes.variables import ParameterSet
+
+
+SNAPSHOT = 0
+DELTA = 1
+
+MESSAGE_HEADER = struct.Struct("<BIII")
+
+
+def _frozen_copy(param_set):
+    # pack and unpack so later changes of the caller's parameters do not leak in
+    return wire.unpack(wire.pack(param_set, sparse=True))
+
+
+def encode(kind, stream, version, base_version, param_set):
+    return MESSAGE_HEADER.pack(kind, stream, version, base_version) + wire.pack(param_set, sparse=True)
+
+
+def decode(message):
+    r"""Return kind, stream, version, base_version and ParameterSet of a message
+    """
+    view = memoryview(message)
+    if len(view) < MESSAGE_HEADER.size:
+        raise ValueError(f"Message of {len(view)} bytes is too short")
+    kind, stream, version, base_version = MESSAGE_HEADER.unpack_from(view)
+    if kind not in (SNAPSHOT, DELTA):
+        raise ValueError(f"Unknown message kind {kind}")
+    return kind, stream, version, base_version, wire.unpack(view[MESSAGE_HEADER.size:])
+
+
+class DeltaSender:
+    r"""Turns successive ParameterSets into a stream of versioned deltas
+
+    stream: id sent with every message, random by default so every sender (and restart) gets a new one
+    """
+
+    def __init__(self, stream=None):
+        self.stream = random.getrandbits(32) if stream is None else stream
+        self.version = 0
+        self._last = None
+
+    def snapshot(self):
+        r"""Return a snapshot message with the full current state
+        """
+        state = self._last if self._last is not None else ParameterSet({})
+        return encode(SNAPSHOT, self.stream, self.version, self.version, state)
+
+    def update(self, param_set):
+        r"""Return the message taking a receiver from the previous state to param_set,
+        or None if nothing changed.
+        It is a snapshot for the first update and whenever parameters are removed.
+        Raises ValueError if param_set cannot be packed, the sender is left as it was
+        """
+        if self._last is None or not set(self._last.keys()) <= set(param_set.keys()):
+            self._last = _frozen_copy(param_set)
+            self.version += 1
+            return self.snapshot()
+
+        delta = param_set - self._last
+        if not delta.keys():
+            return None
+
+        message = encode(DELTA, self.stream, self.version + 1, self.version, delta)
+        self._last = _frozen_copy(param_set)
+        self.version += 1
+        return message
+
+
+class DeltaReceiver:
+    r"""Applies the messages of a DeltaSender in order.
+
+    on_gap: called with the receiver when a delta does not apply to the current version,
+        or arrives before any snapshot, i.e. to ask the sender for a snapshot
+    gap_interval: minimum number of seconds between two calls to on_gap
+    """
+
+    def __init__(self, on_gap=None, gap_interval=1.0):
+        self.stream = None
+        self.version = None
+        self.state = None
+        self.needs_snapshot = True
+        self.on_gap = on_gap
+        self.gap_interval = gap_interval
+        self._gap_reported = None
+
+    def _report_gap(self):
+        if self.on_gap is None:
+            return
+        now = time.monotonic()
+        if self._gap_reported is not None and now - self._gap_reported < self.gap_interval:
+            return
+        self._gap_reported = now
+        self.on_gap(self)
+
+    def receive(self, message):
+        r"""Apply a message. Returns True if the state changed
+        """
+        kind, stream, version, base_version, param_set = decode(message)
+
+        if kind == SNAPSHOT:
+            if stream == self.stream and version < self.version:
+                logging.debug(f"Ignoring snapshot {version}, already at {self.version}")
+                return False
+            self.stream = stream
+            self.state = param_set
+            self.version = version
+            self.needs_snapshot = False
+            self._gap_reported = None
+            return True
+
+        if self.needs_snapshot:
+            # the delta has no base to apply to, ask again in case the snapshot was lost
+            self._report_gap()
+            return False
+
+        if stream != self.stream:
+            # the sender restarted, its versions do not follow ours
+            logging.warning(f"Delta {version} belongs to stream {stream}, not {self.stream}")
+            self.needs_snapshot = True
+            self._report_gap()
+            return False
+
+        if base_version != self.version:
+            if version <= self.version:
+                logging.debug(f"Ignoring old delta {version}, already at {self.version}")
+                return False
+
+            logging.warning(f"Missed deltas between versions {self.version} and {base_version}")
+            self.needs_snapshot = True
+            self._report_gap()
+            return False
+
+        for k, p in param_set.items():
+            self.state[k] = p
+        self.version = version
+        return True
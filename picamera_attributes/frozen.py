@@ -0,0 +1,182 @@
+__author__ = 'antonio'
+
+import logging
+
+from picamera_attributes.variables import CameraParameter, ParameterSet, supported
+
+
+class FrozenParameterSet:
+    r"""Immutable and hashable version of a ParameterSet, to key caches by configuration.
+
+        frozen = param_set.freeze()
+        plans[frozen] = expensive_plan(param_set)
+        brighter = frozen.replace({"brightness": 60})     # shares the other parameters with frozen
+        brighter.thaw().update_cam(camera)
+
+    Every parameter is kept as its validated value and whether it is active,
+    so equal sets hash equal whatever instances they were built from.
+    The hash and the wire encoding are computed once, on first use.
+
+    params: ParameterSet, or dictionary mapping names to parameters or raw values
+    """
+
+    __slots__ = ("_entries", "_hash", "_packed")
+
+    _supported = supported
+
+    def __init__(self, params):
+        if isinstance(params, FrozenParameterSet):
+            entries = params._entries
+        else:
+            if not isinstance(params, ParameterSet):
+                params = ParameterSet(params)
+            entries = {k: (p.machine(), p._active) for k, p in params.items()}
+
+        object.__setattr__(self, "_entries", entries)
+        object.__setattr__(self, "_hash", None)
+        object.__setattr__(self, "_packed", None)
+
+    @classmethod
+    def _from_entries(cls, entries):
+        frozen = cls.__new__(cls)
+        object.__setattr__(frozen, "_entries", entries)
+        object.__setattr__(frozen, "_hash", None)
+        object.__setattr__(frozen, "_packed", None)
+        return frozen
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    # mapping
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def keys(self):
+        return self._entries.keys()
+
+    def __getitem__(self, name):
+        r"""Return a new instance of the parameter, changing it does not change the set
+        """
+        value, active = self._entries[name]
+        return self._supported[name]._restore(value, active=active)
+
+    def items(self):
+        for k in self._entries:
+            yield k, self[k]
+
+    def values(self):
+        for k in self._entries:
+            yield self[k]
+
+    def value(self, name):
+        r"""Return the machine value of a parameter, without creating an instance
+        """
+        return self._entries[name][0]
+
+    def is_active(self, name):
+        return self._entries[name][1]
+
+    def as_dict(self):
+        return {k: p.val for k, p in self.items()}
+
+    # new versions
+
+    def replace(self, params):
+        r"""Return a new FrozenParameterSet with some parameters changed or added.
+        The parameters not in params are shared with this set.
+        As in ParameterSet.merge, every parameter is active again and dependencies are cross verified from scratch,
+        so a parameter deactivated by a dependency comes back once the dependency is met
+
+        params: dictionary mapping names to parameters or raw values
+        """
+        entries = {k: e if e[1] else (e[0], True) for k, e in self._entries.items()}
+        for k, p in params.items():
+            if k not in self._supported.keys():
+                raise KeyError(f"Parameter {k} not supported")
+            if isinstance(p, CameraParameter):
+                if not isinstance(p, self._supported[k]):
+                    raise TypeError(f"{k} must be a {self._supported[k].__name__}, not a {p.__class__.__name__}")
+            else:
+                p = self._supported[k](value=p)
+                p.validate()
+            entries[k] = (p.machine(), True)
+
+        entries = self._cross_verify(entries)
+        # the entries that end up as they were stay shared with this set
+        for k, e in self._entries.items():
+            if entries[k] == e:
+                entries[k] = e
+        return self._from_entries(entries)
+
+    @classmethod
+    def _cross_verify(cls, entries):
+        r"""Deactivate the entries whose dependencies are not met
+        """
+        for k, (value, active) in entries.items():
+            depends_on = cls._supported[k]._depends_on
+            if not active or depends_on is None:
+                continue
+            if not all(d in entries and entries[d][0] == v for d, v in depends_on.items()):
+                logging.info(f"Parameter {k} cross verification failed")
+                entries[k] = (value, False)
+        return entries
+
+    def without(self, *names):
+        r"""Return a new FrozenParameterSet without the parameters in names
+        """
+        return self._from_entries({k: e for k, e in self._entries.items() if k not in names})
+
+    def thaw(self):
+        r"""Return a mutable ParameterSet with its own parameter instances
+        """
+        return ParameterSet({k: self[k] for k in self._entries})
+
+    def pack(self):
+        r"""Encode the set in the binary format of picamera_attributes.wire, once
+        """
+        if self._packed is None:
+            from picamera_attributes import wire
+            object.__setattr__(self, "_packed", wire.pack(self))
+        return self._packed
+
+    @property
+    def params(self):
+        # read by picamera_attributes.wire
+        return dict(self.items())
+
+    # comparison
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(frozenset(self._entries.items())))
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenParameterSet):
+            if self is other:
+                return True
+            if self._hash is not None and other._hash is not None and self._hash != other._hash:
+                return False
+            return self._entries == other._entries
+        if isinstance(other, ParameterSet):
+            return self._entries == FrozenParameterSet(other)._entries
+        return NotImplemented
+
+    def __str__(self):
+        return f"FrozenParameterSet({self.as_dict()})"
+
+    def __repr__(self):
+        return self.__str__()
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self.items()), ))
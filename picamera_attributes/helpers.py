@@ -1,46 +1,216 @@
+import asyncio
+import math
 import time
 import logging
 logging.basicConfig(level=logging.INFO)
+from picamera_attributes.metrics import METRICS
+from picamera_attributes.state import CameraState, read_attribute
 
 
+GAIN_TOLERANCE = 0.05
+GAIN_TIMEOUT = 2.0
+GAIN_POLL_INTERVAL = 0.05
 
-def set_gain(camera, gain, value):
-    """Set the analog gain of a PiCamera.
-    
-    camera: the picamera.PiCamera() instance you are configuring
-    gain: either MMAL_PARAMETER_ANALOG_GAIN or MMAL_PARAMETER_DIGITAL_GAIN
-    value: a numeric value that can be converted to a rational number.
+# MMAL parameter ids of the gains, as offsets from picamera.mmal.MMAL_PARAMETER_GROUP_CAMERA,
+# they are not exported by picamera.mmal.
+# keys must match the _name attribute of the corresponding class
+SENSOR_GAINS = {
+    "analog_gain": 0x59,
+    "digital_gain": 0x5A,
+}
+
+
+def _check_status(ret):
+    """Raise PiCameraMMALError if the status returned by an MMAL call is not a success
+    """
+    if ret == 0:
+        return
+    # lazy loading so node does not complain
+    from picamera import exc
+    if ret == 4:
+        raise exc.PiCameraMMALError(ret, "Are you running the latest version of the userland libraries? Gain setting was introduced in late 2017.")
+    raise exc.PiCameraMMALError(ret)
+
+
+def _write_gain(camera, gain, value):
+    """Send the new gain to the camera control port without waiting for it to apply.
     """
     # lazy loading so node does not complain
-    from picamera import mmal, mmalobj, exc
+    from picamera import mmal
     from picamera.mmalobj import to_rational
-    
-    
-    # keys must match the _name attribute of the corresponding class
-    SENSOR_GAINS = {
-        "analog_gain": mmal.MMAL_PARAMETER_GROUP_CAMERA + 0x59,
-        "digital_gain": mmal.MMAL_PARAMETER_GROUP_CAMERA + 0x5A
-    }
-    ##
-    logging.info(f"Setting {gain} to {value}")
-
-    if gain not in ["analog_gain", "digital_gain"]:
+
+    logging.debug(f"Setting {gain} to {value}")
+
+    if gain not in SENSOR_GAINS:
         raise ValueError("The gain parameter was not valid")
 
-    gain_int = SENSOR_GAINS[gain]
+    gain_int = mmal.MMAL_PARAMETER_GROUP_CAMERA + SENSOR_GAINS[gain]
     rational_value = to_rational(value)
     port = camera._camera.control._port
 
-    logging.warning(gain_int)
-    logging.warning(rational_value)
-    logging.warning(port)
+    logging.debug(f"{gain_int} {rational_value} {port}")
+
+    _check_status(mmal.mmal_port_parameter_set_rational(port, gain_int, rational_value))
+
+    # the gain was not written through the PiCamera property,
+    # so any cached readback is stale
+    if isinstance(camera, CameraState):
+        camera.invalidate(gain)
+
+
+def _gains_reached(camera, targets, tolerance):
+    r"""Return True if every gain read back from the camera is within tolerance of its target
+    """
+    for gain, value in targets.items():
+        current = float(read_attribute(camera, gain))
+        if not math.isclose(current, float(value), rel_tol=tolerance, abs_tol=tolerance):
+            return False
+    return True
+
+
+def _record_settle(targets, start, reached):
+    if not METRICS.enabled:
+        return
+    elapsed = time.monotonic() - start
+    for gain in targets:
+        METRICS.observe("settle_seconds", gain, elapsed)
+        if not reached:
+            METRICS.increment("settle_timeouts_total", gain)
+
+
+def _poll_gains(camera, targets, tolerance, timeout, poll_interval):
+    r"""Poll loop shared by wait_for_gains and wait_for_gains_async.
+    Yields the seconds to sleep before the next readback and returns True if all gains converged before the timeout
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    while not _gains_reached(camera, targets, tolerance):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.warning(f"Gains did not reach {targets} within {timeout} seconds")
+            _record_settle(targets, start, False)
+            return False
+        yield min(poll_interval, remaining)
+
+    _record_settle(targets, start, True)
+    return True
+
+
+def wait_for_gains(camera, targets, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+    """Block until the gains read back from the camera match their targets.
+
+    camera: the picamera.PiCamera() instance you are configuring
+    targets: a dictionary mapping analog_gain / digital_gain to the expected value
+    tolerance: relative (and absolute) difference accepted between readback and target
+    timeout: maximum number of seconds to wait
+    poll_interval: seconds between two readbacks
+
+    Returns True if all gains converged before the timeout, False otherwise.
+    """
+    poll = _poll_gains(camera, targets, tolerance, timeout, poll_interval)
+    try:
+        while True:
+            time.sleep(next(poll))
+    except StopIteration as done:
+        return done.value
+
 
-    ret = mmal.mmal_port_parameter_set_rational(port, gain_int, rational_value)
+async def wait_for_gains_async(camera, targets, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+    """Awaitable version of wait_for_gains. Yields to the event loop between readbacks.
+    """
+    poll = _poll_gains(camera, targets, tolerance, timeout, poll_interval)
+    try:
+        while True:
+            await asyncio.sleep(next(poll))
+    except StopIteration as done:
+        return done.value
+
+
+def set_gain(camera, gain, value, wait=True, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+    """Set the analog gain of a PiCamera.
+
+    camera: the picamera.PiCamera() instance you are configuring
+    gain: either MMAL_PARAMETER_ANALOG_GAIN or MMAL_PARAMETER_DIGITAL_GAIN
+    value: a numeric value that can be converted to a rational number.
+    wait: if True, return only once the camera reports the new value (or timeout expires)
+
+    Returns True if the new gain was read back from the camera (always True if wait is False).
+    """
+    _write_gain(camera, gain, value)
     # PLEASE NOTE
     # if queried now, it will still show the old value
-    time.sleep(2)
+    if wait:
+        return wait_for_gains(camera, {gain: value}, tolerance=tolerance, timeout=timeout, poll_interval=poll_interval)
+    return True
 
-    if ret == 4:
-        raise exc.PiCameraMMALError(ret, "Are you running the latest version of the userland libraries? Gain setting was introduced in late 2017.")
-    elif ret != 0:
-        raise exc.PiCameraMMALError(ret)
+
+async def set_gain_async(camera, gain, value, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+    """Awaitable version of set_gain.
+
+    The write itself is a single MMAL call, the wait for the new value is done without blocking the event loop.
+    """
+    _write_gain(camera, gain, value)
+    return await wait_for_gains_async(camera, {gain: value}, tolerance=tolerance, timeout=timeout, poll_interval=poll_interval)
+
+
+class GainController:
+    """Set the gains of a PiCamera repeatedly, i.e. in a closed loop brightness control.
+
+    The MMAL modules, parameter ids and control port are resolved once, here,
+    instead of in every set_gain call.
+
+    camera: the picamera.PiCamera() instance you are configuring
+    tolerance, timeout, poll_interval: passed to wait_for_gains
+    """
+
+    def __init__(self, camera, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+        # lazy loading so node does not complain
+        from picamera import mmal
+        from picamera.mmalobj import to_rational
+
+        self.camera = camera
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        self._set_rational = mmal.mmal_port_parameter_set_rational
+        self._to_rational = to_rational
+        self._port = camera._camera.control._port
+        self._ids = {gain: mmal.MMAL_PARAMETER_GROUP_CAMERA + offset for gain, offset in SENSOR_GAINS.items()}
+        self._invalidate = isinstance(camera, CameraState)
+
+    def write(self, analog=None, digital=None):
+        """Send the gains that are not None to the camera without waiting for them to apply.
+
+        Returns a dictionary mapping analog_gain / digital_gain to the value written
+        """
+        targets = {}
+        if analog is not None:
+            targets["analog_gain"] = analog
+        if digital is not None:
+            targets["digital_gain"] = digital
+
+        for gain, value in targets.items():
+            _check_status(self._set_rational(self._port, self._ids[gain], self._to_rational(value)))
+            if self._invalidate:
+                self.camera.invalidate(gain)
+
+        return targets
+
+    def set(self, analog=None, digital=None, wait=True):
+        """Set the analog and / or digital gain, with a single wait for both.
+
+        Returns True if the new gains were read back from the camera (always True if wait is False).
+        """
+        targets = self.write(analog=analog, digital=digital)
+        if wait and targets:
+            return wait_for_gains(self.camera, targets, tolerance=self.tolerance, timeout=self.timeout, poll_interval=self.poll_interval)
+        return True
+
+    async def set_async(self, analog=None, digital=None):
+        """Awaitable version of set.
+        """
+        targets = self.write(analog=analog, digital=digital)
+        if not targets:
+            return True
+        return await wait_for_gains_async(self.camera, targets, tolerance=self.tolerance, timeout=self.timeout, poll_interval=self.poll_interval)
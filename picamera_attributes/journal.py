@@ -0,0 +1,229 @@
+r"""Append-only history of the ParameterSets applied to a camera.
+
+    journal = Journal("camera0.journal")
+    param_set.update_cam(camera, journal=journal)
+
+    journal.at(time.time() - 3600)      # last set applied at or before one hour ago
+    for timestamp, param_set in journal.between(start, end):
+        ...
+
+Two files are written side by side:
+
+    path        entries of ENTRY (length of the record, timestamp) followed by
+                a sparse record of picamera_attributes.wire
+    path.idx    INDEX records (timestamp, offset of the entry in path), one per entry
+
+Both are only ever appended to, and read through mmap,
+so looking a time up is a binary search over the index that does not load the journal.
+The index is written after its entry, so it never points to an incomplete one.
+Timestamps must not decrease: if the clock steps back (i.e. an NTP adjustment),
+entries stamped with the current time get the timestamp of the last entry instead.
+
+Every entry is the ParameterSet passed to one update_cam, which may hold only some parameters.
+The journal does not merge them, so at(T) is the last set applied, not the whole state of the camera at T.
+"""
+__author__ = 'antonio'
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+import time
+
+from picamera_attributes import wire
+
+
+ENTRY = struct.Struct("<Id")
+INDEX = struct.Struct("<dQ")
+
+
+class _Timestamps:
+    r"""Sequence of the timestamps in an index, for bisect
+    """
+
+    def __init__(self, index, length):
+        self.index = index
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        return INDEX.unpack_from(self.index, i * INDEX.size)[0]
+
+
+class Journal:
+    r"""
+    path: journal file, created if it does not exist
+    sync: if True, every append is flushed to disk with os.fsync
+    """
+
+    def __init__(self, path, sync=False):
+        self.path = path
+        self.index_path = f"{path}.idx"
+        self.sync = sync
+
+        self._data = open(path, "ab+")
+        self._index = open(self.index_path, "ab+")
+        self._data_map = None
+        self._index_map = None
+        self._recover()
+
+        self._length = os.fstat(self._index.fileno()).st_size // INDEX.size
+        self._last = self.timestamp(-1) if self._length else None
+
+    def _recover(self):
+        # drop whatever a crash left after the last complete index record and its entry
+        index_size = os.fstat(self._index.fileno()).st_size
+        if index_size % INDEX.size:
+            index_size -= index_size % INDEX.size
+            self._index.truncate(index_size)
+
+        data_size = os.fstat(self._data.fileno()).st_size
+        end = 0
+        while index_size:
+            self._index.seek(index_size - INDEX.size)
+            _, offset = INDEX.unpack(self._index.read(INDEX.size))
+            if offset + ENTRY.size <= data_size:
+                self._data.seek(offset)
+                length, _ = ENTRY.unpack(self._data.read(ENTRY.size))
+                end = offset + ENTRY.size + length
+                if end <= data_size:
+                    break
+            # the entry it points to is incomplete
+            index_size -= INDEX.size
+            self._index.truncate(index_size)
+            end = 0
+
+        if data_size > end:
+            self._data.truncate(end)
+
+    def append(self, param_set, timestamp=None):
+        r"""Add param_set to the journal, at timestamp (now by default).
+        Returns the position of the new entry.
+        Raises ValueError if timestamp is older than the last entry
+        """
+        if timestamp is None:
+            timestamp = time.time()
+            if self._last is not None and timestamp < self._last:
+                logging.warning(f"Clock stepped back {self._last - timestamp:.6f} seconds, journal entry stamped at {self._last}")
+                timestamp = self._last
+        elif self._last is not None and timestamp < self._last:
+            raise ValueError(f"Timestamp {timestamp} is older than the last entry {self._last}")
+
+        record = wire.pack(param_set, sparse=True)
+        offset = self._data.seek(0, os.SEEK_END)
+        self._data.write(ENTRY.pack(len(record), timestamp) + record)
+        self._data.flush()
+        if self.sync:
+            os.fsync(self._data.fileno())
+
+        self._index.write(INDEX.pack(timestamp, offset))
+        self._index.flush()
+        if self.sync:
+            os.fsync(self._index.fileno())
+
+        self._length += 1
+        self._last = timestamp
+        return self._length - 1
+
+    def close(self):
+        for m in (self._data_map, self._index_map):
+            try:
+                if m is not None:
+                    m.close()
+            except BufferError:
+                # a WireView still points into it
+                pass
+        self._data_map = self._index_map = None
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # reading
+
+    def _maps(self):
+        r"""Return the memory maps of the index and the data, mapped again if the files grew
+        """
+        if self._index_map is None or len(self._index_map) < self._length * INDEX.size:
+            # the old maps are closed once no WireView points into them
+            self._index_map = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+            self._data_map = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._index_map, self._data_map
+
+    def __len__(self):
+        return self._length
+
+    def _position(self, i):
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError(f"Entry {i} out of a journal of {self._length} entries")
+        return i
+
+    def timestamp(self, i):
+        i = self._position(i)
+        index, _ = self._maps()
+        return INDEX.unpack_from(index, i * INDEX.size)[0]
+
+    def view(self, i):
+        r"""Return the timestamp and a wire.WireView of the i-th entry, without decoding it
+        """
+        i = self._position(i)
+        index, data = self._maps()
+        timestamp, offset = INDEX.unpack_from(index, i * INDEX.size)
+        length, _ = ENTRY.unpack_from(data, offset)
+        start = offset + ENTRY.size
+        return timestamp, wire.WireView(memoryview(data)[start:start + length])
+
+    def __getitem__(self, i):
+        r"""Return the timestamp and the ParameterSet of the i-th entry
+        """
+        timestamp, view = self.view(i)
+        return timestamp, view.to_set()
+
+    def __iter__(self):
+        for i in range(self._length):
+            yield self[i]
+
+    def find(self, timestamp):
+        r"""Return the position of the last entry written at or before timestamp, -1 if there is none
+        """
+        if not self._length:
+            return -1
+        index, _ = self._maps()
+        return bisect.bisect_right(_Timestamps(index, self._length), timestamp) - 1
+
+    def at(self, timestamp):
+        r"""Return the last ParameterSet applied at or before timestamp, None if the journal starts later.
+        It holds the parameters of that update_cam only,
+        the parameters set by earlier entries are not merged in
+        """
+        i = self.find(timestamp)
+        if i < 0:
+            return None
+        return self[i][1]
+
+    def between(self, start, end):
+        r"""Yield the timestamp and ParameterSet of the entries written from start (included) to end (excluded)
+        """
+        if not self._length:
+            return
+        index, _ = self._maps()
+        timestamps = _Timestamps(index, self._length)
+        first = bisect.bisect_left(timestamps, start)
+        last = bisect.bisect_left(timestamps, end)
+        for i in range(first, last):
+            yield self[i]
+
+    def __str__(self):
+        return f"Journal({self.path}, {self._length} entries)"
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,153 @@
+r"""Per parameter counters and latency histograms of the reads and writes to the camera.
+
+    from picamera_attributes.metrics import METRICS
+
+    param_set.update_cam(camera)
+    METRICS.snapshot()["write_seconds"]["iso"]["count"]
+    print(METRICS.prometheus())
+
+The hooks in CameraParameter.set, _get, Plural.set, ParameterSet.update_cam / apply
+and the gain helpers record into METRICS. Set METRICS.enabled = False to turn them off.
+"""
+__author__ = 'antonio'
+
+import bisect
+import math
+import threading
+
+
+# seconds, from a cached attribute to a gain that takes a few frames to settle
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HISTOGRAMS = {
+    "write_seconds": "Seconds taken to write a parameter to the camera",
+    "read_seconds": "Seconds taken to read a parameter back from the camera",
+    "settle_seconds": "Seconds waited for a written gain to be reported by the camera",
+    "update_cam_seconds": "Seconds taken by ParameterSet.update_cam and ParameterSet.apply",
+}
+
+COUNTERS = {
+    "skipped_total": "Writes skipped because the camera already held the value",
+    "write_failures_total": "Writes that raised",
+    "read_failures_total": "Reads that raised",
+    "settle_timeouts_total": "Gains not reported by the camera before the timeout",
+}
+
+
+class Histogram:
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # the last count is for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        r"""Return a list of (upper bound, number of values up to it), as in the Prometheus format
+        """
+        result = []
+        total = 0
+        for bound, n in zip(self.buckets + (math.inf, ), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+    def as_dict(self):
+        return {
+            "count": self.count, "sum": self.sum,
+            "buckets": {_format_bound(b): n for b, n in self.cumulative()},
+        }
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == math.inf else repr(bound)
+
+
+class Metrics:
+    r"""Thread safe registry of the histograms and counters, labelled by parameter name
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.enabled = True
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {k: {} for k in HISTOGRAMS}
+            self._counters = {k: {} for k in COUNTERS}
+
+    def observe(self, metric, name, seconds):
+        with self._lock:
+            histograms = self._histograms[metric]
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, metric, name, n=1):
+        with self._lock:
+            counters = self._counters[metric]
+            counters[name] = counters.get(name, 0) + n
+
+    # shortcuts used by the hooks
+
+    def write(self, name, seconds):
+        self.observe("write_seconds", name, seconds)
+
+    def read(self, name, seconds):
+        self.observe("read_seconds", name, seconds)
+
+    def skipped(self, name):
+        self.increment("skipped_total", name)
+
+    def failed(self, name, kind="write"):
+        self.increment(f"{kind}_failures_total", name)
+
+    def snapshot(self):
+        r"""Return a plain dictionary with the current value of every metric
+        """
+        with self._lock:
+            result = {
+                metric: {name: h.as_dict() for name, h in histograms.items()}
+                for metric, histograms in self._histograms.items()
+            }
+            result.update({metric: dict(counters) for metric, counters in self._counters.items()})
+        return result
+
+    def prometheus(self, prefix="picamera_attributes"):
+        r"""Return the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        with self._lock:
+            for metric, histograms in self._histograms.items():
+                full = f"{prefix}_{metric}"
+                lines.append(f"# HELP {full} {HISTOGRAMS[metric]}")
+                lines.append(f"# TYPE {full} histogram")
+                for name, histogram in histograms.items():
+                    label = f'parameter="{name}",'
+                    for bound, n in histogram.cumulative():
+                        lines.append(f'{full}_bucket{{{label}le="{_format_bound(bound)}"}} {n}')
+                    lines.append(f"{full}_sum{{{label[:-1]}}} {histogram.sum!r}")
+                    lines.append(f"{full}_count{{{label[:-1]}}} {histogram.count}")
+
+            for metric, counters in self._counters.items():
+                full = f"{prefix}_{metric}"
+                lines.append(f"# HELP {full} {COUNTERS[metric]}")
+                lines.append(f"# TYPE {full} counter")
+                for name, n in counters.items():
+                    lines.append(f'{full}{{parameter="{name}"}} {n}')
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
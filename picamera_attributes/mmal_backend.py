@@ -0,0 +1,149 @@
+r"""Write whole ParameterSets to the camera control port with direct MMAL calls.
+
+    backend = MMALBackend(camera)
+    result = backend.apply(param_set)       # an ApplyResult, as ParameterSet.apply
+
+helpers.set_gain does this for the gains only. MMALBackend does it for every parameter
+in MMAL_PARAMETERS: ParameterSet.apply writes the set with MMALBackend.write_param,
+which makes one precomputed MMAL call per parameter, without the reads and checks
+that PiCamera and CameraParameter.set do for every property.
+The gains are written without waiting, and a single wait covers all of them.
+
+The parameters in FALLBACK change the configuration of the ports rather than a control parameter,
+so they are still written through the PiCamera property. Writing any other parameter raises KeyError.
+"""
+__author__ = 'antonio'
+
+import ctypes as ct
+
+from picamera_attributes.helpers import SENSOR_GAINS, GAIN_TOLERANCE, GAIN_TIMEOUT, GAIN_POLL_INTERVAL, _check_status
+from picamera_attributes.state import CameraState
+from picamera_attributes.variables import ParameterSet
+
+
+# name of the parameter -> (picamera.mmal constant with its MMAL parameter id, encoding)
+MMAL_PARAMETERS = {
+    "awb_mode": ("MMAL_PARAMETER_AWB_MODE", "awb_mode"),
+    "exposure_mode": ("MMAL_PARAMETER_EXPOSURE_MODE", "exposure_mode"),
+    "exposure_compensation": ("MMAL_PARAMETER_EXPOSURE_COMP", "int32"),
+    "iso": ("MMAL_PARAMETER_ISO", "uint32"),
+    "shutter_speed": ("MMAL_PARAMETER_SHUTTER_SPEED", "uint32"),
+    "brightness": ("MMAL_PARAMETER_BRIGHTNESS", "percent"),
+    "sharpness": ("MMAL_PARAMETER_SHARPNESS", "percent"),
+    "contrast": ("MMAL_PARAMETER_CONTRAST", "percent"),
+    "saturation": ("MMAL_PARAMETER_SATURATION", "percent"),
+    "awb_gains": ("MMAL_PARAMETER_CUSTOM_AWB_GAINS", "awb_gains"),
+    "zoom": ("MMAL_PARAMETER_INPUT_CROP", "crop"),
+    # offsets from MMAL_PARAMETER_GROUP_CAMERA, not exported by picamera.mmal
+    "analog_gain": (SENSOR_GAINS["analog_gain"], "rational"),
+    "digital_gain": (SENSOR_GAINS["digital_gain"], "rational"),
+}
+
+# written with setattr, PiCamera reconfigures the ports for them
+FALLBACK = ("rotation", "framerate", "resolution", "color_effects")
+
+
+def _encoders(mmal, to_rational):
+    r"""Map every encoding in MMAL_PARAMETERS to a function building the MMAL call
+    of a parameter id. The call takes the port and the machine value and returns the MMAL status
+    """
+
+    def scalar(function, convert):
+        def encoder(param_id):
+            return lambda port, value: function(port, param_id, convert(value))
+        return encoder
+
+    def struct(struct_class, fields):
+        def encoder(param_id):
+            size = ct.sizeof(struct_class)
+            def call(port, value):
+                mp = struct_class(mmal.MMAL_PARAMETER_HEADER_T(param_id, size), *fields(value))
+                return mmal.mmal_port_parameter_set(port, mp.hdr)
+            return call
+        return encoder
+
+    def mode(prefix):
+        return lambda value: (getattr(mmal, f"{prefix}{value.upper()}"), )
+
+    def crop(value):
+        x, y, w, h = (max(0, min(65535, int(65535 * c))) for c in value)
+        return (mmal.MMAL_RECT_T(x, y, w, h), )
+
+    return {
+        "int32": scalar(mmal.mmal_port_parameter_set_int32, int),
+        "uint32": scalar(mmal.mmal_port_parameter_set_uint32, int),
+        "rational": scalar(mmal.mmal_port_parameter_set_rational, to_rational),
+        "percent": scalar(mmal.mmal_port_parameter_set_rational, lambda v: mmal.MMAL_RATIONAL_T(int(v), 100)),
+        "exposure_mode": struct(mmal.MMAL_PARAMETER_EXPOSUREMODE_T, mode("MMAL_PARAM_EXPOSUREMODE_")),
+        "awb_mode": struct(mmal.MMAL_PARAMETER_AWBMODE_T, mode("MMAL_PARAM_AWBMODE_")),
+        "awb_gains": struct(mmal.MMAL_PARAMETER_AWB_GAINS_T, lambda v: (to_rational(v[0]), to_rational(v[1]))),
+        "crop": struct(mmal.MMAL_PARAMETER_INPUT_CROP_T, crop),
+    }
+
+
+class MMALBackend:
+    r"""
+    camera: the picamera.PiCamera() instance you are configuring (or a CameraState wrapping it)
+    tolerance, timeout, poll_interval: passed to wait_for_gains
+
+    The MMAL calls of every parameter are built once, here
+    """
+
+    def __init__(self, camera, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+        # lazy loading so node does not complain
+        from picamera import mmal
+        from picamera.mmalobj import to_rational
+
+        self.camera = camera
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._port = camera._camera.control._port
+
+        encoders = _encoders(mmal, to_rational)
+        self._calls = {}
+        for name, (constant, encoding) in MMAL_PARAMETERS.items():
+            if isinstance(constant, str):
+                param_id = getattr(mmal, constant)
+            else:
+                param_id = mmal.MMAL_PARAMETER_GROUP_CAMERA + constant
+            self._calls[name] = encoders[encoding](param_id)
+
+    def write(self, name, value):
+        r"""Write one machine value to the camera, raises PiCameraMMALError if MMAL refuses it
+        and KeyError if name is neither in MMAL_PARAMETERS nor in FALLBACK
+        """
+        call = self._calls.get(name)
+        if call is None:
+            if name not in FALLBACK:
+                raise KeyError(f"Parameter {name} cannot be written by MMALBackend")
+            setattr(self.camera, name, value)
+            return
+
+        _check_status(call(self._port, value))
+
+        # written behind the back of the PiCamera properties
+        if isinstance(self.camera, CameraState):
+            self.camera.invalidate(name)
+
+    def write_param(self, param, camera=None, **kwargs):
+        r"""Writer for ParameterSet.apply. Gains are never waited for here, apply waits for all of them once
+        """
+        self.write(param._name, param.machine())
+
+    def apply(self, param_set, known=None, wait=True):
+        r"""Write the active parameters of param_set to the camera, with ParameterSet.apply.
+
+        param_set: ParameterSet
+        known: ParameterSet with the values the camera currently holds, the parameters equal to it are skipped.
+            If None, every active parameter is written, the camera is not read
+        wait: if True, return once the camera reports the written gains (or the timeout expires)
+
+        Returns an ApplyResult
+        """
+        if known is None:
+            known = ParameterSet({})
+        return param_set.apply(
+            self.camera, known=known, writer=self.write_param, wait=wait,
+            tolerance=self.tolerance, timeout=self.timeout, poll_interval=self.poll_interval
+        )
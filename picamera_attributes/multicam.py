@@ -0,0 +1,91 @@
+__author__ = 'antonio'
+
+import concurrent.futures
+import logging
+import time
+
+
+class MultiApplyResult:
+    r"""Outcome of apply_many
+
+    results: dictionary mapping every camera that finished to its ApplyResult
+    errors: dictionary mapping every camera whose apply raised to the exception
+    timed_out: cameras that did not finish within the timeout. Their apply keeps running in the background
+    elapsed: seconds apply_many took
+    """
+
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.timed_out = []
+        self.elapsed = 0.0
+
+    @property
+    def failed(self):
+        r"""Cameras that raised, timed out, or failed to set some parameter
+        """
+        failed = list(self.errors.keys()) + list(self.timed_out)
+        failed += [k for k, r in self.results.items() if not r.ok]
+        return failed
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def __str__(self):
+        return f"MultiApplyResult(done={list(self.results.keys())}, errors={list(self.errors.keys())}, timed_out={self.timed_out}, elapsed={self.elapsed:.4f})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def apply_many(cameras, param_set, known=None, timeout=None, max_workers=None):
+    r"""Apply the same ParameterSet to several cameras at once, one thread per camera.
+    The MMAL calls and the waits for the gains to settle release the GIL,
+    so it takes as long as the slowest camera and not the sum of all of them.
+
+    cameras: dictionary mapping a name to a picamera.PiCamera() instance, or a list of them
+        (then the names are their positions in the list)
+    param_set: ParameterSet to apply
+    known: dictionary mapping names to the ParameterSet each camera holds, see ParameterSet.apply
+    timeout: seconds to wait for all the cameras, None to wait for as long as it takes
+    max_workers: number of threads, one per camera by default
+
+    Returns a MultiApplyResult
+    """
+    if not isinstance(cameras, dict):
+        cameras = dict(enumerate(cameras))
+    known = known or {}
+
+    result = MultiApplyResult()
+    if not cameras:
+        return result
+
+    start = time.perf_counter()
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers or len(cameras), thread_name_prefix="apply_many"
+    )
+    try:
+        futures = {
+            executor.submit(param_set.apply, camera, known=known.get(name)): name
+            for name, camera in cameras.items()
+        }
+        done, _ = concurrent.futures.wait(futures, timeout=timeout)
+
+        for future, name in futures.items():
+            if future not in done:
+                logging.warning(f"Camera {name} did not finish within {timeout} seconds")
+                result.timed_out.append(name)
+                continue
+            try:
+                result.results[name] = future.result()
+            except Exception as e:
+                logging.error(f"Could not apply {param_set} to camera {name}")
+                logging.error(e)
+                result.errors[name] = e
+    finally:
+        # do not block on the cameras that timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,207 @@
+r"""Replay a recorded history of ParameterSets against a camera.
+
+    history = Journal("camera0.journal")              # or any iterable of (timestamp, ParameterSet)
+    report = Replay(camera, history, speed=10).run()
+    print(report)
+
+speed is 1 to replay at the original pace, N to replay N times faster
+and None to write every state as soon as the previous one is done.
+
+When paced, a state is collapsed into the next one (merged with ParameterSet.merge)
+if the next one is due within settle seconds of the time the state would be written,
+either because the two are close in the history or because the replay is running late.
+"""
+__author__ = 'antonio'
+
+import logging
+import os
+import pickle
+import time
+
+from picamera_attributes.variables import ParameterSet
+
+
+def history_from_pickles(paths):
+    r"""Return a history out of the files written by ParameterSet.pickle,
+    timestamped with their modification time
+    """
+    history = []
+    for path in paths:
+        with open(path, "rb") as fh:
+            history.append((os.path.getmtime(path), ParameterSet(pickle.load(fh))))
+    return sorted(history, key=lambda entry: entry[0])
+
+
+class ReplayEntry:
+
+    __slots__ = ("timestamp", "requested", "achieved", "duration", "collapsed", "error")
+
+    def __init__(self, timestamp, requested, achieved, duration, collapsed, error=None):
+        # timestamp in the history
+        self.timestamp = timestamp
+        # seconds since the start of the replay the state was due, None if not paced
+        self.requested = requested
+        # seconds since the start of the replay the state was written
+        self.achieved = achieved
+        self.duration = duration
+        # number of earlier states merged into this one
+        self.collapsed = collapsed
+        self.error = error
+
+    @property
+    def lag(self):
+        return None if self.requested is None else self.achieved - self.requested
+
+    def __repr__(self):
+        return f"ReplayEntry(timestamp={self.timestamp}, requested={self.requested}, achieved={self.achieved:.4f}, collapsed={self.collapsed})"
+
+
+class ReplayReport:
+    r"""Requested versus achieved timing of a replay
+
+    entries: one ReplayEntry per state written to the camera
+    recorded: seconds between the first and the last state of the history
+    elapsed: seconds the replay took
+    """
+
+    def __init__(self, speed):
+        self.speed = speed
+        self.entries = []
+        self.recorded = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def applied(self):
+        return len(self.entries)
+
+    @property
+    def collapsed(self):
+        return sum(e.collapsed for e in self.entries)
+
+    @property
+    def failed(self):
+        return [e for e in self.entries if e.error is not None]
+
+    @property
+    def achieved_speed(self):
+        r"""Seconds of history replayed per second
+        """
+        return self.recorded / self.elapsed if self.elapsed else float("inf")
+
+    @property
+    def max_lag(self):
+        lags = [e.lag for e in self.entries if e.lag is not None]
+        return max(lags) if lags else 0.0
+
+    @property
+    def mean_lag(self):
+        lags = [e.lag for e in self.entries if e.lag is not None]
+        return sum(lags) / len(lags) if lags else 0.0
+
+    def __str__(self):
+        return (
+            f"ReplayReport(applied={self.applied}, collapsed={self.collapsed}, failed={len(self.failed)}, "
+            f"speed={self.speed}, achieved_speed={self.achieved_speed:.2f}, "
+            f"max_lag={self.max_lag:.4f}, mean_lag={self.mean_lag:.4f})"
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+
+class Replay:
+    r"""
+    camera: the picamera.PiCamera() instance (or a simulation.FakeCamera) the history is written to
+    history: iterable of (timestamp, ParameterSet or dictionary), in time order.
+        It is read lazily, one state ahead of the one being written,
+        so a Journal is replayed without loading it. ValueError is raised by run
+        when a state comes before the previous one
+    speed: replay speed relative to the recording, None to go as fast as possible
+    settle: seconds a state needs in the camera before it is worth writing
+    clock, sleep: functions returning the current time and waiting, in seconds
+    """
+
+    def __init__(self, camera, history, speed=1.0, settle=0.0, clock=time.perf_counter, sleep=time.sleep):
+        if speed is not None and speed <= 0:
+            raise ValueError(f"speed must be positive, not {speed}")
+
+        self.camera = camera
+        self.history = history
+        self.speed = speed
+        self.settle = settle
+        self.clock = clock
+        self.sleep = sleep
+
+    def write(self, param_set):
+        param_set.update_cam(self.camera)
+
+    def _states(self):
+        r"""Yield the states of the history as ParameterSets, checking they are in time order
+        """
+        previous = None
+        for timestamp, param_set in self.history:
+            if previous is not None and timestamp < previous:
+                raise ValueError(f"History is not in time order: {timestamp} after {previous}")
+            previous = timestamp
+
+            if not isinstance(param_set, ParameterSet):
+                param_set = ParameterSet(param_set)
+                param_set.cross_verify()
+            yield timestamp, param_set
+
+    def run(self):
+        r"""Replay the history and return a ReplayReport
+        """
+        report = ReplayReport(self.speed)
+        states = self._states()
+        current = next(states, None)
+        if current is None:
+            return report
+        # one state ahead, to collapse the current one into it
+        upcoming = next(states, None)
+
+        first = current[0]
+        paced = self.speed is not None
+        due = lambda timestamp: (timestamp - first) / self.speed
+        start = self.clock()
+
+        while current is not None:
+            timestamp, param_set = current
+            collapsed = 0
+
+            if paced:
+                # merge the states that would be overwritten before they settle
+                while upcoming is not None:
+                    write_at = max(self.clock() - start, due(timestamp))
+                    if due(upcoming[0]) >= write_at + self.settle:
+                        break
+                    timestamp, later = upcoming
+                    param_set = param_set.merge(later)
+                    collapsed += 1
+                    upcoming = next(states, None)
+
+                remaining = due(timestamp) - (self.clock() - start)
+                if remaining > 0:
+                    self.sleep(remaining)
+
+            achieved = self.clock() - start
+            error = None
+            try:
+                self.write(param_set)
+            except Exception as e:
+                logging.error(f"Could not replay the state at {timestamp}")
+                logging.error(e)
+                error = e
+
+            duration = self.clock() - start - achieved
+            report.entries.append(ReplayEntry(
+                timestamp, due(timestamp) if paced else None, achieved, duration, collapsed, error
+            ))
+            report.recorded = timestamp - first
+
+            current = upcoming
+            if current is not None:
+                upcoming = next(states, None)
+
+        report.elapsed = self.clock() - start
+        return report
@@ -0,0 +1,111 @@
+__author__ = 'antonio'
+
+import logging
+
+from picamera_attributes.helpers import wait_for_gains, GAIN_TOLERANCE, GAIN_TIMEOUT, GAIN_POLL_INTERVAL
+
+
+def dependency_graph(params):
+    r"""Map the name of every parameter to the names of the parameters it depends on.
+
+    params: a dictionary or ParameterSet mapping names to CameraParameter instances.
+    Only the dependencies declared in _depends_on and present in params are kept
+    """
+    graph = {}
+    for k, p in params.items():
+        depends_on = p._depends_on or {}
+        graph[k] = [d for d in depends_on.keys() if d in params.keys()]
+    return graph
+
+
+def topological_stages(graph):
+    r"""Group the nodes of graph in stages, so that every node comes after all its dependencies.
+    Nodes in a stage do not depend on each other and keep the order of graph.
+
+    Raises ValueError if the dependencies are circular
+    """
+    remaining = dict(graph)
+    done = set()
+    stages = []
+
+    while remaining:
+        stage = [k for k, deps in remaining.items() if all(d in done for d in deps)]
+        if not stage:
+            raise ValueError(f"Circular dependency between parameters {list(remaining.keys())}")
+
+        for k in stage:
+            remaining.pop(k)
+        done.update(stage)
+        stages.append(stage)
+
+    return stages
+
+
+def _set_parameter(param, camera, **kwargs):
+    return param._write(camera, **kwargs)
+
+
+class Scheduler:
+    r"""Writes parameters to a camera after the parameters they depend on.
+
+    Parameters that take a while to apply in the camera (_settles = True, i.e. the gains)
+    are written without waiting, and a single wait covers all of them.
+    The wait happens before writing a parameter that depends on one of them,
+    or once all parameters are written.
+
+    params: a dictionary or ParameterSet mapping names to CameraParameter instances
+    """
+
+    def __init__(self, params, tolerance=GAIN_TOLERANCE, timeout=GAIN_TIMEOUT, poll_interval=GAIN_POLL_INTERVAL):
+        self.params = params
+        self.graph = dependency_graph(params)
+        self.stages = topological_stages(self.graph)
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def order(self):
+        r"""Return the names of the parameters in the order they are written
+        """
+        return [k for stage in self.stages for k in stage]
+
+    def settle(self, camera, pending):
+        r"""Wait until all the pending values are reported by the camera
+        """
+        if not pending:
+            return True
+        settled = wait_for_gains(camera, pending, tolerance=self.tolerance, timeout=self.timeout, poll_interval=self.poll_interval)
+        pending.clear()
+        return settled
+
+    def run(self, camera, write=None, wait=True):
+        r"""Write every parameter to the camera.
+
+        write: callable with signature write(param, camera, **kwargs) performing one write
+            and returning True if the parameter was sent to the camera.
+            It receives wait=False for parameters that settle. By default CameraParameter.set is called
+        wait: if False, the parameters that settle are not waited for,
+            not even before writing the ones that depend on them
+
+        Returns True if all written parameters that settle reached their value in time
+        """
+        if write is None:
+            write = _set_parameter
+
+        pending = {}
+        settled = True
+
+        for stage in self.stages:
+            if any(d in pending for k in stage for d in self.graph[k]):
+                logging.debug(f"Waiting for {list(pending.keys())} to settle")
+                settled = self.settle(camera, pending) and settled
+
+            for k in stage:
+                p = self.params[k]
+                if p._settles:
+                    if write(p, camera, wait=False) and wait:
+                        pending[k] = p.machine()
+                else:
+                    write(p, camera)
+
+        return self.settle(camera, pending) and settled
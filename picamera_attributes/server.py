@@ -0,0 +1,254 @@
+r"""HTTP control endpoint for a camera, built on asyncio and the standard library.
+
+    server = ControlServer(camera, port=8000)
+    asyncio.run(server.serve_forever())
+
+    GET  /set?iso=200&brightness=60     update some parameters, the body of a POST works too.
+                                        Returns the applied state as JSON once the update is in the camera
+    GET  /state                         the applied state as JSON
+    GET  /events                        server-sent events, one JSON state every time the camera is updated
+
+The sliders, radio buttons and switches of a UI fire many updates in a short time.
+Updates are merged per parameter, the newest value wins,
+and applied together once no new update arrives for debounce seconds
+(or max_wait seconds after the first one, so a slider being dragged still shows progress).
+They are then submitted to a picamera_attributes.controller.CameraController,
+which runs one apply at a time and merges the updates arriving meanwhile into the next one.
+"""
+__author__ = 'antonio'
+
+import asyncio
+import functools
+import json
+import logging
+import urllib.parse
+
+from picamera_attributes.controller import CameraController
+from picamera_attributes.variables import supported
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 502: "Bad Gateway"}
+
+
+class ControlServer:
+    r"""
+    camera: the picamera.PiCamera() instance you are configuring
+    initial: ParameterSet with the state the camera starts in
+    debounce: seconds without updates after which the merged update is applied
+    max_wait: maximum seconds an update waits to be applied
+    """
+
+    _supported = supported
+
+    def __init__(self, camera, initial=None, host="127.0.0.1", port=0, debounce=0.05, max_wait=0.25):
+        self.camera = camera
+        self.controller = CameraController(camera, initial)
+        self.host = host
+        self.port = port
+        self.debounce = debounce
+        self.max_wait = max_wait
+
+        self._pending = {}
+        self._first = None
+        self._timer = None
+        self._next = None
+        self._published = None
+        self._subscribers = set()
+        self._server = None
+
+    @property
+    def state(self):
+        r"""ParameterSet with the state the camera accepted
+        """
+        return self.controller.state
+
+    async def start(self):
+        self.controller.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Listening on http://{self.host}:{self.port}")
+        return self
+
+    async def close(self):
+        r"""Apply the updates still waiting for their debounce, then stop the controller and the server
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        # hand the debounced updates to the controller, stop applies them before the thread ends
+        self._flush()
+        await asyncio.get_running_loop().run_in_executor(None, self.controller.stop)
+        for queue in list(self._subscribers):
+            queue.put_nowait(None)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    # updates
+
+    def parse(self, qs):
+        r"""Return a dictionary of validated parameters out of a query string.
+        Raises ValueError if any parameter is not supported or not valid
+        """
+        params = {}
+        for k, values in urllib.parse.parse_qs(qs, strict_parsing=bool(qs)).items():
+            if k not in self._supported.keys():
+                raise ValueError(f"Parameter {k} not supported")
+            try:
+                param = self._supported[k](value=values[-1])
+                param.validate()
+            except Exception as e:
+                raise ValueError(f"{k}={values[-1]} is not valid: {e!r}")
+            params[k] = param
+        return params
+
+    def submit(self, params):
+        r"""Merge params into the pending update.
+        Returns a future resolved with the ApplyResult of the apply that includes them
+        """
+        loop = asyncio.get_running_loop()
+        self._pending.update(params)
+        if self._next is None:
+            self._next = loop.create_future()
+
+        now = loop.time()
+        if self._first is None:
+            self._first = now
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(min(now + self.debounce, self._first + self.max_wait), self._flush)
+        return self._next
+
+    def _flush(self):
+        self._timer = None
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        waiter, self._next = self._next, None
+        self._first = None
+        try:
+            future = asyncio.wrap_future(self.controller.submit(pending))
+        except RuntimeError as e:
+            # the controller was stopped
+            waiter.set_exception(e)
+            return
+        future.add_done_callback(functools.partial(self._applied, waiter))
+
+    def _applied(self, waiter, future):
+        if future.cancelled():
+            waiter.cancel()
+            return
+        if future.exception() is not None:
+            waiter.set_exception(future.exception())
+            return
+
+        result = future.result()
+        # flushes merged by the controller share the same result, publish it once
+        if result is not self._published:
+            self._published = result
+            self._publish(self.state.as_dict())
+        waiter.set_result(result)
+
+    def _publish(self, state):
+        for queue in self._subscribers:
+            if queue.full():
+                # slow client, only the newest states matter
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    # http
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            method, target, _ = request.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            url = urllib.parse.urlsplit(target)
+            qs = url.query
+            if method == "POST":
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                qs = "&".join(s for s in (qs, body.decode("utf-8")) if s)
+
+            if url.path == "/events":
+                await self._events(writer)
+            elif url.path == "/state":
+                self._respond(writer, 200, self.state.as_dict())
+            elif url.path == "/set":
+                if method not in ("GET", "POST"):
+                    self._respond(writer, 405, {"error": f"Method {method} not allowed"})
+                else:
+                    await self._set(writer, qs)
+            else:
+                self._respond(writer, 404, {"error": f"{url.path} not found"})
+
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            self._respond(writer, 400, {"error": str(e)})
+        finally:
+            writer.close()
+
+    async def _set(self, writer, qs):
+        try:
+            params = self.parse(qs)
+        except ValueError as e:
+            self._respond(writer, 400, {"error": str(e)})
+            return
+
+        if not params:
+            self._respond(writer, 200, self.state.as_dict())
+            return
+
+        try:
+            # shielded, so a client hanging up does not cancel the apply for everybody else
+            result = await asyncio.shield(self.submit(params))
+        except Exception as e:
+            self._respond(writer, 502, {"error": repr(e), "state": self.state.as_dict()})
+            return
+
+        if result.ok:
+            self._respond(writer, 200, self.state.as_dict())
+        else:
+            failed = {k: repr(e) for k, e in result.failed.items()}
+            self._respond(writer, 502, {"error": "Some parameters could not be set", "failed": failed, "state": self.state.as_dict()})
+
+    async def _events(self, writer):
+        queue = asyncio.Queue(maxsize=16)
+        queue.put_nowait(self.state.as_dict())
+        self._subscribers.add(queue)
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+            )
+            while True:
+                state = await queue.get()
+                if state is None:
+                    break
+                writer.write(f"data: {json.dumps(state)}\n\n".encode())
+                await writer.drain()
+        finally:
+            self._subscribers.discard(queue)
+
+    @staticmethod
+    def _respond(writer, status, content):
+        body = json.dumps(content).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
@@ -0,0 +1,136 @@
+__author__ = 'antonio'
+
+import logging
+import math
+import time
+
+from picamera_attributes.state import read_attribute
+from picamera_attributes.variables import ParameterSet
+
+
+# attributes the auto exposure and auto white balance loops move
+SETTLE_PARAMS = ("exposure_speed", "analog_gain", "digital_gain", "awb_gains")
+SETTLE_WINDOW = 4
+SETTLE_TOLERANCE = 0.01
+SETTLE_TIMEOUT = 5.0
+SETTLE_INITIAL_INTERVAL = 0.01
+SETTLE_MAX_INTERVAL = 0.2
+SETTLE_BACKOFF = 2.0
+
+
+class SettleResult:
+    r"""Outcome of wait_until_settled
+
+    settled: True if every attribute converged before the timeout
+    values: dictionary with the last value read of every attribute
+    history: dictionary with every value read of every attribute
+    polls: number of times the attributes were read
+    elapsed: seconds waited
+    locked: ParameterSet fixing the converged values, if lock was requested
+    """
+
+    def __init__(self, params):
+        self.settled = False
+        self.values = {}
+        self.history = {k: [] for k in params}
+        self.polls = 0
+        self.elapsed = 0.0
+        self.locked = None
+
+    def __str__(self):
+        return f"SettleResult(settled={self.settled}, values={self.values}, polls={self.polls}, elapsed={self.elapsed:.4f})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
+def _as_float(value):
+    if isinstance(value, (tuple, list)):
+        return tuple(float(v) for v in value)
+    return float(value)
+
+
+def _is_stable(readings, window, tolerance):
+    r"""Return True if the standard deviation of the last window readings
+    is within tolerance of their mean
+    """
+    if len(readings) < window:
+        return False
+
+    recent = readings[-window:]
+    # plurals are stable if every element is
+    for series in zip(*[r if isinstance(r, tuple) else (r, ) for r in recent]):
+        mean = sum(series) / window
+        deviation = math.sqrt(sum((v - mean) ** 2 for v in series) / window)
+        # constant readings are stable, even around 0
+        if deviation > tolerance * abs(mean) and deviation > 1e-12:
+            return False
+    return True
+
+
+def lock_values(values):
+    r"""Return a ParameterSet that turns the auto loops off and keeps the camera at values
+    """
+    params = {}
+    if {"exposure_speed", "analog_gain", "digital_gain"} & set(values.keys()):
+        params["exposure_mode"] = "off"
+    if "exposure_speed" in values:
+        params["shutter_speed"] = int(values["exposure_speed"])
+    for gain in ("analog_gain", "digital_gain"):
+        if gain in values:
+            params[gain] = float(values[gain])
+    if "awb_gains" in values:
+        params["awb_mode"] = "off"
+        params["awb_gains"] = tuple(float(v) for v in values["awb_gains"])
+
+    param_set = ParameterSet(params)
+    param_set.cross_verify()
+    return param_set
+
+
+def wait_until_settled(
+        camera, params=SETTLE_PARAMS, window=SETTLE_WINDOW, tolerance=SETTLE_TOLERANCE, timeout=SETTLE_TIMEOUT,
+        initial_interval=SETTLE_INITIAL_INTERVAL, max_interval=SETTLE_MAX_INTERVAL, backoff=SETTLE_BACKOFF, lock=False
+    ):
+    r"""Block until the auto exposure and auto white balance loops of the camera converge,
+    i.e. after changing exposure_mode, awb_mode, iso or exposure_compensation.
+
+    camera: the picamera.PiCamera() instance you are configuring
+    params: attributes to watch
+    window: number of consecutive readings that must agree
+    tolerance: relative standard deviation of the readings in the window under which an attribute is converged
+    timeout: maximum number of seconds to wait
+    initial_interval: seconds between the first two readings,
+        multiplied by backoff after every reading, up to max_interval
+    lock: if True, the result carries a ParameterSet in locked that fixes the converged values
+        (exposure_mode and awb_mode off), ready for update_cam
+
+    Returns a SettleResult
+    """
+    result = SettleResult(params)
+    start = time.monotonic()
+    deadline = start + timeout
+    interval = initial_interval
+
+    while True:
+        for k in params:
+            value = _as_float(read_attribute(camera, k))
+            result.history[k].append(value)
+            result.values[k] = value
+        result.polls += 1
+
+        if all(_is_stable(result.history[k], window, tolerance) for k in params):
+            result.settled = True
+            break
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logging.warning(f"{', '.join(params)} did not settle within {timeout} seconds")
+            break
+        time.sleep(min(interval, remaining))
+        interval = min(interval * backoff, max_interval)
+
+    result.elapsed = time.monotonic() - start
+    if lock:
+        result.locked = lock_values(result.values)
+    return result
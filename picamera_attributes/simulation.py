@@ -0,0 +1,480 @@
+r"""Simulated PiCamera and MMAL backend, to run this package without a camera.
+
+    from picamera_attributes import simulation
+
+    with simulation.install():
+        camera = simulation.FakeCamera(read_latency=0.001, gain_delay=0.2)
+        camera.exposure_mode = "off"
+        ParameterSet({"analog_gain": 4}).update_cam(camera)
+
+install() puts a stub picamera package (with mmal, mmalobj and exc modules)
+in sys.modules, so the lazy imports of picamera_attributes.helpers.set_gain
+and picamera_attributes.mmal_backend resolve to it.
+"""
+__author__ = 'antonio'
+
+import collections
+import contextlib
+import ctypes as ct
+import math
+import sys
+import time
+import types
+from fractions import Fraction
+
+
+# real value of picamera.mmal.MMAL_PARAMETER_GROUP_CAMERA
+MMAL_PARAMETER_GROUP_CAMERA = 1 << 16
+MMAL_SUCCESS = 0
+MMAL_ENOSYS = 4
+
+SENSOR_GAINS = {
+    MMAL_PARAMETER_GROUP_CAMERA + 0x59: "analog_gain",
+    MMAL_PARAMETER_GROUP_CAMERA + 0x5A: "digital_gain",
+}
+
+# real values of the picamera.mmal constants the direct MMAL backend uses
+MMAL_PARAMETERS = {
+    "MMAL_PARAMETER_AWB_MODE": MMAL_PARAMETER_GROUP_CAMERA + 0x05,
+    "MMAL_PARAMETER_EXPOSURE_COMP": MMAL_PARAMETER_GROUP_CAMERA + 0x0D,
+    "MMAL_PARAMETER_EXPOSURE_MODE": MMAL_PARAMETER_GROUP_CAMERA + 0x12,
+    "MMAL_PARAMETER_INPUT_CROP": MMAL_PARAMETER_GROUP_CAMERA + 0x25,
+    "MMAL_PARAMETER_SHARPNESS": MMAL_PARAMETER_GROUP_CAMERA + 0x2C,
+    "MMAL_PARAMETER_CONTRAST": MMAL_PARAMETER_GROUP_CAMERA + 0x2D,
+    "MMAL_PARAMETER_BRIGHTNESS": MMAL_PARAMETER_GROUP_CAMERA + 0x2E,
+    "MMAL_PARAMETER_SATURATION": MMAL_PARAMETER_GROUP_CAMERA + 0x2F,
+    "MMAL_PARAMETER_ISO": MMAL_PARAMETER_GROUP_CAMERA + 0x30,
+    "MMAL_PARAMETER_SHUTTER_SPEED": MMAL_PARAMETER_GROUP_CAMERA + 0x43,
+    "MMAL_PARAMETER_CUSTOM_AWB_GAINS": MMAL_PARAMETER_GROUP_CAMERA + 0x44,
+}
+
+EXPOSURE_MODES = [
+    "off", "auto", "night", "nightpreview", "backlight", "spotlight", "sports",
+    "snow", "beach", "verylong", "fixedfps", "antishake", "fireworks",
+]
+AWB_MODES = [
+    "off", "auto", "sunlight", "cloudy", "shade", "tungsten", "fluorescent",
+    "incandescent", "flash", "horizon",
+]
+
+# MMAL parameter id -> (attribute of FakeCamera, function mapping the MMAL value to the attribute value)
+_MMAL_ATTRIBUTES = {
+    MMAL_PARAMETERS["MMAL_PARAMETER_EXPOSURE_COMP"]: ("exposure_compensation", int),
+    MMAL_PARAMETERS["MMAL_PARAMETER_SHARPNESS"]: ("sharpness", lambda v: round(v * 100)),
+    MMAL_PARAMETERS["MMAL_PARAMETER_CONTRAST"]: ("contrast", lambda v: round(v * 100)),
+    MMAL_PARAMETERS["MMAL_PARAMETER_BRIGHTNESS"]: ("brightness", lambda v: round(v * 100)),
+    MMAL_PARAMETERS["MMAL_PARAMETER_SATURATION"]: ("saturation", lambda v: round(v * 100)),
+    MMAL_PARAMETERS["MMAL_PARAMETER_ISO"]: ("iso", int),
+    MMAL_PARAMETERS["MMAL_PARAMETER_SHUTTER_SPEED"]: ("shutter_speed", int),
+    MMAL_PARAMETERS["MMAL_PARAMETER_EXPOSURE_MODE"]: ("exposure_mode", lambda v: EXPOSURE_MODES[v]),
+    MMAL_PARAMETERS["MMAL_PARAMETER_AWB_MODE"]: ("awb_mode", lambda v: AWB_MODES[v]),
+    MMAL_PARAMETERS["MMAL_PARAMETER_CUSTOM_AWB_GAINS"]: ("awb_gains", tuple),
+    MMAL_PARAMETERS["MMAL_PARAMETER_INPUT_CROP"]: ("zoom", lambda v: tuple(c / 65535 for c in v)),
+}
+
+
+# same layout as the structures in picamera.mmal
+
+class MMAL_RATIONAL_T(ct.Structure):
+    _fields_ = [("num", ct.c_int32), ("den", ct.c_int32)]
+
+    def __repr__(self):
+        return f"MMAL_RATIONAL_T(num={self.num}, den={self.den})"
+
+
+class MMAL_RECT_T(ct.Structure):
+    _fields_ = [("x", ct.c_int32), ("y", ct.c_int32), ("width", ct.c_int32), ("height", ct.c_int32)]
+
+
+class MMAL_PARAMETER_HEADER_T(ct.Structure):
+    _fields_ = [("id", ct.c_uint32), ("size", ct.c_uint32)]
+
+
+class MMAL_PARAMETER_EXPOSUREMODE_T(ct.Structure):
+    _fields_ = [("hdr", MMAL_PARAMETER_HEADER_T), ("value", ct.c_uint32)]
+
+
+class MMAL_PARAMETER_AWBMODE_T(ct.Structure):
+    _fields_ = [("hdr", MMAL_PARAMETER_HEADER_T), ("value", ct.c_uint32)]
+
+
+class MMAL_PARAMETER_AWB_GAINS_T(ct.Structure):
+    _fields_ = [("hdr", MMAL_PARAMETER_HEADER_T), ("r_gain", MMAL_RATIONAL_T), ("b_gain", MMAL_RATIONAL_T)]
+
+
+class MMAL_PARAMETER_INPUT_CROP_T(ct.Structure):
+    _fields_ = [("hdr", MMAL_PARAMETER_HEADER_T), ("rect", MMAL_RECT_T)]
+
+
+def _struct_value(param):
+    r"""Value carried by one of the parameter structures, as passed to FakeCamera._set_mmal
+    """
+    if isinstance(param, (MMAL_PARAMETER_EXPOSUREMODE_T, MMAL_PARAMETER_AWBMODE_T)):
+        return param.value
+    if isinstance(param, MMAL_PARAMETER_AWB_GAINS_T):
+        return (Fraction(param.r_gain.num, param.r_gain.den), Fraction(param.b_gain.num, param.b_gain.den))
+    if isinstance(param, MMAL_PARAMETER_INPUT_CROP_T):
+        rect = param.rect
+        return (rect.x, rect.y, rect.width, rect.height)
+    raise TypeError(f"Unknown parameter structure {type(param).__name__}")
+
+
+def to_rational(value):
+    value = Fraction(value).limit_denominator(65536)
+    return MMAL_RATIONAL_T(value.numerator, value.denominator)
+
+
+def _to_fraction(value):
+    return Fraction(value).limit_denominator(65536)
+
+
+class PiCameraMMALError(Exception):
+
+    def __init__(self, status, prefix=""):
+        self.status = status
+        super().__init__(f"{prefix}{': ' if prefix else ''}MMAL error {status}")
+
+
+class SimulatedValue:
+    r"""A numeric value that moves towards a target over time.
+
+    step: the value jumps to the target once delay seconds have passed,
+        like the sensor does for a manual gain.
+    Otherwise it decays exponentially towards the target with time constant tau,
+    like the auto exposure and auto white balance loops do.
+    """
+
+    def __init__(self, value):
+        self._start = value
+        self._target = value
+        self._since = time.monotonic()
+        self._delay = 0
+        self._tau = None
+
+    def move(self, target, delay=0, tau=None):
+        self._start = self.value
+        self._target = target
+        self._since = time.monotonic()
+        self._delay = delay
+        self._tau = tau
+
+    def freeze(self):
+        self.move(self.value)
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def value(self):
+        elapsed = time.monotonic() - self._since
+        if self._tau:
+            return self._target + (self._start - self._target) * math.exp(-elapsed / self._tau)
+        if elapsed >= self._delay:
+            return self._target
+        return self._start
+
+
+class FakePort:
+
+    def __init__(self, camera):
+        self.camera = camera
+
+    def __repr__(self):
+        return f"FakePort({self.camera!r})"
+
+
+class _FakeControl:
+
+    def __init__(self, camera):
+        self._port = FakePort(camera)
+
+
+class _FakeMMALCamera:
+
+    def __init__(self, camera):
+        self.control = _FakeControl(camera)
+
+
+def _stored(name):
+    r"""Property reading and writing a plain attribute of the fake camera
+    """
+
+    def getter(self):
+        self._read(name)
+        return self._values[name]
+
+    def setter(self, value):
+        self._write(name)
+        self._values[name] = value
+
+    return property(getter, setter)
+
+
+class FakeCamera:
+    r"""Stand-in for picamera.PiCamera, with the attributes listed in picamera_attributes.variables.supported
+
+    read_latency: seconds every attribute read takes
+    write_latency: seconds every attribute write (and every MMAL call) takes
+    gain_delay: seconds before a gain written through MMAL is reported back
+    auto_tau: time constant, in seconds, of the auto exposure and auto white balance loops
+    auto_analog_gain, auto_digital_gain, auto_exposure_speed, auto_awb_gains:
+        values the auto exposure and auto white balance loops converge to
+    mmal_status: status returned by every MMAL call, i.e. 4 to simulate old userland libraries
+    """
+
+    def __init__(
+            self, read_latency=0, write_latency=0, gain_delay=0.1, auto_tau=0.1,
+            auto_analog_gain=2.0, auto_digital_gain=1.5, auto_exposure_speed=20000, auto_awb_gains=(1.5, 1.2),
+            mmal_status=MMAL_SUCCESS
+        ):
+
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.gain_delay = gain_delay
+        self.auto_tau = auto_tau
+        self.auto_analog_gain = auto_analog_gain
+        self.auto_digital_gain = auto_digital_gain
+        self.auto_exposure_speed = auto_exposure_speed
+        self.auto_awb_gains = auto_awb_gains
+        self.mmal_status = mmal_status
+
+        self.reads = collections.Counter()
+        self.writes = collections.Counter()
+        self.closed = False
+        self._camera = _FakeMMALCamera(self)
+
+        self._values = {
+            "awb_mode": "auto", "exposure_mode": "auto", "shutter_speed": 0,
+            "exposure_compensation": 0, "iso": 0, "brightness": 50,
+            "rotation": 0, "sharpness": 0, "contrast": 0, "saturation": 0,
+            "zoom": (0.0, 0.0, 1.0, 1.0), "framerate": Fraction(30),
+            "resolution": (1280, 960), "color_effects": None,
+        }
+
+        self._analog_gain = SimulatedValue(1.0)
+        self._digital_gain = SimulatedValue(1.0)
+        self._exposure_speed = SimulatedValue(auto_exposure_speed)
+        self._red_gain = SimulatedValue(1.0)
+        self._blue_gain = SimulatedValue(1.0)
+        self._auto_exposure()
+        self._auto_white_balance()
+
+    def _read(self, name):
+        self.reads[name] += 1
+        if self.read_latency:
+            time.sleep(self.read_latency)
+
+    def _write(self, name):
+        self.writes[name] += 1
+        if self.write_latency:
+            time.sleep(self.write_latency)
+
+    def _auto_exposure(self):
+        if self._values["exposure_mode"] == "off":
+            self._analog_gain.freeze()
+            self._digital_gain.freeze()
+            self._exposure_speed.freeze()
+        else:
+            self._analog_gain.move(self.auto_analog_gain, tau=self.auto_tau)
+            self._digital_gain.move(self.auto_digital_gain, tau=self.auto_tau)
+            self._exposure_speed.move(self.auto_exposure_speed, tau=self.auto_tau)
+
+    def _auto_white_balance(self):
+        if self._values["awb_mode"] == "off":
+            self._red_gain.freeze()
+            self._blue_gain.freeze()
+        else:
+            self._red_gain.move(self.auto_awb_gains[0], tau=self.auto_tau)
+            self._blue_gain.move(self.auto_awb_gains[1], tau=self.auto_tau)
+
+    def _set_gain(self, name, value):
+        r"""Called by the stub mmal_port_parameter_set_rational
+        """
+        self._write(name)
+        # the auto exposure loop overrides manual gains
+        if self._values["exposure_mode"] == "off":
+            getattr(self, f"_{name}").move(float(value), delay=self.gain_delay)
+
+    def _set_mmal(self, param, value):
+        r"""Called by the stub mmal_port_parameter_set* functions.
+        Returns the MMAL status
+        """
+        if self.mmal_status != MMAL_SUCCESS:
+            self._write("mmal")
+            return self.mmal_status
+        if param in SENSOR_GAINS:
+            self._set_gain(SENSOR_GAINS[param], value)
+            return MMAL_SUCCESS
+        if param not in _MMAL_ATTRIBUTES:
+            self._write("mmal")
+            return MMAL_ENOSYS
+
+        name, convert = _MMAL_ATTRIBUTES[param]
+        # through the property, as PiCamera would
+        setattr(self, name, convert(value))
+        return MMAL_SUCCESS
+
+    exposure_compensation = _stored("exposure_compensation")
+    iso = _stored("iso")
+    brightness = _stored("brightness")
+    rotation = _stored("rotation")
+    sharpness = _stored("sharpness")
+    contrast = _stored("contrast")
+    saturation = _stored("saturation")
+    zoom = _stored("zoom")
+    framerate = _stored("framerate")
+    resolution = _stored("resolution")
+    color_effects = _stored("color_effects")
+
+    @property
+    def exposure_mode(self):
+        self._read("exposure_mode")
+        return self._values["exposure_mode"]
+
+    @exposure_mode.setter
+    def exposure_mode(self, value):
+        self._write("exposure_mode")
+        self._values["exposure_mode"] = value
+        self._auto_exposure()
+
+    @property
+    def awb_mode(self):
+        self._read("awb_mode")
+        return self._values["awb_mode"]
+
+    @awb_mode.setter
+    def awb_mode(self, value):
+        self._write("awb_mode")
+        self._values["awb_mode"] = value
+        self._auto_white_balance()
+
+    @property
+    def shutter_speed(self):
+        self._read("shutter_speed")
+        return self._values["shutter_speed"]
+
+    @shutter_speed.setter
+    def shutter_speed(self, value):
+        self._write("shutter_speed")
+        self._values["shutter_speed"] = int(value)
+        if value and self._values["exposure_mode"] == "off":
+            self._exposure_speed.move(int(value), delay=self.gain_delay)
+
+    @property
+    def exposure_speed(self):
+        self._read("exposure_speed")
+        return int(self._exposure_speed.value)
+
+    @property
+    def analog_gain(self):
+        self._read("analog_gain")
+        return _to_fraction(self._analog_gain.value)
+
+    @property
+    def digital_gain(self):
+        self._read("digital_gain")
+        return _to_fraction(self._digital_gain.value)
+
+    @property
+    def awb_gains(self):
+        self._read("awb_gains")
+        return (_to_fraction(self._red_gain.value), _to_fraction(self._blue_gain.value))
+
+    @awb_gains.setter
+    def awb_gains(self, value):
+        self._write("awb_gains")
+        if not isinstance(value, (tuple, list)):
+            value = (value, value)
+        red, blue = value
+        self._red_gain.move(float(red))
+        self._blue_gain.move(float(blue))
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        return f"FakeCamera(id={id(self):#x})"
+
+
+def mmal_port_parameter_set_rational(port, param, value):
+    return port.camera._set_mmal(param, Fraction(value.num, value.den))
+
+
+def mmal_port_parameter_set_int32(port, param, value):
+    return port.camera._set_mmal(param, int(value))
+
+
+def mmal_port_parameter_set_uint32(port, param, value):
+    if value < 0:
+        return MMAL_ENOSYS
+    return port.camera._set_mmal(param, int(value))
+
+
+def mmal_port_parameter_set(port, hdr):
+    # hdr is the first field of the structure, which owns its memory
+    return port.camera._set_mmal(hdr.id, _struct_value(hdr._b_base_))
+
+
+def stub_modules():
+    r"""Build the stub picamera package and its mmal, mmalobj and exc modules.
+    Returns a dictionary ready to be merged into sys.modules
+    """
+    mmal = types.ModuleType("picamera.mmal")
+    mmal.MMAL_PARAMETER_GROUP_CAMERA = MMAL_PARAMETER_GROUP_CAMERA
+    mmal.MMAL_SUCCESS = MMAL_SUCCESS
+    mmal.MMAL_RATIONAL_T = MMAL_RATIONAL_T
+    mmal.MMAL_RECT_T = MMAL_RECT_T
+    mmal.MMAL_PARAMETER_HEADER_T = MMAL_PARAMETER_HEADER_T
+    mmal.MMAL_PARAMETER_EXPOSUREMODE_T = MMAL_PARAMETER_EXPOSUREMODE_T
+    mmal.MMAL_PARAMETER_AWBMODE_T = MMAL_PARAMETER_AWBMODE_T
+    mmal.MMAL_PARAMETER_AWB_GAINS_T = MMAL_PARAMETER_AWB_GAINS_T
+    mmal.MMAL_PARAMETER_INPUT_CROP_T = MMAL_PARAMETER_INPUT_CROP_T
+    for name, value in MMAL_PARAMETERS.items():
+        setattr(mmal, name, value)
+    for i, mode in enumerate(EXPOSURE_MODES):
+        setattr(mmal, f"MMAL_PARAM_EXPOSUREMODE_{mode.upper()}", i)
+    for i, mode in enumerate(AWB_MODES):
+        setattr(mmal, f"MMAL_PARAM_AWBMODE_{mode.upper()}", i)
+    mmal.mmal_port_parameter_set_rational = mmal_port_parameter_set_rational
+    mmal.mmal_port_parameter_set_int32 = mmal_port_parameter_set_int32
+    mmal.mmal_port_parameter_set_uint32 = mmal_port_parameter_set_uint32
+    mmal.mmal_port_parameter_set = mmal_port_parameter_set
+
+    mmalobj = types.ModuleType("picamera.mmalobj")
+    mmalobj.to_rational = to_rational
+
+    exc = types.ModuleType("picamera.exc")
+    exc.PiCameraMMALError = PiCameraMMALError
+
+    picamera = types.ModuleType("picamera")
+    picamera.__path__ = []
+    picamera.mmal = mmal
+    picamera.mmalobj = mmalobj
+    picamera.exc = exc
+    picamera.PiCamera = FakeCamera
+
+    return {"picamera": picamera, "picamera.mmal": mmal, "picamera.mmalobj": mmalobj, "picamera.exc": exc}
+
+
+@contextlib.contextmanager
+def install():
+    r"""Replace the picamera package with the stub for the duration of the context
+    """
+    modules = stub_modules()
+    previous = {name: sys.modules.get(name) for name in modules}
+    sys.modules.update(modules)
+    try:
+        yield modules["picamera"]
+    finally:
+        for name, module in previous.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
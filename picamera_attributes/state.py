@@ -0,0 +1,203 @@
+__author__ = 'antonio'
+
+import collections.abc
+import logging
+import time
+
+
+class CameraState:
+    r"""Shadow copy of the attributes of a PiCamera.
+
+    Wraps a picamera.PiCamera() instance and remembers the last value
+    written to or read from each supported attribute, so repeated reads
+    do not cross into MMAL. It can be passed wherever a camera is expected:
+
+        state = CameraState(camera)
+        state.iso = 100     # written to the camera and cached
+        state.iso           # served from the cache
+
+    Attributes that the camera changes on its own are volatile and always refreshed:
+    exposure_speed, the gains while exposure_mode is not off and
+    awb_gains while awb_mode is not off.
+
+    camera: the picamera.PiCamera() instance to wrap
+    names: attributes to cache, all the supported parameters by default.
+        Any other attribute is passed through to the camera
+    max_age: seconds after which a cached value is read again from the camera, never if None
+    """
+
+    __slots__ = ("camera", "names", "max_age", "_cache", "_times")
+
+    # attributes the camera updates continuously
+    _always_refresh = ("exposure_speed",)
+
+    # attribute -> (mode attribute, mode value under which the attribute holds still)
+    _stable_when = {
+        "analog_gain": ("exposure_mode", "off"),
+        "digital_gain": ("exposure_mode", "off"),
+        "awb_gains": ("awb_mode", "off"),
+    }
+
+    def __init__(self, camera, names=None, max_age=None):
+
+        if names is None:
+            # lazy loading to avoid a circular import
+            from picamera_attributes.variables import supported
+            names = supported.keys()
+
+        object.__setattr__(self, "camera", camera)
+        object.__setattr__(self, "names", frozenset(names) | frozenset(self._always_refresh) | frozenset(self._stable_when))
+        object.__setattr__(self, "max_age", max_age)
+        object.__setattr__(self, "_cache", {})
+        object.__setattr__(self, "_times", {})
+
+    def __getattr__(self, name):
+        # only called if name is not one of the slots
+        if name in self.names:
+            return self.read(name)
+        return getattr(self.camera, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__slots__:
+            object.__setattr__(self, name, value)
+        elif name in self.names:
+            self.write(name, value)
+        else:
+            setattr(self.camera, name, value)
+
+    def _store(self, name, value):
+        self._cache[name] = value
+        self._times[name] = time.monotonic()
+
+    def is_volatile(self, name):
+        r"""Return True if the camera may change the attribute on its own
+        """
+        if name in self._always_refresh:
+            return True
+        if name in self._stable_when:
+            mode, stable_value = self._stable_when[name]
+            return self.read(mode) != stable_value
+        return False
+
+    def age(self, name):
+        r"""Seconds since the cached value of name was read or written, None if not cached
+        """
+        if name not in self._times:
+            return None
+        return time.monotonic() - self._times[name]
+
+    def is_fresh(self, name):
+        if name not in self._cache or self.is_volatile(name):
+            return False
+        if self.max_age is not None and self.age(name) > self.max_age:
+            return False
+        return True
+
+    def read(self, name):
+        r"""Return the cached value of name, reading it from the camera if needed
+        """
+        if self.is_fresh(name):
+            return self._cache[name]
+        return self.refresh(name)
+
+    def refresh(self, name):
+        r"""Read name from the camera, regardless of the cache
+        """
+        value = getattr(self.camera, name)
+        self._store(name, value)
+        return value
+
+    def write(self, name, value):
+        r"""Set name in the camera and remember the written value
+        """
+        setattr(self.camera, name, value)
+        self._store(name, value)
+
+        # attributes that hold still only under a given mode
+        # may have moved while the mode was different
+        for attr, (mode, _) in self._stable_when.items():
+            if mode == name:
+                self.invalidate(attr)
+
+    def invalidate(self, name=None):
+        r"""Forget the cached value of name, or of all attributes if None
+        """
+        if name is None:
+            self._cache.clear()
+            self._times.clear()
+        else:
+            self._cache.pop(name, None)
+            self._times.pop(name, None)
+        logging.debug(f"Invalidated cached camera state {name if name is not None else '(all)'}")
+
+    def cached(self):
+        r"""Return a dictionary with the currently cached values
+        """
+        return self._cache.copy()
+
+    def __repr__(self):
+        return f"CameraState({self.camera!r}, cached={sorted(self._cache.keys())})"
+
+
+def read_attribute(camera, name):
+    r"""Read name from the camera as it is now.
+    If camera is a CameraState, the cache is bypassed and updated with the value read
+    """
+    if isinstance(camera, CameraState):
+        return camera.refresh(name)
+    return getattr(camera, name)
+
+
+class Readback(collections.abc.Mapping):
+    r"""Read-only mapping of camera attributes, all read together the first time one of them is accessed.
+    Attributes the camera does not have read as None.
+
+        camera, attributes = param_set.update_cam(camera, lazy=True)
+        attributes["iso"]           # reads every attribute, once
+        attributes["contrast"]      # no read
+        attributes.materialise()    # plain dictionary, i.e. for json or pickle
+
+    The values are a snapshot of the camera at the time of the first access (see timestamp),
+    so anything written to the camera in between is reflected. Access them before writing again
+    to get what update_cam left behind.
+
+    camera: camera (or CameraState) to read from
+    names: attributes in the mapping
+    """
+
+    def __init__(self, camera, names):
+        self.camera = camera
+        self.names = tuple(names)
+        self._names = frozenset(self.names)
+        self._values = None
+        # time.time() of the snapshot, None until then
+        self.timestamp = None
+
+    def materialise(self):
+        r"""Take the snapshot if it was not taken yet and return it as a dictionary
+        """
+        if self._values is None:
+            self._values = {k: getattr(self.camera, k, None) for k in self.names}
+            self.timestamp = time.time()
+        return dict(self._values)
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        if self._values is None:
+            self.materialise()
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __reduce__(self):
+        return (dict, (self.materialise(), ))
+
+    def __repr__(self):
+        if self._values is None:
+            return f"Readback({len(self.names)} attributes, not read)"
+        return f"Readback({self._values})"
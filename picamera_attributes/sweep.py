@@ -0,0 +1,135 @@
+__author__ = 'antonio'
+
+from picamera_attributes.variables import CameraParameter, ParameterSet, supported
+
+
+class ParameterSweep:
+    r"""Lazy grid of ParameterSets, ordered to make the transitions between consecutive points cheap.
+
+        sweep = ParameterSweep(
+            {"iso": [100, 200, 400], "shutter_speed": [10000, 20000], "analog_gain": [1, 2, 4]},
+            base={"exposure_mode": "off"}
+        )
+        for param_set in sweep:
+            param_set.update_cam(camera)
+
+    The most expensive parameter (by _transition_cost) varies slowest,
+    and the grid is walked as a snake (reflected Gray code),
+    so consecutive points differ in a single parameter
+    and every value of the most expensive parameter is visited in one block.
+
+    axes: dictionary mapping parameter names to the values to sweep
+    base: dictionary or ParameterSet with the parameters shared by all points
+    costs: dictionary overriding the _transition_cost of some parameters
+    """
+
+    _supported = supported
+
+    def __init__(self, axes, base=None, costs=None):
+
+        costs = costs or {}
+        base = base.params if isinstance(base, ParameterSet) else (base or {})
+        # keep raw values, so every point gets its own parameter instances
+        self.base = {k: p.machine() if isinstance(p, CameraParameter) else p for k, p in base.items()}
+        self.costs = {}
+        values = {}
+
+        for k, axis in axes.items():
+            if k not in self._supported.keys():
+                raise KeyError(f"Parameter {k} not supported")
+
+            param_class = self._supported[k]
+            self.costs[k] = costs.get(k, param_class._transition_cost)
+
+            # validate every value once, before the grid is walked
+            values[k] = []
+            for v in axis:
+                param = param_class(value=v)
+                param.validate()
+                values[k].append(param.machine())
+
+            if not values[k]:
+                raise ValueError(f"No values to sweep for {k}")
+
+        # sorted is stable, so parameters of equal cost keep the order given
+        self.names = sorted(values.keys(), key=lambda k: -self.costs[k])
+        self.values = [values[k] for k in self.names]
+        self.sizes = [len(v) for v in self.values]
+
+        # number of points visited before an axis takes its next value
+        self._blocks = []
+        block = 1
+        for size in reversed(self.sizes):
+            self._blocks.insert(0, block)
+            block *= size
+        self._len = block if self.sizes else 0
+
+    def __len__(self):
+        return self._len
+
+    def indices(self, i):
+        r"""Return the index in every axis of the i-th point
+        """
+        if not 0 <= i < self._len:
+            raise IndexError(f"Point {i} out of a sweep of {self._len} points")
+
+        result = []
+        for size, block in zip(self.sizes, self._blocks):
+            digit = (i // block) % size
+            # the axis runs backwards every other time the axes outside it move
+            if (i // (block * size)) % 2:
+                digit = size - 1 - digit
+            result.append(digit)
+        return result
+
+    def point(self, i):
+        r"""Return the i-th point as a dictionary of the swept parameters
+        """
+        return {k: values[d] for k, values, d in zip(self.names, self.values, self.indices(i))}
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._len
+        params = dict(self.base)
+        params.update(self.point(i))
+        param_set = ParameterSet(params)
+        param_set.validate()
+        param_set.cross_verify()
+        return param_set
+
+    def __iter__(self):
+        for i in range(self._len):
+            yield self[i]
+
+    def changes(self):
+        r"""Return a dictionary with the number of times each swept parameter changes along the sweep
+        """
+        result = {}
+        for k, size, block in zip(self.names, self.sizes, self._blocks):
+            outer = self._len // (block * size)
+            result[k] = outer * (size - 1)
+        return result
+
+    def cost(self):
+        r"""Total transition cost of walking the sweep in this order
+        """
+        return sum(self.costs[k] * n for k, n in self.changes().items())
+
+    def naive_cost(self):
+        r"""Transition cost of walking the grid in nested loop order, with the axes in the order they were given
+        """
+        result = 0
+        inner = self._len
+        for k in self.costs.keys():
+            size = self.sizes[self.names.index(k)]
+            inner //= size
+            # the axis moves every time any axis up to it moves
+            if size > 1:
+                result += self.costs[k] * (self._len // inner - 1)
+        return result
+
+    def __str__(self):
+        return f"ParameterSweep({dict(zip(self.names, self.sizes))}, {self._len} points)"
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,240 @@
+r"""Columnar storage of many ParameterSets, with vectorized validation and comparison.
+
+    table = ParameterTable.from_sets(param_sets)
+    table.valid()                        # one bool per row
+    table.diff(table[0])                 # which parameters differ from the first row
+    table[table.where(exposure_mode="off", iso=100)]
+
+Requires numpy.
+"""
+__author__ = 'antonio'
+
+import numpy as np
+
+from picamera_attributes.variables import ParameterSet, supported
+
+
+def _dtype(cls):
+    if cls._type is str:
+        return np.str_
+    if cls._type is bool:
+        return np.bool_
+    if cls._type is float:
+        return np.float64
+    return np.int64
+
+
+def _singular(cls):
+    return cls.singular_class if cls._length > 1 else cls
+
+
+class ParameterTable:
+    r"""Many ParameterSets stored as one column per supported parameter.
+
+    values: dictionary mapping every supported name to an array of shape (n,)
+        or (n, length) for plurals
+    present: dictionary mapping every supported name to a bool array of shape (n,),
+        False in the rows whose ParameterSet does not have that parameter
+    active: dictionary mapping every supported name to a bool array of shape (n,)
+        with the _active flag of the parameter in each row
+    """
+
+    _supported = supported
+
+    def __init__(self, values, present, active):
+        self.values = values
+        self.present = present
+        self.active = active
+
+    @classmethod
+    def from_columns(cls, columns, active=True):
+        r"""Build a table from a dictionary mapping parameter names to sequences of raw values,
+        without creating any parameter instance. Missing names are absent in all rows.
+        Values are coerced to the type of the column, but not validated
+        """
+        n = None
+        for k, column in columns.items():
+            if k not in cls._supported.keys():
+                raise KeyError(f"Parameter {k} not supported")
+            if n is None:
+                n = len(column)
+            elif len(column) != n:
+                raise ValueError(f"Column {k} has {len(column)} rows, expected {n}")
+        n = n or 0
+
+        values, present, actives = {}, {}, {}
+        for k, param_class in cls._supported.items():
+            if k in columns:
+                values[k] = np.asarray(columns[k], dtype=_dtype(param_class))
+                present[k] = np.ones(n, dtype=np.bool_)
+                actives[k] = np.full(n, active, dtype=np.bool_)
+            else:
+                values[k] = cls._empty(param_class, n)
+                present[k] = np.zeros(n, dtype=np.bool_)
+                actives[k] = np.zeros(n, dtype=np.bool_)
+
+        return cls(values, present, actives)
+
+    @classmethod
+    def from_sets(cls, param_sets):
+        r"""Build a table from an iterable of ParameterSets
+        """
+        param_sets = list(param_sets)
+        n = len(param_sets)
+        values, present, active = {}, {}, {}
+
+        for k, param_class in cls._supported.items():
+            default = param_class()._value
+            params = [ps.params.get(k) for ps in param_sets]
+            values[k] = np.array(
+                [default if p is None else p.machine() for p in params],
+                dtype=_dtype(param_class)
+            ).reshape(cls._shape(param_class, n))
+            present[k] = np.array([p is not None for p in params], dtype=np.bool_)
+            active[k] = np.array([p is not None and p._active for p in params], dtype=np.bool_)
+
+        return cls(values, present, active)
+
+    @staticmethod
+    def _shape(param_class, n):
+        return (n, param_class._length) if param_class._length > 1 else (n,)
+
+    @classmethod
+    def _empty(cls, param_class, n):
+        default = param_class()._value
+        return np.full(cls._shape(param_class, n), default, dtype=_dtype(param_class))
+
+    def __len__(self):
+        return len(next(iter(self.present.values()))) if self.present else 0
+
+    def keys(self):
+        return self.values.keys()
+
+    def __getitem__(self, key):
+        r"""table["iso"] returns the iso column,
+        any other key (int, slice, bool mask or index array) selects rows and returns a new table
+        """
+        if isinstance(key, str):
+            return self.values[key]
+        if isinstance(key, (int, np.integer)):
+            key = [key]
+        return self.__class__(
+            {k: v[key] for k, v in self.values.items()},
+            {k: v[key] for k, v in self.present.items()},
+            {k: v[key] for k, v in self.active.items()},
+        )
+
+    def row(self, i):
+        r"""Return row i as a ParameterSet
+        """
+        params = {}
+        for k, param_class in self._supported.items():
+            if not self.present[k][i]:
+                continue
+            value = self.values[k][i].tolist()
+            param = param_class(value=tuple(value) if param_class._length > 1 else value)
+            param._active = bool(self.active[k][i])
+            params[k] = param
+        return ParameterSet(params)
+
+    def to_sets(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def validate(self):
+        r"""Apply the BoundedParameter / CategoryParameter rules to every column.
+        Returns a dictionary mapping every name to a bool array, True where the value is valid or absent.
+        Unlike Plural.validate, out of bounds elements of a plural make the row invalid
+        """
+        result = {}
+        for k, param_class in self._supported.items():
+            singular = _singular(param_class)
+            values = self.values[k]
+
+            if singular._option_set:
+                ok = np.isin(values, list(singular._option_set))
+            elif getattr(singular, "_min_val", None) is not None and getattr(singular, "_max_val", None) is not None:
+                ok = (values >= singular._min_val) & (values <= singular._max_val)
+            else:
+                ok = np.ones(values.shape, dtype=np.bool_)
+
+            if param_class._length > 1:
+                ok = ok.all(axis=1)
+
+            result[k] = ok | ~self.present[k]
+        return result
+
+    def valid(self):
+        r"""Return a bool array, True for the rows where all present parameters are valid
+        """
+        result = np.ones(len(self), dtype=np.bool_)
+        for ok in self.validate().values():
+            result &= ok
+        return result
+
+    def _as_table(self, other):
+        if isinstance(other, ParameterSet):
+            other = self.__class__.from_sets([other])
+        if len(other) not in (1, len(self)):
+            raise ValueError(f"Cannot compare a table of {len(self)} rows with one of {len(other)} rows")
+        return other
+
+    def _same(self, other, k):
+        values = self.values[k] == other.values[k]
+        if values.ndim > 1:
+            values = values.all(axis=1)
+        return values & (self.active[k] == other.active[k])
+
+    def diff(self, other):
+        r"""Vectorized ParameterSet.__sub__.
+
+        other: a ParameterTable with one row or as many rows as this one, or a ParameterSet
+        Returns a dictionary mapping every name to a bool array,
+        True where the parameter is present in this table and absent or different in other
+        """
+        other = self._as_table(other)
+        return {
+            k: self.present[k] & ~(other.present[k] & self._same(other, k))
+            for k in self._supported.keys()
+        }
+
+    def equals(self, other):
+        r"""Vectorized ParameterSet.__eq__, returns one bool per row
+        """
+        other = self._as_table(other)
+        result = np.ones(len(self), dtype=np.bool_)
+        for k in self._supported.keys():
+            same_keys = self.present[k] == other.present[k]
+            result &= same_keys & (~self.present[k] | self._same(other, k))
+        return result
+
+    def changes(self):
+        r"""Return the diff of every row against the previous one. The first row differs in all its parameters
+        """
+        n = len(self)
+        previous = self[np.concatenate([[0], np.arange(n - 1)])] if n else self
+        result = self.diff(previous)
+        if n:
+            for k in result:
+                result[k][0] = self.present[k][0]
+        return result
+
+    def where(self, **conditions):
+        r"""Return a bool mask of the rows where every named parameter is present and equal to the given value,
+        i.e. table.where(exposure_mode="off", iso=100)
+        """
+        mask = np.ones(len(self), dtype=np.bool_)
+        for k, value in conditions.items():
+            value = self._supported[k](value=value).machine()
+            # not cast to the dtype of the column, which would truncate strings to its width
+            same = self.values[k] == np.asarray(value)
+            if same.ndim > 1:
+                same = same.all(axis=1)
+            mask &= self.present[k] & same
+        return mask
+
+    def __str__(self):
+        return f"ParameterTable({len(self)} rows)"
+
+    def __repr__(self):
+        return self.__str__()
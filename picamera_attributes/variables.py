@@ -3,10 +3,17 @@ __author__ = 'antonio'
 import logging
 logging.basicConfig(level=logging.INFO)
 import math
+import sys
+import time
+import types
 import urllib.request, urllib.error, urllib.parse
 from fractions import Fraction
 import traceback
+from picamera_attributes.cache import LRUCache
 from picamera_attributes.helpers import set_gain
+from picamera_attributes.metrics import METRICS
+from picamera_attributes.state import CameraState, Readback
+from picamera_attributes.scheduler import Scheduler
 # inputs in html
 
 # sliders -> numeric input
@@ -43,87 +50,175 @@ from picamera_attributes.helpers import set_gain
 
 
 
+# validated values are immutable, so equal values can share a single object
+# across the many parameters kept in caches and logs
+_INTERNED = {}
+_INTERNED_MAX = 65536
+
+def intern_value(value):
+    r"""Return a shared object equal to value (and of the same type)
+    """
+    if type(value) is str:
+        return sys.intern(value)
+
+    # 1 == 1.0 == True, so the type is part of the key
+    if type(value) is tuple:
+        key = (value, tuple(type(v) for v in value))
+    else:
+        key = (value, type(value))
+
+    try:
+        return _INTERNED[key]
+    except KeyError:
+        if len(_INTERNED) < _INTERNED_MAX:
+            _INTERNED[key] = value
+        return value
+    except TypeError:
+        # not hashable
+        return value
+
+
 class CameraParameter:
 
+    # instances only hold their value and whether they are active
+    # class attributes describe the parameter
+    __slots__ = ("_value", "_active")
+
     _length = 1
     _depends_on = None
+    _writable = True
+    # True if the camera takes a while to report the written value
+    _settles = False
+    # relative cost of changing the parameter in a running camera
+    _transition_cost = 1
     _var_type = None
+    # if the lenght of the data is 1
+    # its _type and _var_type are the same
+    # i.e. an item of length 1 could be str or int for both
+    # but length 2 needs to be _var_type tuple
+    _type = None
     _name = None
     _default = None
-    _value = None 
+
+    # decimal digits float values are rounded to, None to keep them as they are
+    _digits = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._compile()
+
+    @classmethod
+    def _compile(cls):
+        r"""Precompute the metadata of the class and the functions
+        used to construct and validate its instances.
+        Runs once when the class is created,
+        call it again if the class attributes are changed afterwards
+        """
+        options = getattr(cls, "_options", None) or []
+        cls._option_set = frozenset(o for o in options if o is not None)
+        cls._check = staticmethod(cls._build_check())
+        cls._coerce_value = staticmethod(cls._build_coerce())
+        cls._make = staticmethod(cls._build_make())
+        cls._validate_value = staticmethod(cls._build_validate())
 
     def __init__(self, value=None):
 
         self._active = False
+        self._value = self._make(value)
 
-        # logging.warning(f'Running {self.__class__.__name__}.__init__()')
+    @classmethod
+    def _build_make(cls):
+        r"""Return the function mapping the value passed to __init__ to the value of the instance
+        """
+        default = cls._default
+        coerce = cls._coerce_value
+        digits = cls._digits
+        plural = cls._length > 1
+
+        def make(value):
+            # if no value is provided upon initialization
+            # use _default
+            if value is None:
+                value = default
+
+            # use the first element of value if it should be length 1
+            # and we passed either a list or tuple of length 1
+            # useful for initializing with the output of
+            # urlllib.parse.parse_qs
+            elif type(value) in (list, tuple) and len(value) == 1:
+                value = coerce(value[0])
 
-        # if the lenght of the data is 1
-        # its _type and _var_type are the same
-        # i.e. an item of length 1 could be str or int for both
-        # but length 2 needs to be _var_type tuple 
-        if self._length == 1:
-            self._type = self._var_type
+            else:
+                value = coerce(value)
 
-        # if no value is provided upon initialization
-        # use _default
- 
-        if value is None:
-            self._value = self._default
-
-        # use the first element of value if it should be length 1
-        # and we passed either a list or tuple of length 1
-        # useful for initializing with the output of
-        # urlllib.parse.parse_qs
-        elif type(value) in [list, tuple] and len(value) == 1:
-            self._value = self.coerce(value[0])
-        
-        else:
-            self._value = self.coerce(value)
+            if digits is not None:
+                if plural:
+                    value = tuple((float(round(v, digits)) for v in value))
+                else:
+                    value = float(round(value, digits))
+
+            return intern_value(value)
+
+        return make
 
     def coerce(self, value):
         r"""Make sure the value entered is mapped to the _var_type and _type of the class
         In singular classes, they are the same, while in plurals, _var_type is tuple
         """
+        return self._coerce_value(value)
 
-        # if it's plural!   
-        if self._length > 1:
-
-            # if the passed value is a str
-            # split it,
-            # coerce the parts to _type
-            # and create a _var_type
-            if type(value) is str:
-                sep = "," if "," in value else ":"
+    @classmethod
+    def _build_coerce(cls):
+        r"""Return the function implementing coerce for this class
+        """
+        name = cls._name
+        length = cls._length
+        var_type = cls._var_type
+        elem_type = cls._type
+
+        # if it's plural!
+        if length > 1:
+
+            def coerce(value):
+                # if the passed value is a str
+                # split it,
+                # coerce the parts to _type
+                # and create a _var_type
+                if type(value) is str:
+                    sep = "," if "," in value else ":"
+                    try:
+                        value = var_type([elem_type(v) for v in value.split(sep)])
+                    except ValueError as e:
+                        logging.error(f"Could not coerce {value} to var_type {var_type} with data of type {elem_type}")
+                        logging.error(traceback.format_exc())
+                        raise e
+
+                # if passed a fraction, coerce to float
+                if type(value) is Fraction and elem_type is float:
+                    value = float(value)
+                    # if the _type is not float, value should not be of type Fraction
+                elif type(value) is Fraction and elem_type is not float:
+                    raise Exception
+                    # check the result is of the expected length
                 try:
-                    value = self._var_type([self._type(v) for v in  value.split(sep)])
-                except ValueError as e:
-                    logging.error(f"Could not coerce {value} to var_type {self._var_type} with data of type {self._type}")
-                    logging.error(traceback.format_exc())
+                    assert len(value) == length
+                except AssertionError as e:
+                    logging.error(f"{name} expected data of length {length}")
+                    logging.error(f"Received data of length {len(value)}")
                     raise e
 
-            # if passed a fraction, coerce to float
-            if type(value) is Fraction and self._type is float:
-                value = float(value)
-                # if the _type is not float, value should not be of type Fraction
-            elif type(value) is Fraction and self._type is not float:
-                raise Exception
-                # check the result is of the expected length
-            try:
-                assert len(value) == self._length
-            except AssertionError as e:
-               logging.error(f"{self._name} expected data of length {self._length}")
-               logging.error(f"Received data of length {len(self._value)}")
-               raise e
+                return value
 
         else:
-            try:
-                value = self._type(value)
-            except ValueError as e:
-                logging.error(f"Could not coerce {self._value} to type {self._var_type}")
-                raise e
 
-        return value
+            def coerce(value):
+                try:
+                    return elem_type(value)
+                except ValueError as e:
+                    logging.error(f"Could not coerce {value} to type {var_type}")
+                    raise e
+
+        return coerce
         
 
     @property
@@ -149,30 +244,61 @@ class CameraParameter:
     
     def validate(self):
 
-        if self._length > 1:
-            try:
-                assert len(self._value) == self._length
-            except AssertionError as e:
-                logging.error("value of {self._name} is not of length {self._length}")
-                raise e
-        
+        self._value = self._validate_value(self._value)
+        self._active = True
+        return self._active
+
+    @classmethod
+    def _build_check(cls):
+        r"""Return the function raising AssertionError if a value is not valid
+        for a singular parameter of this class
+        """
+        var_type = cls._var_type
+        accepted = (var_type, type(None))
+
+        def check(value):
             try:
-                tests = [type(v) in [self._var_type, type(None)] for v in self._value]
-                for t in tests:
-                    assert t
-                    
+                assert type(value) in accepted
             except AssertionError as e:
-                logging.error(f"Passed value must be of type {self._var_type}. You passed {self._value} ({type(self._value).__name__} type)")
+                logging.error(f"Passed value must be of type {var_type}. You passed {value} ({type(value).__name__} type)")
                 raise e
+
+        return check
+
+    @classmethod
+    def _build_validate(cls):
+        r"""Return the function implementing validate for this class.
+        It raises AssertionError if the value is not valid and returns the value to keep
+        """
+        name = cls._name
+        length = cls._length
+        var_type = cls._var_type
+        check = cls._check
+
+        if length > 1:
+
+            def validate(value):
+                try:
+                    assert len(value) == length
+                except AssertionError as e:
+                    logging.error(f"value of {name} is not of length {length}")
+                    raise e
+
+                try:
+                    for v in value:
+                        assert type(v) in (var_type, type(None))
+                except AssertionError as e:
+                    logging.error(f"Passed value must be of type {var_type}. You passed {value} ({type(value).__name__} type)")
+                    raise e
+                return value
+
         else:
-            try:
-                assert type(self._value) in [self._var_type, type(None)]
-            except AssertionError as e: 
-                logging.error(f"Passed value must be of type {self._var_type}. You passed {self._value} ({type(self._value).__name__} type)")
-                raise e
 
-        self._active = True
-        return self._active
+            def validate(value):
+                check(value)
+                return value
+
+        return validate
 
     def __str__(self):
         return f"{self.__class__.__name__}(value={self._value})"
@@ -194,8 +320,8 @@ class CameraParameter:
         else:
             return tuple((v._value for v in self._value))
 
-    def update_cam(self, camera):
-        camera = self.set(camera)
+    def update_cam(self, camera, **kwargs):
+        camera = self.set(camera, **kwargs)
         return camera
 
 
@@ -203,27 +329,41 @@ class CameraParameter:
         setattr(camera, self._name, self._value)
         return camera
 
-    def set(self, camera):
+    def set(self, camera, **kwargs):
+        self._write(camera, **kwargs)
+        return camera
+
+    def _write(self, camera, **kwargs):
+        r"""Write the value to the camera if it is active and differs from the camera's.
+        Returns True only if the value was sent and the camera took it
+        """
 
-        if self._value != self._get(camera) and self._active:
+        current = self._get(camera)
+        if self._value != current and self._active:
+            start = time.perf_counter()
             try:
-                camera = self._set(camera)
+                self._set(camera, **kwargs)
             except Exception as e:
                 logging.error(f"Could not SET parameter {self._name} to {self._value}")
                 logging.error(f"{type(self._value)}")
                 
                 logging.error(e)
                 logging.error(traceback.format_exc())
+                if METRICS.enabled: METRICS.failed(self._name)
+            else:
+                if METRICS.enabled: METRICS.write(self._name, time.perf_counter() - start)
+                return True
 
-        elif self._value == self._get(camera):
+        elif self._value == current:
             logging.debug("value in camera already identical")
+            if METRICS.enabled: METRICS.skipped(self._name)
         elif not self._active:
-            logging.warning(f"{self.__class__.__name__} is not active")
+            logging.debug(f"{self.__class__.__name__} is not active")
 
-        
-        return camera
+        return False
 
     def _get(self, camera, name=None):
+        start = time.perf_counter()
         try:
             if name is None: name = self._name
             value = getattr(camera, name)
@@ -235,21 +375,41 @@ class CameraParameter:
             logging.error(type(camera))
             logging.error(e)
             value = self._default
+            if METRICS.enabled: METRICS.failed(self._name, "read")
+        else:
+            if METRICS.enabled: METRICS.read(self._name, time.perf_counter() - start)
         
         return value
 
     def get(self, camera, name):
         return self._get(camera, name)
 
+    @classmethod
+    def _restore(cls, value, active=False):
+        r"""Create an instance holding a value that is known to be valid,
+        skipping coerce and validate
+        """
+        param = cls.__new__(cls)
+        param._value = intern_value(value)
+        param._active = active
+        return param
+
+# subclasses are compiled by __init_subclass__
+CameraParameter._compile()
+
 class BooleanParameter(CameraParameter):
 
+    __slots__ = ()
     _var_type = bool
+    _type = bool
 
 
 class CategoryParameter(CameraParameter):
 
+    __slots__ = ()
     _options = []
     _var_type = str
+    _type = str
 
     # TODO
     # Uncomment if I need to explictly inherit the __init__
@@ -257,48 +417,68 @@ class CategoryParameter(CameraParameter):
     # def __init__(self, *args, **kwargs):
     #     super().__init_(*args, **kwargs)
 
-    def validate(self):
+    @classmethod
+    def _build_check(cls):
 
-        super().validate()
-        try:
-            assert self._value in self._options
-        except AssertionError as e:
-            logging.warning(f"Passed value must be one of {self._options}")
-            raise e
+        check_type = super()._build_check()
+        options = cls._options
+        option_set = cls._option_set
+
+        def check(value):
+            check_type(value)
+            try:
+                assert value in option_set
+            except AssertionError as e:
+                logging.warning(f"Passed value must be one of {options}")
+                raise e
 
-        self._active = True 
-        return self._active 
+        return check
 
 class BoundedParameter(CameraParameter):
 
+    __slots__ = ()
     _min_val = None
     _max_val = None
     _options = [None]
     # subclasses need to define a min and a max or a list of options
-   
-    def validate(self):
 
-        if not super().validate():
-            return False
-                
-        if self._options[0] is not None:
-            try:
-                assert self._value in self._options
-            except AssertionError as e:
-                logging.error(f"Param: {self._name}. Passed value must be one of {self._options}. You passed {self._value}")
-                raise e
-        
-        elif self._max_val is not None and self._min_val is not None:
-            try:
-                assert self._value >= self._min_val and self._value <= self._max_val
-            except AssertionError as e:
-                logging.error(f"Passed value must be within [{self._min_val}, {self._max_val}]")
-                raise e
+    @classmethod
+    def _build_check(cls):
+
+        check_type = super()._build_check()
+        name = cls._name
+        options = cls._options
+        option_set = cls._option_set
+        min_val = cls._min_val
+        max_val = cls._max_val
+
+        if options[0] is not None:
+
+            def check(value):
+                check_type(value)
+                try:
+                    assert value in option_set
+                except AssertionError as e:
+                    logging.error(f"Param: {name}. Passed value must be one of {options}. You passed {value}")
+                    raise e
+
+        elif max_val is not None and min_val is not None:
+
+            def check(value):
+                check_type(value)
+                try:
+                    assert value >= min_val and value <= max_val
+                except AssertionError as e:
+                    logging.error(f"Passed value must be within [{min_val}, {max_val}]")
+                    raise e
+
         else:
-            raise AssertionError("Please define either _options OR (_min_val AND _max_val)")
 
-        self._active = True
-        return self._active
+            def check(value):
+                check_type(value)
+                raise AssertionError("Please define either _options OR (_min_val AND _max_val)")
+
+        return check
 
 
 
@@ -306,6 +486,7 @@ class BoundedParameter(CameraParameter):
 
 class IntegerBoundedParameter(BoundedParameter):
 
+    __slots__ = ()
     _var_type = int
     _type = int
 
@@ -317,22 +498,22 @@ class IntegerBoundedParameter(BoundedParameter):
 
 class FloatBoundedParameter(BoundedParameter):
 
+    __slots__ = ()
     _var_type = float
     _type = float
+    _digits = 5
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.round()
-        
     def round(self, digits=5):
         if self._length > 1:
             self._value = tuple((float(round(v, digits)) for v in self._value))
         else:
             self._value = float(round(self._value, digits))
+        self._value = intern_value(self._value)
 
 
 class Saturation(IntegerBoundedParameter):
 
+    __slots__ = ()
     _min_val = -100
     _max_val = 100
     _default = 0
@@ -340,6 +521,7 @@ class Saturation(IntegerBoundedParameter):
             
 class Sharpness(IntegerBoundedParameter):
 
+    __slots__ = ()
     _min_val = -100
     _max_val = 100
     _default = 0
@@ -347,6 +529,7 @@ class Sharpness(IntegerBoundedParameter):
     
 class Contrast(IntegerBoundedParameter):
 
+    __slots__ = ()
     _min_val = -100
     _max_val = 100
     _default = 0
@@ -354,6 +537,7 @@ class Contrast(IntegerBoundedParameter):
 
 class Brightness(IntegerBoundedParameter):
 
+    __slots__ = ()
     _min_val = -100
     _max_val = 100
     _default = 50
@@ -361,6 +545,7 @@ class Brightness(IntegerBoundedParameter):
 
 class ExposureCompensation(IntegerBoundedParameter):
 
+    __slots__ = ()
     _min_val = -25
     _max_val = 25
     _default = 0
@@ -368,12 +553,14 @@ class ExposureCompensation(IntegerBoundedParameter):
 
 class Iso(IntegerBoundedParameter):
     
+    __slots__ = ()
     _options = [0, 100, 200, 320, 400, 500, 640, 800]
     _default = 0
     _name = "iso"
 
 class Rotation(IntegerBoundedParameter):
 
+    __slots__ = ()
     _options = [0, 90, 180, 270]
     _default = 0
     _name = "rotation"
@@ -381,32 +568,42 @@ class Rotation(IntegerBoundedParameter):
 
 class Framerate(FloatBoundedParameter):
 
+    __slots__ = ()
+    # the camera pipeline is reconfigured
+    _transition_cost = 50
     _min_val = 0.0
     _max_val = 30.0
     _default = 2
     _name = "framerate"
 
 class DigitalGain(FloatBoundedParameter):
+    __slots__ = ()
     _min_val = 0.0
     _max_val = 30.0
     _default = 1.0
     _name = "digital_gain"
+    _settles = True
+    _transition_cost = 10
 
-    def _set(self, camera):
-        set_gain(camera, self._name, self._value)
+    def _set(self, camera, wait=True):
+        set_gain(camera, self._name, self._value, wait=wait)
         return camera 
  
 class AnalogGain(FloatBoundedParameter):
+    __slots__ = ()
     _min_val = 0.0
     _max_val = 30.0
     _default = 1.0
     _name = "analog_gain"
+    _settles = True
+    _transition_cost = 10
 
-    def _set(self, camera):
-        set_gain(camera, self._name, self._value)
+    def _set(self, camera, wait=True):
+        set_gain(camera, self._name, self._value, wait=wait)
         return camera 
 
 class ColorEffect(IntegerBoundedParameter):
+    __slots__ = ()
     _min_val = 0
     _max_val = 255
     _name = "color_effect"
@@ -414,6 +611,7 @@ class ColorEffect(IntegerBoundedParameter):
 
 
 class AWBGain(FloatBoundedParameter):
+    __slots__ = ()
     _min_val = 0
     _max_val = 8
     _name = "awb_gain"
@@ -422,27 +620,23 @@ class AWBGain(FloatBoundedParameter):
 
 class Plural:
 
+    __slots__ = ()
     _length = 2
     _var_type = tuple
-    _value = None
+    singular_class = None
 
-    def __init__(self, *args, **kwargs):
+    def __init_subclass__(cls, **kwargs):
         # find the method resolution order chain
-        mro = self.__class__.__mro__
-        # find in which position Plural is
-        t = [m is Plural for m in mro]    
+        mro = cls.__mro__
         # the singular class is the one after Plural
-        singular_index = [i for i, x in enumerate(t) if x][0] + 1                                                
-        # get the singular cass
-        self.singular_class = mro[singular_index]
-        # run its init method
-        mro[singular_index].__init__(self, *args, **kwargs)
+        cls.singular_class = mro[mro.index(Plural) + 1]
+        # compile the class, now that the singular class is known
+        super().__init_subclass__(**kwargs)
 
     def machine(self):
-        #import ipdb; ipdb.set_trace()
-
-        if all([isinstance(v, self.singular_class) for v in self._value]):
-            return tuple((v._value for v in self._value))
+        # elements may have been passed as instances of the singular class
+        if any([isinstance(v, CameraParameter) for v in self._value]):
+            return tuple((v._value if isinstance(v, CameraParameter) else v for v in self._value))
         else:
             return self._value
 
@@ -450,58 +644,81 @@ class Plural:
         setattr(camera, self._name, self.machine())
         return camera
 
-    def set(self, camera):
+    def _write(self, camera, **kwargs):
 
-        if self.machine() != self._get(camera) and self._active:
+        current = self._get(camera)
+        if self.machine() != current and self._active:
+            start = time.perf_counter()
             try:
-                camera = self._set(camera)
+                self._set(camera, **kwargs)
             except Exception as e:
                 logging.error(f"Could not SET Parameter {self._name} to {self.machine()}")
                 logging.error(e)
-        elif self.machine() == self._get(camera, self._name):
+                if METRICS.enabled: METRICS.failed(self._name)
+            else:
+                if METRICS.enabled: METRICS.write(self._name, time.perf_counter() - start)
+                return True
+        elif self.machine() == current:
             logging.debug("value in camera already identical")
+            if METRICS.enabled: METRICS.skipped(self._name)
         elif not self._active:
-            logging.warning(f"{self.__class__.__name__} is not active")
+            logging.debug(f"{self.__class__.__name__} is not active")
 
-        
-        return camera
+        return False
 
 
     @property
     def val(self):
         return ','.join([str(e) for e in self.machine()])
 
-    def validate(self):
+    @classmethod
+    def _build_check(cls):
+        # elements are checked as values of the singular class
+        return cls.singular_class._check
+
+    @classmethod
+    def _build_validate(cls):
         # validate the parameter if
         # all elements are of the right type and each validates
-        try:
-            assert isinstance(self._value[0], self.singular_class) and isinstance(self._value[1], self.singular_class)
-        except AssertionError as e:
+        # elements are kept as a plain tuple, not as instances of the singular class
+        singular_class = cls.singular_class
+        elem_type = cls._type
+        var_type = cls._var_type
+        check = cls._check
+
+        def validate(value):
+            # elements may have been passed as instances of the singular class
+            value = tuple((v._value if isinstance(v, CameraParameter) else v for v in value))
             try:
-                assert all([isinstance(v, self._type) for v in self._value])
-                self._value = self._var_type((self.singular_class(value=v) for v in self._value))
+                for v in value:
+                    assert isinstance(v, elem_type)
             except AssertionError as e:
-                logging.error(f"One of the elements in the tuple is not an {self.singular_class.__name__} or float")
+                logging.error(f"One of the elements in the tuple is not an {singular_class.__name__} or float")
                 raise e
-       
-        try:
-            for v in self._value:
-                v.validate()
-        except AssertionError as e:
-            logging.error(f"At least one {self.singular_class.__name__} is not valid. Please see below:")
-            logging.error(e)
 
-        self._active = True
-        return self._active 
+            value = intern_value(var_type(value))
+
+            try:
+                for v in value:
+                    check(v)
+            except AssertionError as e:
+                logging.error(f"At least one {singular_class.__name__} is not valid. Please see below:")
+                logging.error(e)
+
+            return value
+
+        return validate
 
 
 class ZoomCoord(FloatBoundedParameter):
+    __slots__ = ()
     _min_val = 0
     _max_val = 1
     _name = "zoom_coord"
     _default = 0
 
 class Dimension(IntegerBoundedParameter):
+    __slots__ = ()
     _min_val = 0
     _max_val = 3000
     _default = 500
@@ -509,24 +726,30 @@ class Dimension(IntegerBoundedParameter):
 
 class Resolution(Plural, Dimension):
 
+    __slots__ = ()
+    # the camera pipeline is reconfigured
+    _transition_cost = 50
     _length = 2
     _name = "resolution"
     _default = (1280, 960)
 
 class Zoom(Plural, ZoomCoord):
 
+    __slots__ = ()
     _length = 4
     _name = "zoom"
     _default = (0,0,1,1)
     
 class ColorEffects(Plural, ColorEffect):
 
+    __slots__ = ()
     _length = 2
     _name = "color_effects"
     _default = (128, 128)
 
 class AWBGains(Plural, AWBGain):
 
+    __slots__ = ()
     _length = 2
     _name = "awb_gains"
     _depends_on = {"awb_mode": "off"}
@@ -543,6 +766,9 @@ class AWBGains(Plural, AWBGain):
 
 class AWBMode(CategoryParameter):
 
+    __slots__ = ()
+    # the auto algorithms need to converge again
+    _transition_cost = 5
     _options = [
         "off", "auto", "sunlight", "cloudy", "shade",
         "tungsten", "fluorescent", "incandescent",
@@ -554,6 +780,9 @@ class AWBMode(CategoryParameter):
 
 class ExposureMode(CategoryParameter):
 
+    __slots__ = ()
+    # the auto algorithms need to converge again
+    _transition_cost = 5
     _options = [
         'off', 'auto', 'night', 'nightpreview', 'backlight',
         'spotlight', 'sports', 'snow', 'beach', 'verylong',
@@ -565,27 +794,30 @@ class ExposureMode(CategoryParameter):
 
 class ExposureSpeed(IntegerBoundedParameter):
 
+    __slots__ = ()
     _min_val = 0
     _max_val = math.inf
     _default = 0
     _name = "exposure_speed"
+    _writable = False
 
-    def set(self, camera):
+    def _write(self, camera, **kwargs):
         if self._name == "exposure_speed":
-            return camera
+            return False
         else:
-            return super().set(camera)
+            return super()._write(camera, **kwargs)
 
     def _get(self, camera, name=None):
         value = super()._get(camera, name)
-        logging.warning(f"{self.__class__.__name__}._get(camera) returns...")
-        logging.warning(value)
+        logging.debug(f"{self.__class__.__name__}._get(camera) returns {value}")
         return value
  
 
 class ShutterSpeed(ExposureSpeed):
 
+    __slots__ = ()
     _depends_on = {"exposure_mode": "off"}
+    _writable = True
     _min_val = 0
     _max_val = math.inf
     _default = 0
@@ -607,6 +839,59 @@ supported = {
 }
 
 
+def build_defaults(parameters):
+    r"""Return a read-only mapping of every parameter in parameters, validated, at its default value
+    """
+    defaults = {}
+    for k, v in parameters.items():
+        param = v()
+        param.validate()
+        defaults[k] = param
+    return types.MappingProxyType(defaults)
+
+# shared by every ParameterSet(default=True), which copies an instance before handing it out
+DEFAULTS = build_defaults(supported)
+
+# restore_qs caches the validated values of whole query strings,
+# and of single parameters for query strings it has not seen yet
+QS_CACHE = LRUCache(maxsize=256)
+VALUE_CACHE = LRUCache(maxsize=4096)
+
+
+class ApplyResult:
+    r"""Outcome of ParameterSet.apply
+
+    written: names of the parameters sent to the camera
+    skipped: names of the parameters already identical in the camera
+    inactive: names of the parameters not sent because they are not active
+    failed: dictionary mapping the name of a parameter to the exception raised when setting it
+    timings: dictionary mapping the name of a written parameter to the seconds it took
+    settled: False if a written gain was not reported by the camera in time
+    state: ParameterSet with the known camera state after the apply,
+        pass it as known to the next apply
+    """
+
+    def __init__(self, state):
+        self.written = []
+        self.skipped = []
+        self.inactive = []
+        self.failed = {}
+        self.timings = {}
+        self.elapsed = 0.0
+        self.settled = True
+        self.state = state
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def __str__(self):
+        return f"ApplyResult(written={self.written}, skipped={self.skipped}, inactive={self.inactive}, failed={list(self.failed.keys())}, elapsed={self.elapsed:.4f})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class ParameterSet:
 
     _supported = supported
@@ -614,20 +899,23 @@ class ParameterSet:
     def __init__(self, params: dict, default=False):
         
         self.input_params = params
-        self.params = params.copy()
+        # keys whose instances are shared with default_params,
+        # copied before they are handed out or modified
+        self._shared = set()
+        self._params = params.copy()
 
         if default:
 
-            # set default params to the a dictionary with all the parameters
-            # set to their default
-            self.default_params = {}
-            for k, v in self._supported.items():
-                param = v()
-                param.validate()
-                self.default_params[k] = param
+            # default params is a read-only dictionary with all the parameters
+            # set to their default, built once
+            if self._supported is supported:
+                self.default_params = DEFAULTS
+            else:
+                self.default_params = build_defaults(self._supported)
     
             # set self.params to a copy of default_params
-            self.params = self.default_params.copy()
+            self._params = dict(self.default_params)
+            self._shared = set(self._params.keys())
 
         # for each param in the input        
         for k, p in self.input_params.items():
@@ -640,7 +928,7 @@ class ParameterSet:
             # add it if it is the correct instance
             if isinstance(p, self._supported[k]):
                 # each param should be validated beforehand
-                self.params[k] = p
+                self[k] = p
             else:
                 # assume the passed value is not a param but the value of the param
                 # and create an instance of the param on the spot
@@ -663,7 +951,8 @@ class ParameterSet:
 
     def cross_verify(self):
 
-        for p in self.values():
+        # read only, the parameters that change are owned first
+        for p in list(self._params.values()):
 
             # try:
             #     print(p)
@@ -678,7 +967,7 @@ class ParameterSet:
                 dep_tests = []
                 for dep_name, dep_value in p._depends_on.items():
                     try:
-                        dep_inst = self.params[dep_name]
+                        dep_inst = self._params[dep_name]
                     
                     except KeyError:
                         dep_tests.append(False)
@@ -686,16 +975,14 @@ class ParameterSet:
 
                     dep_tests.append(dep_inst._value == dep_value)
                 
-                if all(dep_tests):
-                    p._active = True
-                else:
+                if not all(dep_tests):
                     logging.info(f"Parameter {p._name} cross verification failed")
                     #logging.warning(dep_tests)
-                    p._active = False
+                    self._own(p._name)._active = False
 
 
     def as_dict(self):
-        result = {p._name: p.val for p in self.values()}
+        result = {p._name: p.val for p in self._params.values()}
         return result
 
     def urlencode(self, encoding='utf-8'):
@@ -705,31 +992,182 @@ class ParameterSet:
             result = result.encode(encoding)
         return result
 
-    def restore_qs(self, qs, encoding="utf-8"):
-        if encoding is not None:
-            result = qs.decode(encoding)
-
+    def restore_qs(self, qs, encoding="utf-8", cache=True):
+        r"""Restore the set from the output of urlencode.
+        Query strings already seen are not parsed, coerced nor validated again (see QS_CACHE),
+        pass cache=False to skip the caches
+        """
+        if not cache:
+            self.__init__(self._parse_qs(qs, encoding))
+            return
+
+        if type(qs) in (bytearray, memoryview):
+            qs = bytes(qs)
+        key = (self.__class__, qs, encoding)
+        values = QS_CACHE.get(key)
+        if values is None:
+            values = self._validate_qs(qs, encoding)
+            QS_CACHE.put(key, values)
+
+        # a cached value is valid, so the instances can be restored directly
+        self.__init__({})
+        for k, value in values:
+            self.params[k] = self._supported[k]._restore(value, active=True)
+
+    @staticmethod
+    def _parse_qs(qs, encoding):
+        result = qs.decode(encoding) if encoding is not None else qs
         result = urllib.parse.parse_qs(result)
-        params_dict = {k: v[0] for k,v in result.items()}
-        self.__init__(params_dict)
-
-    def update_cam(self, camera):
-        for p in self.values():
-            if p._depends_on is None:
-                logging.warning(p._value)
-                camera = p.update_cam(camera)
-        for p in self.values():
-            if p._depends_on is not None:
-                logging.warning(p._value)
-                camera = p.update_cam(camera)
-
-
-        attributes = {}        
-        for p in self._supported.keys():
-            attributes[p] = getattr(camera, p, None) 
-            
+        return {k: v[0] for k,v in result.items()}
+
+    @classmethod
+    def _validate_qs(cls, qs, encoding):
+        r"""Return a tuple of (name, validated value) of the supported parameters in the query string
+        """
+        values = []
+        for k, raw in cls._parse_qs(qs, encoding).items():
+            if k not in cls._supported.keys():
+                logging.warning(f"Parameter {k} not supported. Ignoring it for now")
+                continue
+
+            param_class = cls._supported[k]
+            key = (param_class, raw)
+            value = VALUE_CACHE.get(key, VALUE_CACHE)
+            if value is VALUE_CACHE:
+                param = param_class(value=raw)
+                param.validate()
+                value = param.machine()
+                VALUE_CACHE.put(key, value)
+            values.append((k, value))
+        return tuple(values)
+
+    def pack(self):
+        r"""Encode the set in the binary format of picamera_attributes.wire
+        """
+        from picamera_attributes import wire
+        return wire.pack(self)
+
+    def restore_bytes(self, data):
+        r"""Restore the set from the output of pack
+        """
+        from picamera_attributes import wire
+        self.__init__(wire.unpack(data).params)
+
+    def freeze(self):
+        r"""Return an immutable, hashable picamera_attributes.frozen.FrozenParameterSet with the same parameters
+        """
+        from picamera_attributes.frozen import FrozenParameterSet
+        return FrozenParameterSet(self)
+
+    def update_cam(self, camera, journal=None, lazy=False):
+        r"""Write the parameters to the camera.
+
+        journal: picamera_attributes.journal.Journal the set is appended to once it is written,
+            stamped with the current time (or the last timestamp in the journal, if the clock stepped back)
+        lazy: if True, the attributes are not read until one of them is accessed
+
+        Returns the camera and a dictionary with the supported attributes read back from it.
+        With lazy, a state.Readback mapping instead: its values are a snapshot taken on the first access,
+        so they reflect any write made to the camera before that, not only this call.
+        Written attributes come from the cache of the camera state in both cases
+        """
+        # read and write through a shadow of the camera state
+        # so every attribute crosses into MMAL at most once
+        start = time.perf_counter()
+        state = camera if isinstance(camera, CameraState) else CameraState(camera)
+
+        def write(p, camera, **kwargs):
+            logging.debug(f"Updating {p._name} to {p._value}")
+            return p._write(camera, **kwargs)
+
+        # parameters are written after the ones they depend on,
+        # with a single wait for those that need to settle
+        Scheduler(self.params).run(state, write)
+
+        attributes = Readback(state, self._supported.keys())
+        if not lazy:
+            attributes = attributes.materialise()
+
+        if journal is not None:
+            journal.append(self)
+
+        if METRICS.enabled: METRICS.observe("update_cam_seconds", "update_cam", time.perf_counter() - start)
         return camera, attributes
 
+    @classmethod
+    def read_cam(cls, camera, keys=None):
+        r"""Read the current value of the parameters in keys from the camera, once each.
+        Attributes that cannot be read are left out of the returned ParameterSet
+        """
+        if keys is None:
+            keys = cls._supported.keys()
+
+        state = cls({})
+        for k in keys:
+            try:
+                state[k] = cls._supported[k](value=getattr(camera, k))
+            except Exception as e:
+                logging.debug(f"Could not GET parameter {k}: {e}")
+
+        return state
+
+    def apply(self, camera, known=None, writer=None, wait=True, **settle):
+        r"""Write to the camera only the parameters that differ from its known state.
+
+        camera: the picamera.PiCamera() instance you are configuring
+        known: ParameterSet with the values the camera currently holds,
+            i.e. the state of the ApplyResult returned by the previous apply.
+            If None, the camera is read once for every parameter that could be written
+        writer: callable with signature writer(param, camera, **kwargs) sending one parameter to the camera,
+            CameraParameter._set by default (i.e. picamera_attributes.mmal_backend.MMALBackend.write_param)
+        wait: if False, do not wait for the written gains to settle
+        settle: tolerance, timeout and poll_interval of the wait, see Scheduler
+
+        Returns an ApplyResult
+        """
+        start = time.perf_counter()
+        writable = [k for k, p in self.items() if p._writable]
+
+        if known is None:
+            known = self.read_cam(camera, [k for k in writable if self[k]._active])
+
+        result = ApplyResult(state=known.copy())
+        if writer is None:
+            writer = lambda p, camera, **kwargs: p._set(camera, **kwargs)
+
+        def write(p, camera, **kwargs):
+            k = p._name
+            if not p._active:
+                result.inactive.append(k)
+                return False
+
+            if k in known.keys() and known[k].machine() == p.machine():
+                result.skipped.append(k)
+                if METRICS.enabled: METRICS.skipped(k)
+                return False
+
+            t0 = time.perf_counter()
+            try:
+                writer(p, camera, **kwargs)
+            except Exception as e:
+                logging.error(f"Could not SET parameter {k} to {p.machine()}")
+                logging.error(e)
+                result.failed[k] = e
+                written = False
+                if METRICS.enabled: METRICS.failed(k)
+            else:
+                result.written.append(k)
+                result.state[k] = p
+                written = True
+            result.timings[k] = time.perf_counter() - t0
+            if written and METRICS.enabled: METRICS.write(k, result.timings[k])
+            return written
+
+        result.settled = Scheduler({k: self[k] for k in writable}, **settle).run(camera, write, wait=wait)
+        result.elapsed = time.perf_counter() - start
+        if METRICS.enabled: METRICS.observe("update_cam_seconds", "apply", result.elapsed)
+        return result
+
     def pickle(self, dst):
         import pickle
         with open(dst, 'wb') as fh:
@@ -739,9 +1177,45 @@ class ParameterSet:
     def copy(self):
 
         clu = self.__class__({})
-        clu.params = self.params.copy()
+        clu._params = self._params.copy()
+        clu._shared = set(self._shared)
         return clu
 
+    def _own(self, name):
+        r"""Return the parameter name, copying it first if it is shared with default_params
+        """
+        param = self._params[name]
+        if name in self._shared:
+            param = param.__class__._restore(param._value, active=param._active)
+            self._params[name] = param
+            self._shared.discard(name)
+        return param
+
+    @property
+    def params(self):
+        r"""Dictionary mapping names to the parameters of the set,
+        none of them shared with default_params
+        """
+        for name in list(self._shared):
+            self._own(name)
+        return self._params
+
+    @params.setter
+    def params(self, params):
+        self._params = params
+        self._shared = set()
+
+    def merge(self, other):
+        r"""Return a new set with the parameters of self updated with those of other.
+        Parameters are instantiated again from their values,
+        so dependencies are cross verified from scratch
+        """
+        params = {k: p.machine() for k, p in self._params.items()}
+        params.update({k: p.machine() for k, p in other.items()})
+        merged = self.__class__(params)
+        merged.cross_verify()
+        return merged
+
 
     def __str__(self):
         return f"ParameterSet({self.as_dict()})"
@@ -752,32 +1226,38 @@ class ParameterSet:
         if not keys_are_shared:
             return False
 
-        return all([self[k] == other[k] for k in self.keys()])
+        # other._params, so comparing does not copy the defaults other shares
+        return all([self._params[k] == other._params[k] for k in self.keys()])
 
     def __sub__(self, other):
 
         final_set = self.copy()
-        for k, p in self.items():
+        for k, p in self._params.items():
             if k in other.keys():
-                if p == other[k]:
+                if p == other._params[k]:
                     final_set.pop(k)
 
         return final_set
 
     def __setitem__(self, key, value):
-        self.params[key] = value
+        self._params[key] = value
+        self._shared.discard(key)
 
     def __getitem__(self, name):
-        return self.params[name]
+        if name in self._shared:
+            return self._own(name)
+        return self._params[name]
 
     def __delitem__(self, name):
-        del self.params[name]
+        del self._params[name]
+        self._shared.discard(name)
 
     def pop(self, name):
-        return self.params.pop(name)
+        self._shared.discard(name)
+        return self._params.pop(name)
 
     def keys(self):
-        return self.params.keys()
+        return self._params.keys()
 
     def values(self):
         return self.params.values()
@@ -786,13 +1266,13 @@ class ParameterSet:
         return self.params.items()
 
     def __iter__(self):
-        return self.params.keys()
+        return iter(self._params.keys())
 
 
     def __getattr__(self, name):
 
         if name in self._supported.keys():
-            return self.params[name]
+            return self[name]
         else:
             super().__getattribute__(name)
 
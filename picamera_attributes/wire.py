@@ -0,0 +1,262 @@
+r"""Compact binary encoding of a ParameterSet, alongside urlencode / restore_qs.
+
+A record is a fixed-size little endian struct:
+
+    magic       2s   b"PA"
+    version     B    VERSION
+    flags       B    FLAG_SPARSE if only the present fields follow
+    layout      I    checksum of the field layout, changes whenever supported does
+    present     I    bit i is set if the i-th supported parameter is in the set
+    active      I    bit i is set if the i-th supported parameter is active
+    fields           one per supported parameter, in the order of supported,
+                     zero filled if the parameter is not present
+
+Integers are packed in the smallest type their bounds allow, floats as doubles,
+categories as the index of the value in _options and plurals as _length elements.
+Fields have a fixed offset, so WireView reads single parameters out of a memoryview
+without decoding (or copying) the whole record.
+
+Sparse records (pack(param_set, sparse=True)) carry only the present fields, in the same order,
+which keeps records of a few changed parameters (i.e. deltas) small.
+"""
+__author__ = 'antonio'
+
+import functools
+import struct
+import zlib
+
+from picamera_attributes.variables import ParameterSet, supported
+
+
+MAGIC = b"PA"
+VERSION = 1
+FLAG_SPARSE = 1
+
+HEADER = struct.Struct("<2sBBIII")
+
+
+def _int_format(param_class):
+    options = [o for o in (getattr(param_class, "_options", None) or []) if o is not None]
+    low = getattr(param_class, "_min_val", None)
+    high = getattr(param_class, "_max_val", None)
+    if options:
+        low, high = min(options), max(options)
+    if low is None or high is None:
+        return "q"
+
+    for fmt, bits in (("b", 8), ("h", 16), ("i", 32)):
+        if -2 ** (bits - 1) <= low and high < 2 ** (bits - 1):
+            return fmt
+    return "q"
+
+
+class Field:
+    r"""Position and encoding of one supported parameter in a record
+    """
+
+    def __init__(self, index, name, param_class, offset):
+        self.index = index
+        self.name = name
+        self.param_class = param_class
+        self.length = param_class._length
+        self.plural = self.length > 1
+        self.options = None
+
+        singular = param_class.singular_class if self.plural else param_class
+        self.check = singular._check
+        if singular._type is str:
+            self.options = list(singular._options)
+            self._codes = {o: i for i, o in enumerate(self.options)}
+            fmt = "B"
+        elif singular._type is float:
+            fmt = "d"
+        elif singular._type is bool:
+            fmt = "?"
+        else:
+            fmt = _int_format(singular)
+
+        self.format = f"{self.length}{fmt}" if self.plural else fmt
+        self.struct = struct.Struct("<" + self.format)
+        self.offset = offset
+        self.size = self.struct.size
+        self.empty = (0, ) * self.length
+
+    def _check_values(self, values):
+        try:
+            for v in values:
+                self.check(v)
+        except AssertionError:
+            raise ValueError(f"{self.name} {values if self.plural else values[0]} is not valid")
+
+    def encode(self, value):
+        r"""Return the values to pack for the field, raises ValueError if it is not valid for the parameter,
+        so only records unpack accepts are written
+        """
+        if self.options is not None:
+            try:
+                return (self._codes[value], )
+            except KeyError:
+                raise ValueError(f"{self.name} {value} is not one of {self.options}")
+        values = tuple(value) if self.plural else (value, )
+        self._check_values(values)
+        return values
+
+    def decode(self, values):
+        r"""Return the value of the field, raises ValueError if it is not valid for the parameter
+        """
+        if self.options is not None:
+            code = values[0]
+            if code >= len(self.options):
+                raise ValueError(f"{self.name} code {code} is not the index of one of {self.options}")
+            return self.options[code]
+
+        self._check_values(values)
+
+        if self.plural:
+            return tuple(values)
+        return values[0]
+
+    def __repr__(self):
+        return f"Field({self.name}, format={self.format}, offset={self.offset})"
+
+
+def _layout():
+    fields = []
+    offset = HEADER.size
+    for i, (name, param_class) in enumerate(supported.items()):
+        field = Field(i, name, param_class, offset)
+        fields.append(field)
+        offset += field.size
+    return fields
+
+
+FIELDS = _layout()
+FIELDS_BY_NAME = {f.name: f for f in FIELDS}
+RECORD = struct.Struct(HEADER.format + "".join(f.format for f in FIELDS))
+LAYOUT = zlib.crc32(";".join(f"{f.name}:{f.format}" for f in FIELDS).encode())
+
+assert len(FIELDS) <= 32, "The presence bitmap holds up to 32 parameters"
+
+
+@functools.lru_cache(maxsize=1024)
+def _sparse_record(present):
+    r"""Struct of a sparse record with the fields in the present bitmap
+    """
+    fields = [f for f in FIELDS if present >> f.index & 1]
+    return struct.Struct(HEADER.format + "".join(f.format for f in fields)), fields
+
+
+def pack(param_set, sparse=False):
+    r"""Encode a ParameterSet as a record of RECORD.size bytes,
+    or as a sparse record with only the parameters in the set.
+    Raises ValueError if a value is not valid for its parameter, i.e. a plural with an element out of bounds
+    """
+    present = 0
+    active = 0
+    values = []
+    for field in FIELDS:
+        param = param_set.params.get(field.name)
+        if param is None:
+            if not sparse:
+                values.extend(field.empty)
+            continue
+
+        present |= 1 << field.index
+        if param._active:
+            active |= 1 << field.index
+        values.extend(field.encode(param.machine()))
+
+    try:
+        if sparse:
+            record, _ = _sparse_record(present)
+            return record.pack(MAGIC, VERSION, FLAG_SPARSE, LAYOUT, present, active, *values)
+        return RECORD.pack(MAGIC, VERSION, 0, LAYOUT, present, active, *values)
+    except struct.error as e:
+        raise ValueError(f"Could not pack {param_set}: {e}")
+
+
+def _check_header(buffer):
+    if len(buffer) < HEADER.size:
+        raise ValueError(f"Record of {len(buffer)} bytes is too short")
+    magic, version, flags, layout, present, active = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"Not a ParameterSet record (magic {magic!r})")
+    if version != VERSION:
+        raise ValueError(f"Record version {version} is not supported, expected {VERSION}")
+    if layout != LAYOUT:
+        raise ValueError("Record was packed with a different set of supported parameters")
+
+    size = _sparse_record(present)[0].size if flags & FLAG_SPARSE else RECORD.size
+    if len(buffer) < size:
+        raise ValueError(f"Record of {len(buffer)} bytes is too short, expected {size}")
+    return flags, present, active
+
+
+class WireView:
+    r"""Read-only access to the parameters of a packed record, without decoding all of it.
+
+    buffer: bytes, bytearray, memoryview or any object supporting the buffer protocol
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer)
+        flags, self._present, self._active = _check_header(self.buffer)
+
+        if flags & FLAG_SPARSE:
+            # fields follow one another, in the order of supported
+            self._offsets = {}
+            offset = HEADER.size
+            for field in _sparse_record(self._present)[1]:
+                self._offsets[field.name] = offset
+                offset += field.size
+        else:
+            self._offsets = {f.name: f.offset for f in FIELDS}
+
+    def __contains__(self, name):
+        field = FIELDS_BY_NAME.get(name)
+        return field is not None and bool(self._present >> field.index & 1)
+
+    def keys(self):
+        return [f.name for f in FIELDS if self._present >> f.index & 1]
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        field = FIELDS_BY_NAME[name]
+        return field.decode(field.struct.unpack_from(self.buffer, self._offsets[name]))
+
+    def is_active(self, name):
+        return name in self and bool(self._active >> FIELDS_BY_NAME[name].index & 1)
+
+    def to_set(self):
+        return unpack(self.buffer)
+
+    def __repr__(self):
+        return f"WireView({self.keys()})"
+
+
+def unpack(buffer):
+    r"""Decode a record into a ParameterSet.
+    Values are checked against the bounds and options of their parameter, but not coerced.
+    Raises ValueError if one of them is not valid
+    """
+    flags, present, active = _check_header(buffer)
+    if flags & FLAG_SPARSE:
+        record, fields = _sparse_record(present)
+    else:
+        record, fields = RECORD, FIELDS
+
+    # skip the 6 header fields
+    values = record.unpack_from(buffer)[6:]
+
+    params = {}
+    position = 0
+    for field in fields:
+        chunk = values[position:position + field.length]
+        position += field.length
+        if present >> field.index & 1:
+            params[field.name] = field.param_class._restore(
+                field.decode(chunk), active=bool(active >> field.index & 1)
+            )
+
+    return ParameterSet(params)
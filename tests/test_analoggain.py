@@ -2,7 +2,7 @@ import logging
 import unittest
 import time
 
-from picamera_attributes import variables
+from picamera_attributes import variables, simulation
 
 class TestAnalogGain(unittest.TestCase):
 
@@ -37,6 +37,25 @@ class TestAnalogGain(unittest.TestCase):
         except ImportError as e:
             pass
 
+    def test_updatecam_simulated(self):
+
+        self.param.validate()
+        with simulation.install():
+            camera = simulation.FakeCamera(gain_delay=0.05)
+            camera.exposure_mode = "off"
+
+            camera = self.param.update_cam(camera)
+            self.assertEqual(float(camera.analog_gain), self._value)
+
+    def test_updatecam_old_userland(self):
+
+        self.param.validate()
+        with simulation.install():
+            camera = simulation.FakeCamera(mmal_status=4)
+            camera.exposure_mode = "off"
+            with self.assertRaises(simulation.PiCameraMMALError):
+                self.param._set(camera)
+
        
 
 if __name__ == '__main__':
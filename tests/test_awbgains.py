@@ -23,6 +23,20 @@ class TestAWBGains(unittest.TestCase):
     def test_valid_val(self):
         self.assertTrue(self.param.val == '1.0,1.0')
         self.assertTrue(self.param_plural.val == '1.0,1.0')       
+
+    def test_compact_value(self):
+        self.param.validate()
+        self.param_plural.validate()
+        self.assertEqual(self.param._value, (1.0, 1.0))
+        self.assertIs(self.param._value, self.param_plural._value)
+        self.assertFalse(hasattr(self.param, "__dict__"))
+        self.assertIs(self.param.singular_class, variables.AWBGain)
+
+    def test_invalid_element_type(self):
+        param = variables.AWBGains(value=(1, 1))
+        param._value = ("a", 1.0)
+        with self.assertRaises(AssertionError):
+            param.validate()
         
 
 if __name__ == '__main__':
@@ -26,6 +26,16 @@ class TestAWBMode(unittest.TestCase):
             valid = False
 
         self.assertFalse(valid)
+
+    def test_compiled_subclass(self):
+
+        class NightOnly(variables.AWBMode):
+            _options = ["off"]
+
+        self.assertEqual(NightOnly._option_set, frozenset(["off"]))
+        with self.assertRaises(AssertionError):
+            NightOnly(value="auto").validate()
+        self.assertTrue(NightOnly(value="off").validate())
         
 
 if __name__ == '__main__':
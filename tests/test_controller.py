@@ -0,0 +1,105 @@
+import threading
+import time
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.controller import CameraController
+from picamera_attributes.variables import ParameterSet
+
+
+class RejectingCamera(simulation.FakeCamera):
+    r"""Refuses every ISO above 400"""
+
+    @property
+    def iso(self):
+        return self._values["iso"]
+
+    @iso.setter
+    def iso(self, value):
+        if value > 400:
+            raise ValueError(f"ISO {value} refused")
+        self._values["iso"] = value
+
+
+class TestCameraController(unittest.TestCase):
+
+    def test_coalesce(self):
+        camera = simulation.FakeCamera(write_latency=0.05)
+        with CameraController(camera) as controller:
+            first = controller.submit({"brightness": 10})
+            while controller.pending().keys():
+                time.sleep(0.001)
+            # submitted while the first write is in flight
+            futures = [controller.submit({"brightness": b}) for b in range(20, 30)]
+            futures.append(controller.submit(ParameterSet({"contrast": 5})))
+            result = futures[-1].result(timeout=2)
+
+        self.assertTrue(first.result().ok)
+        self.assertTrue(result.ok)
+        self.assertTrue(all(f is futures[0] for f in futures))
+        self.assertEqual(camera.brightness, 29)
+        self.assertEqual(camera.contrast, 5)
+        self.assertEqual(camera.writes["brightness"], 2)
+        self.assertEqual(controller.applies, 2)
+        self.assertEqual(controller.state.as_dict(), {"brightness": 29, "contrast": 5})
+
+    def test_submit_from_threads(self):
+        camera = simulation.FakeCamera(write_latency=0.01)
+        with CameraController(camera) as controller:
+            threads = [
+                threading.Thread(target=controller.submit, args=({"sharpness": i},))
+                for i in range(10)
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertEqual(len(controller.pending().keys()), 0)
+        self.assertEqual(controller.state["sharpness"].machine(), camera.sharpness)
+        self.assertLessEqual(camera.writes["sharpness"], 10)
+
+    def test_stop(self):
+        camera = simulation.FakeCamera(write_latency=0.05)
+        controller = CameraController(camera).start()
+        controller.submit({"brightness": 10})
+        while controller.pending().keys():
+            time.sleep(0.001)
+        # queued while the first write is in flight
+        future = controller.submit({"brightness": 20})
+        controller.stop(drain=False)
+        with self.assertRaises(RuntimeError):
+            controller.submit({"brightness": 30})
+
+        self.assertTrue(future.cancelled())
+        self.assertEqual(camera.writes["brightness"], 1)
+        self.assertEqual(camera.brightness, 10)
+
+    def test_failed_keeps_previous_state(self):
+        camera = RejectingCamera()
+        with CameraController(camera) as controller:
+            controller.submit({"iso": 200}).result(timeout=2)
+            result = controller.submit({"iso": 800, "brightness": 60}).result(timeout=2)
+            self.assertEqual(list(result.failed.keys()), ["iso"])
+            self.assertEqual(controller.state.as_dict(), {"iso": 200, "brightness": 60})
+
+            # the refused value is not mistaken for the camera state, so it is tried again
+            result = controller.submit({"iso": 800}).result(timeout=2)
+            self.assertEqual(list(result.failed.keys()), ["iso"])
+
+    def test_inactive_is_not_kept(self):
+        camera = simulation.FakeCamera()
+        with CameraController(camera) as controller:
+            # shutter_speed is not written under auto exposure
+            result = controller.submit({"shutter_speed": 10000}).result(timeout=2)
+            self.assertEqual(result.inactive, ["shutter_speed"])
+            self.assertEqual(controller.state.as_dict(), {})
+            self.assertEqual(camera.shutter_speed, 0)
+
+            controller.submit({"exposure_mode": "off", "shutter_speed": 10000}).result(timeout=2)
+            self.assertEqual(controller.state.as_dict(), {"exposure_mode": "off", "shutter_speed": 10000})
+            self.assertEqual(camera.shutter_speed, 10000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+
+from picamera_attributes import delta
+from picamera_attributes.delta import DeltaSender, DeltaReceiver
+from picamera_attributes.variables import ParameterSet
+
+
+def make_set(**params):
+    param_set = ParameterSet(params)
+    param_set.cross_verify()
+    return param_set
+
+
+class TestDeltaStream(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = DeltaSender()
+        self.gaps = []
+        self.receiver = DeltaReceiver(on_gap=self.gaps.append)
+        self.base = dict(iso=100, brightness=50, exposure_mode="off", shutter_speed=10000, zoom=(0, 0, 1, 1))
+
+    def test_first_update_is_snapshot(self):
+        message = self.sender.update(make_set(**self.base))
+        self.assertEqual(delta.decode(message)[0], delta.SNAPSHOT)
+        self.assertTrue(self.receiver.receive(message))
+        self.assertTrue(self.receiver.state == make_set(**self.base))
+
+    def test_delta_is_small(self):
+        self.receiver.receive(self.sender.update(make_set(**self.base)))
+        message = self.sender.update(make_set(**dict(self.base, brightness=51)))
+        kind, stream, version, base_version, param_set = delta.decode(message)
+        self.assertEqual((kind, stream, version, base_version), (delta.DELTA, self.sender.stream, 2, 1))
+        self.assertEqual(list(param_set.keys()), ["brightness"])
+        self.assertLess(len(message), 32)
+
+        self.assertTrue(self.receiver.receive(message))
+        self.assertEqual(self.receiver.state["brightness"].machine(), 51)
+        self.assertTrue(self.receiver.state == make_set(**dict(self.base, brightness=51)))
+
+    def test_unchanged(self):
+        self.sender.update(make_set(**self.base))
+        self.assertIsNone(self.sender.update(make_set(**self.base)))
+
+    def test_invalid_update(self):
+        self.receiver.receive(self.sender.update(make_set(**self.base)))
+        with self.assertRaises(ValueError):
+            self.sender.update(make_set(**dict(self.base, zoom=(0, 0, 2, 1))))
+        self.assertEqual(self.sender.version, 1)
+
+        # the stream goes on from the last valid state
+        self.assertTrue(self.receiver.receive(self.sender.update(make_set(**dict(self.base, iso=200)))))
+        self.assertEqual(self.receiver.version, 2)
+
+    def test_gap(self):
+        self.receiver.receive(self.sender.update(make_set(**self.base)))
+        self.sender.update(make_set(**dict(self.base, brightness=51)))
+        message = self.sender.update(make_set(**dict(self.base, brightness=52)))
+
+        self.assertFalse(self.receiver.receive(message))
+        self.assertTrue(self.receiver.needs_snapshot)
+        self.assertEqual(self.gaps, [self.receiver])
+
+        self.assertTrue(self.receiver.receive(self.sender.snapshot()))
+        self.assertEqual(self.receiver.version, 3)
+        self.assertEqual(self.receiver.state["brightness"].machine(), 52)
+
+    def test_late_receiver(self):
+        self.sender.update(make_set(**self.base))
+        first = self.sender.update(make_set(**dict(self.base, brightness=51)))
+        second = self.sender.update(make_set(**dict(self.base, brightness=52)))
+
+        self.assertFalse(self.receiver.receive(first))
+        self.assertFalse(self.receiver.receive(second))
+        # asked for a snapshot once, the second request is within gap_interval
+        self.assertEqual(self.gaps, [self.receiver])
+
+        self.receiver.gap_interval = 0
+        self.assertFalse(self.receiver.receive(second))
+        self.assertEqual(len(self.gaps), 2)
+
+        self.assertTrue(self.receiver.receive(self.sender.snapshot()))
+        self.assertEqual(self.receiver.state["brightness"].machine(), 52)
+
+    def test_sender_restart(self):
+        self.receiver.receive(self.sender.update(make_set(**self.base)))
+        self.receiver.receive(self.sender.update(make_set(**dict(self.base, brightness=51))))
+        self.receiver.receive(self.sender.update(make_set(**dict(self.base, brightness=52))))
+        self.assertEqual(self.receiver.version, 3)
+
+        # the restarted sender numbers from 1 again, and its first snapshot is lost
+        restarted = DeltaSender()
+        restarted.update(make_set(**self.base))
+        message = restarted.update(make_set(**dict(self.base, iso=200)))
+        self.assertFalse(self.receiver.receive(message))
+        self.assertTrue(self.receiver.needs_snapshot)
+        self.assertEqual(self.gaps, [self.receiver])
+
+        self.assertTrue(self.receiver.receive(restarted.snapshot()))
+        self.assertEqual(self.receiver.version, 2)
+        self.assertTrue(self.receiver.state == make_set(**dict(self.base, iso=200)))
+        self.assertTrue(self.receiver.receive(restarted.update(make_set(**dict(self.base, iso=400)))))
+        self.assertEqual(self.receiver.state["iso"].machine(), 400)
+
+    def test_old_snapshot(self):
+        first = self.sender.update(make_set(**self.base))
+        self.receiver.receive(first)
+        self.receiver.receive(self.sender.update(make_set(**dict(self.base, brightness=51))))
+        self.assertFalse(self.receiver.receive(first))
+        self.assertEqual(self.receiver.state["brightness"].machine(), 51)
+
+    def test_removed_parameter_sends_snapshot(self):
+        self.sender.update(make_set(**self.base))
+        params = dict(self.base)
+        params.pop("zoom")
+        message = self.sender.update(make_set(**params))
+        self.assertEqual(delta.decode(message)[0], delta.SNAPSHOT)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import pickle
+import unittest
+
+from picamera_attributes import wire
+from picamera_attributes.frozen import FrozenParameterSet
+from picamera_attributes.variables import Iso, ParameterSet
+
+
+def make_set(**params):
+    param_set = ParameterSet(params)
+    param_set.cross_verify()
+    return param_set
+
+
+class TestFrozenParameterSet(unittest.TestCase):
+
+    def setUp(self):
+        self.param_set = make_set(iso=200, exposure_mode="auto", shutter_speed=10000, awb_gains=(1.8, 1.5))
+        self.frozen = self.param_set.freeze()
+
+    def test_hash(self):
+        other = make_set(awb_gains="1.8,1.5", shutter_speed=10000, exposure_mode="auto", iso=200).freeze()
+        self.assertEqual(self.frozen, other)
+        self.assertEqual(hash(self.frozen), hash(other))
+        cache = {self.frozen: "plan"}
+        self.assertEqual(cache[other], "plan")
+
+        different = make_set(iso=200, exposure_mode="off", shutter_speed=10000, awb_gains=(1.8, 1.5)).freeze()
+        self.assertNotEqual(self.frozen, different)
+        self.assertNotIn(different, cache)
+
+    def test_immutable(self):
+        with self.assertRaises(AttributeError):
+            self.frozen.foo = 1
+        # parameters handed out are copies
+        self.frozen["iso"]._value = 800
+        self.assertEqual(self.frozen.value("iso"), 200)
+        # changing the source set does not change the frozen one
+        self.param_set["iso"]._value = 800
+        self.assertEqual(self.frozen.value("iso"), 200)
+
+    def test_replace(self):
+        brighter = self.frozen.replace({"brightness": 60, "iso": 400})
+        self.assertEqual(brighter.value("brightness"), 60)
+        self.assertEqual(brighter.value("iso"), 400)
+        self.assertNotIn("brightness", self.frozen)
+        self.assertIs(brighter._entries["awb_gains"], self.frozen._entries["awb_gains"])
+        self.assertEqual(self.frozen.replace({"iso": 200}), self.frozen)
+        self.assertEqual(sorted(self.frozen.without("iso").keys()), ["awb_gains", "exposure_mode", "shutter_speed"])
+        with self.assertRaises(KeyError):
+            self.frozen.replace({"foo": 1})
+
+    def test_replace_checks(self):
+        with self.assertRaises(TypeError):
+            self.frozen.replace({"brightness": Iso(value=100)})
+
+        manual = make_set(exposure_mode="off", shutter_speed=10000).freeze()
+        self.assertTrue(manual.is_active("shutter_speed"))
+        auto = manual.replace({"exposure_mode": "auto"})
+        self.assertFalse(auto.is_active("shutter_speed"))
+        # shutter_speed replaced under auto exposure is not active either
+        self.assertFalse(self.frozen.replace({"shutter_speed": 20000}).is_active("shutter_speed"))
+
+    def test_replace_reactivates(self):
+        # shutter_speed is inactive under auto exposure, as ParameterSet.merge it comes back with exposure_mode off
+        self.assertFalse(self.frozen.is_active("shutter_speed"))
+        manual = self.frozen.replace({"exposure_mode": "off"})
+        self.assertTrue(manual.is_active("shutter_speed"))
+        self.assertEqual(manual.value("shutter_speed"), 10000)
+        self.assertEqual(manual, self.param_set.merge(make_set(exposure_mode="off")).freeze())
+
+    def test_thaw(self):
+        thawed = self.frozen.thaw()
+        self.assertTrue(thawed == self.param_set)
+        self.assertEqual(self.frozen, thawed)
+        self.assertFalse(thawed["shutter_speed"]._active)
+
+    def test_pack(self):
+        packed = self.frozen.pack()
+        self.assertIs(self.frozen.pack(), packed)
+        self.assertTrue(wire.unpack(packed) == self.param_set)
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.frozen))
+        self.assertEqual(restored, self.frozen)
+        self.assertEqual(hash(restored), hash(self.frozen))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import time
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.helpers import GainController, wait_for_gains, wait_for_gains_async
+from picamera_attributes.state import CameraState
+
+
+class SlowGainCamera:
+    """Reports the new gain only after a delay, like the sensor does"""
+
+    def __init__(self, analog_gain, delay):
+        self._target = analog_gain
+        self._since = time.monotonic() + delay
+
+    @property
+    def analog_gain(self):
+        if time.monotonic() >= self._since:
+            return self._target
+        return 1.0
+
+
+class TestWaitForGains(unittest.TestCase):
+
+    def test_returns_on_convergence(self):
+        camera = SlowGainCamera(analog_gain=4.0, delay=0.05)
+        start = time.monotonic()
+        self.assertTrue(wait_for_gains(camera, {"analog_gain": 4.0}, timeout=1, poll_interval=0.01))
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_tolerance(self):
+        camera = SlowGainCamera(analog_gain=5.333, delay=0)
+        self.assertTrue(wait_for_gains(camera, {"analog_gain": 5.3}, timeout=0))
+
+    def test_timeout(self):
+        camera = SlowGainCamera(analog_gain=4.0, delay=10)
+        self.assertFalse(wait_for_gains(camera, {"analog_gain": 4.0}, timeout=0.05, poll_interval=0.01))
+
+    def test_async(self):
+        camera = SlowGainCamera(analog_gain=4.0, delay=0.05)
+        converged = asyncio.run(wait_for_gains_async(camera, {"analog_gain": 4.0}, timeout=1, poll_interval=0.01))
+        self.assertTrue(converged)
+
+
+class TestGainController(unittest.TestCase):
+
+    def setUp(self):
+        self.install = simulation.install()
+        self.install.__enter__()
+        self.addCleanup(self.install.__exit__, None, None, None)
+        self.camera = simulation.FakeCamera(gain_delay=0.05)
+        self.camera.exposure_mode = "off"
+
+    def test_set_both(self):
+        controller = GainController(self.camera, poll_interval=0.01)
+        start = time.monotonic()
+        self.assertTrue(controller.set(analog=3.0, digital=2.0))
+        # a single wait covers both gains
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(float(self.camera.analog_gain), 3.0)
+        self.assertEqual(float(self.camera.digital_gain), 2.0)
+
+    def test_set_one(self):
+        controller = GainController(self.camera)
+        self.assertTrue(controller.set(digital=2.0, wait=False))
+        self.assertEqual(self.camera.writes["digital_gain"], 1)
+        self.assertEqual(self.camera.writes["analog_gain"], 0)
+        self.assertTrue(controller.set())
+
+    def test_error(self):
+        self.camera.mmal_status = 4
+        controller = GainController(self.camera)
+        with self.assertRaises(simulation.PiCameraMMALError):
+            controller.set(analog=3.0)
+
+    def test_camera_state(self):
+        state = CameraState(self.camera)
+        # cache the current gain
+        state.analog_gain
+        GainController(state, poll_interval=0.01).set(analog=3.0)
+        self.assertEqual(float(state.analog_gain), 3.0)
+
+    def test_async(self):
+        controller = GainController(self.camera, poll_interval=0.01)
+        self.assertTrue(asyncio.run(controller.set_async(analog=3.0, digital=2.0)))
+        self.assertEqual(float(self.camera.digital_gain), 2.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
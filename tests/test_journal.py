@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.journal import Journal, INDEX
+from picamera_attributes.variables import ParameterSet
+
+
+def make_set(**params):
+    param_set = ParameterSet(params)
+    param_set.cross_verify()
+    return param_set
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "camera.journal")
+        isos = [100, 200, 320, 400, 500, 640, 800, 100]
+        self.sets = [make_set(iso=iso, brightness=i, exposure_mode="off") for i, iso in enumerate(isos)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fill(self, journal):
+        for i, param_set in enumerate(self.sets):
+            journal.append(param_set, timestamp=1000.0 + 10 * i)
+
+    def test_roundtrip(self):
+        with Journal(self.path) as journal:
+            self.fill(journal)
+            self.assertEqual(len(journal), 8)
+            timestamp, param_set = journal[3]
+            self.assertEqual(timestamp, 1030.0)
+            self.assertTrue(param_set == self.sets[3])
+            self.assertEqual(journal.view(-2)[1]["iso"], 800)
+
+    def test_invalid_entry(self):
+        with Journal(self.path) as journal:
+            journal.append(self.sets[0], timestamp=1000.0)
+            with self.assertRaises(ValueError):
+                journal.append(make_set(zoom=(0, 0, 2, 1)), timestamp=1010.0)
+            self.assertEqual(len(journal), 1)
+            self.assertTrue(journal[0][1] == self.sets[0])
+
+    def test_at(self):
+        with Journal(self.path) as journal:
+            self.assertIsNone(journal.at(1000.0))
+            self.fill(journal)
+            self.assertIsNone(journal.at(999.0))
+            self.assertTrue(journal.at(1000.0) == self.sets[0])
+            self.assertTrue(journal.at(1035.0) == self.sets[3])
+            self.assertTrue(journal.at(1e9) == self.sets[-1])
+            self.assertEqual([p["brightness"].machine() for _, p in journal.between(1010.0, 1040.0)], [1, 2, 3])
+
+    def test_reopen(self):
+        with Journal(self.path) as journal:
+            self.fill(journal)
+        with Journal(self.path) as journal:
+            self.assertEqual(len(journal), 8)
+            with self.assertRaises(ValueError):
+                journal.append(self.sets[0], timestamp=0)
+            journal.append(self.sets[0], timestamp=2000.0)
+            self.assertTrue(journal.at(2000.0) == self.sets[0])
+
+    def test_recover_partial_write(self):
+        with Journal(self.path) as journal:
+            self.fill(journal)
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as fh:
+            fh.write(b"\x05\x00")
+        with open(self.path + ".idx", "ab") as fh:
+            fh.write(b"\x00" * (INDEX.size // 2))
+
+        with Journal(self.path) as journal:
+            self.assertEqual(len(journal), 8)
+            self.assertEqual(os.path.getsize(self.path), size)
+            journal.append(self.sets[1], timestamp=2000.0)
+            self.assertTrue(journal[-1][1] == self.sets[1])
+
+    def test_update_cam(self):
+        camera = simulation.FakeCamera()
+        with Journal(self.path) as journal:
+            self.sets[2].update_cam(camera, journal=journal)
+            self.assertEqual(len(journal), 1)
+            self.assertTrue(journal[0][1] == self.sets[2])
+
+    def test_clock_steps_back(self):
+        camera = simulation.FakeCamera()
+        with Journal(self.path) as journal:
+            journal.append(self.sets[0], timestamp=time.time() + 3600)
+            # the camera is configured, the entry is stamped with the last timestamp
+            self.sets[1].update_cam(camera, journal=journal)
+            self.assertEqual(len(journal), 2)
+            self.assertEqual(journal.timestamp(1), journal.timestamp(0))
+            self.assertTrue(journal.at(journal.timestamp(0)) == self.sets[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
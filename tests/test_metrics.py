@@ -0,0 +1,83 @@
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.metrics import METRICS, Histogram
+from picamera_attributes.variables import ParameterSet, Iso, Zoom
+
+
+class ReadOnlyISOCamera(simulation.FakeCamera):
+
+    @property
+    def iso(self):
+        return 100
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        METRICS.reset()
+        self.camera = simulation.FakeCamera()
+
+    def test_set(self):
+        param = Iso(value=200)
+        param.validate()
+        param.set(self.camera)
+        param.set(self.camera)
+
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["write_seconds"]["iso"]["count"], 1)
+        self.assertEqual(snapshot["read_seconds"]["iso"]["count"], 2)
+        self.assertEqual(snapshot["skipped_total"]["iso"], 1)
+
+    def test_plural_set(self):
+        param = Zoom(value=(0.1, 0.1, 0.5, 0.5))
+        param.validate()
+        param.set(self.camera)
+        self.assertEqual(METRICS.snapshot()["write_seconds"]["zoom"]["count"], 1)
+
+    def test_failure(self):
+        param = Iso(value=200)
+        param.validate()
+        param.set(ReadOnlyISOCamera())
+        self.assertEqual(METRICS.snapshot()["write_failures_total"]["iso"], 1)
+
+    def test_update_cam(self):
+        param_set = ParameterSet({"exposure_mode": "off", "analog_gain": 2.0})
+        param_set.cross_verify()
+        with simulation.install():
+            param_set.update_cam(simulation.FakeCamera(gain_delay=0.05))
+
+        snapshot = METRICS.snapshot()
+        self.assertEqual(snapshot["update_cam_seconds"]["update_cam"]["count"], 1)
+        self.assertEqual(snapshot["settle_seconds"]["analog_gain"]["count"], 1)
+        self.assertGreaterEqual(snapshot["settle_seconds"]["analog_gain"]["sum"], 0.04)
+
+    def test_disabled(self):
+        METRICS.enabled = False
+        try:
+            param = Iso(value=200)
+            param.validate()
+            param.set(self.camera)
+        finally:
+            METRICS.enabled = True
+        self.assertEqual(METRICS.snapshot()["write_seconds"], {})
+
+    def test_prometheus(self):
+        param = Iso(value=200)
+        param.validate()
+        param.set(self.camera)
+        text = METRICS.prometheus()
+        self.assertIn("# TYPE picamera_attributes_write_seconds histogram", text)
+        self.assertIn('picamera_attributes_write_seconds_bucket{parameter="iso",le="+Inf"} 1', text)
+        self.assertIn('picamera_attributes_write_seconds_count{parameter="iso"} 1', text)
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(1.0, 2.0))
+        for v in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(v)
+        self.assertEqual(histogram.as_dict()["buckets"], {"1.0": 2, "2.0": 3, "+Inf": 4})
+        self.assertEqual(histogram.sum, 6.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
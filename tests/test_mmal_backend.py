@@ -0,0 +1,117 @@
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.mmal_backend import MMALBackend
+from picamera_attributes.state import CameraState
+from picamera_attributes.variables import ParameterSet
+
+
+class TestMMALBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.install = simulation.install()
+        self.install.__enter__()
+        self.addCleanup(self.install.__exit__, None, None, None)
+
+    def build(self, params):
+        param_set = ParameterSet(params)
+        param_set.cross_verify()
+        return param_set
+
+    def test_apply(self):
+        camera = simulation.FakeCamera(gain_delay=0.02)
+        param_set = self.build({
+            "exposure_mode": "off", "shutter_speed": 10000, "analog_gain": 2.0, "digital_gain": 1.5,
+            "awb_mode": "off", "awb_gains": (1.8, 1.5), "iso": 200, "exposure_compensation": -3,
+            "brightness": 60, "sharpness": -20, "contrast": 10, "zoom": (0.0, 0.0, 1.0, 1.0),
+        })
+        result = MMALBackend(camera, poll_interval=0.01).apply(param_set)
+
+        self.assertTrue(result.ok, result.failed)
+        self.assertTrue(result.settled)
+        self.assertEqual(camera.exposure_mode, "off")
+        self.assertEqual(camera.awb_mode, "off")
+        self.assertEqual(camera.shutter_speed, 10000)
+        self.assertEqual(float(camera.analog_gain), 2.0)
+        self.assertEqual(float(camera.digital_gain), 1.5)
+        self.assertEqual(tuple(float(g) for g in camera.awb_gains), (1.8, 1.5))
+        self.assertEqual(camera.iso, 200)
+        self.assertEqual(camera.exposure_compensation, -3)
+        self.assertEqual(camera.brightness, 60)
+        self.assertEqual(camera.sharpness, -20)
+        self.assertEqual(camera.contrast, 10)
+        self.assertEqual(camera.zoom, (0.0, 0.0, 1.0, 1.0))
+        # nothing was read to decide what to write
+        self.assertEqual(camera.reads["iso"], 1)
+
+    def test_modes_first(self):
+        camera = simulation.FakeCamera()
+        param_set = self.build({"awb_gains": (1.8, 1.5), "shutter_speed": 10000, "exposure_mode": "off", "awb_mode": "off"})
+        order = MMALBackend(camera).apply(param_set, wait=False).written
+
+        self.assertLess(order.index("exposure_mode"), order.index("shutter_speed"))
+        self.assertLess(order.index("awb_mode"), order.index("awb_gains"))
+        # the gains were not overridden by the auto white balance loop
+        self.assertEqual(tuple(float(g) for g in camera.awb_gains), (1.8, 1.5))
+
+    def test_fallback(self):
+        camera = simulation.FakeCamera()
+        result = MMALBackend(camera).apply(self.build({"rotation": 90, "resolution": (640, 480), "iso": 400}))
+
+        self.assertEqual(sorted(result.written), ["iso", "resolution", "rotation"])
+        self.assertEqual(camera.rotation, 90)
+        self.assertEqual(camera.resolution, (640, 480))
+
+    def test_saturation(self):
+        camera = simulation.FakeCamera()
+        backend = MMALBackend(camera)
+        backend.write("saturation", 30)
+        self.assertEqual(camera.saturation, 30)
+        # written with MMAL, not with the property
+        with self.assertRaises(simulation.PiCameraMMALError):
+            MMALBackend(simulation.FakeCamera(mmal_status=4)).write("saturation", 30)
+
+    def test_unknown(self):
+        camera = simulation.FakeCamera()
+        with self.assertRaises(KeyError):
+            MMALBackend(camera).write("exposure_speed", 10000)
+
+    def test_known(self):
+        camera = simulation.FakeCamera()
+        backend = MMALBackend(camera)
+        first = backend.apply(self.build({"iso": 400, "brightness": 60}))
+        second = backend.apply(self.build({"iso": 400, "brightness": 70}), known=first.state)
+
+        self.assertEqual(second.skipped, ["iso"])
+        self.assertEqual(second.written, ["brightness"])
+        self.assertEqual(camera.writes["iso"], 1)
+        self.assertEqual(second.state["brightness"].machine(), 70)
+
+    def test_inactive(self):
+        camera = simulation.FakeCamera()
+        param_set = self.build({"exposure_mode": "auto", "shutter_speed": 10000})
+        result = MMALBackend(camera).apply(param_set)
+
+        self.assertEqual(result.inactive, ["shutter_speed"])
+        self.assertEqual(camera.writes["shutter_speed"], 0)
+
+    def test_failure(self):
+        camera = simulation.FakeCamera(mmal_status=4)
+        result = MMALBackend(camera).apply(self.build({"iso": 400, "rotation": 180}))
+
+        self.assertEqual(list(result.failed.keys()), ["iso"])
+        self.assertIsInstance(result.failed["iso"], simulation.PiCameraMMALError)
+        self.assertEqual(result.failed["iso"].status, 4)
+        # the fallback does not go through MMAL
+        self.assertEqual(result.written, ["rotation"])
+
+    def test_camera_state(self):
+        camera = simulation.FakeCamera()
+        state = CameraState(camera)
+        self.assertEqual(state.iso, 0)
+        MMALBackend(state).apply(self.build({"iso": 800}))
+        self.assertEqual(state.iso, 800)
+
+
+if __name__ == "__main__":
+    unittest.main()
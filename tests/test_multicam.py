@@ -0,0 +1,67 @@
+import time
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.multicam import apply_many
+from picamera_attributes.variables import ParameterSet
+
+
+class BrokenCamera(simulation.FakeCamera):
+
+    @property
+    def analog_gain(self):
+        raise RuntimeError("camera disconnected")
+
+
+class ReadOnlyISOCamera(simulation.FakeCamera):
+
+    @property
+    def iso(self):
+        return 100
+
+
+class TestApplyMany(unittest.TestCase):
+
+    def setUp(self):
+        self.param_set = ParameterSet({"exposure_mode": "off", "iso": 200, "analog_gain": 4.0})
+        self.param_set.cross_verify()
+
+    def test_concurrent(self):
+        cameras = {f"cam{i}": simulation.FakeCamera(gain_delay=0.2) for i in range(3)}
+        with simulation.install():
+            start = time.perf_counter()
+            result = apply_many(cameras, self.param_set)
+            elapsed = time.perf_counter() - start
+
+        self.assertTrue(result.ok)
+        self.assertEqual(list(result.results.keys()), list(cameras.keys()))
+        for camera in cameras.values():
+            self.assertEqual(camera.iso, 200)
+            self.assertEqual(float(camera.analog_gain), 4.0)
+        # one gain delay, not three
+        self.assertLess(elapsed, 0.5)
+
+    def test_partial_failure(self):
+        cameras = [simulation.FakeCamera(gain_delay=0), BrokenCamera(gain_delay=0), ReadOnlyISOCamera(gain_delay=0)]
+        with simulation.install():
+            result = apply_many(cameras, self.param_set)
+
+        self.assertFalse(result.ok)
+        self.assertTrue(result.results[0].ok)
+        self.assertIsInstance(result.errors[1], RuntimeError)
+        self.assertIn("iso", result.results[2].failed)
+        self.assertEqual(result.failed, [1, 2])
+
+    def test_timeout(self):
+        cameras = {"fast": simulation.FakeCamera(gain_delay=0), "slow": simulation.FakeCamera(write_latency=0.1)}
+        with simulation.install():
+            result = apply_many(cameras, self.param_set, timeout=0.05)
+            self.assertEqual(result.timed_out, ["slow"])
+            self.assertIn("fast", result.results)
+            self.assertFalse(result.ok)
+            # let the slow apply finish while the stubs are installed
+            time.sleep(0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
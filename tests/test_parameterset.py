@@ -1,6 +1,8 @@
+import threading
 import unittest
 
-from picamera_attributes.variables import Iso, ShutterSpeed, ExposureMode, AWBGains, AWBGain, AWBMode, Zoom, ParameterSet
+from picamera_attributes.variables import Iso, ShutterSpeed, ExposureMode, AWBGains, AWBGain, AWBMode, Zoom, ParameterSet, DEFAULTS, QS_CACHE, VALUE_CACHE
+from picamera_attributes.cache import LRUCache
 
 iso = Iso(value = 100)
 iso.validate()
@@ -89,6 +91,176 @@ class TestParameterSetTransfer(unittest.TestCase):
         self.assertTrue(self.param_set == self.param_set_restore)
             
 
+class TestParameterSetDefault(unittest.TestCase):
+
+    def test_defaults_are_shared(self):
+        a = ParameterSet({"iso": 200}, default=True)
+        b = ParameterSet({}, default=True)
+        self.assertEqual(sorted(a.keys()), sorted(DEFAULTS.keys()))
+        self.assertEqual(a["iso"].machine(), 200)
+        # shared until handed out
+        self.assertIs(a._params["brightness"], b._params["brightness"])
+        self.assertIsNot(a["brightness"], b["brightness"])
+
+    def test_defaults_are_not_modified(self):
+        param_set = ParameterSet({}, default=True)
+        param_set.cross_verify()
+        # shutter_speed depends on exposure_mode off, the default is auto
+        self.assertFalse(param_set.params["shutter_speed"]._active)
+        self.assertTrue(DEFAULTS["shutter_speed"]._active)
+
+        param_set["brightness"]._value = 70
+        self.assertEqual(DEFAULTS["brightness"].machine(), 50)
+        self.assertEqual(ParameterSet({}, default=True)["brightness"].machine(), 50)
+
+    def test_accessors_do_not_share(self):
+        param_set = ParameterSet({}, default=True)
+        for p in param_set.values():
+            p._active = False
+        for _, p in param_set.items():
+            p._value = None
+        param_set.params["brightness"]._value = 70
+
+        self.assertTrue(all(p._active for p in DEFAULTS.values()))
+        self.assertEqual(DEFAULTS["brightness"].machine(), 50)
+        self.assertTrue(ParameterSet({}, default=True)["iso"]._active)
+
+    def test_compare_does_not_copy(self):
+        a = ParameterSet({"iso": 200}, default=True)
+        b = ParameterSet({}, default=True)
+        shared_a, shared_b = set(a._shared), set(b._shared)
+        self.assertFalse(a == b)
+        self.assertEqual(list((a - b).keys()), ["iso"])
+        self.assertEqual(list((b - a).keys()), ["iso"])
+        self.assertEqual(a._shared, shared_a)
+        self.assertEqual(b._shared, shared_b)
+
+    def test_copy(self):
+        param_set = ParameterSet({}, default=True)
+        clone = param_set.copy()
+        clone["iso"]._value = 800
+        self.assertNotEqual(param_set["iso"].machine(), 800)
+        self.assertTrue(param_set == ParameterSet({}, default=True))
+
+
+class TestRestoreQSCache(unittest.TestCase):
+
+    def setUp(self):
+        QS_CACHE.clear()
+        VALUE_CACHE.clear()
+        self.qs = ParameterSet({"iso": 200, "awb_gains": (1.8, 1.5), "exposure_mode": "off"}).urlencode()
+
+    def test_hits(self):
+        first = ParameterSet({})
+        first.restore_qs(self.qs)
+        second = ParameterSet({})
+        second.restore_qs(self.qs)
+        self.assertEqual(QS_CACHE.stats()["hits"], 1)
+        self.assertEqual(QS_CACHE.stats()["misses"], 1)
+
+        uncached = ParameterSet({})
+        uncached.restore_qs(self.qs, cache=False)
+        self.assertTrue(first == uncached)
+        self.assertTrue(second == uncached)
+        self.assertEqual(second["awb_gains"].val, "1.8,1.5")
+
+        # instances are not shared between restored sets
+        first["iso"]._value = 800
+        self.assertEqual(second["iso"].machine(), 200)
+
+    def test_values_shared_across_queries(self):
+        ParameterSet({}).restore_qs(self.qs)
+        ParameterSet({}).restore_qs(ParameterSet({"iso": 200}).urlencode())
+        self.assertEqual(VALUE_CACHE.stats()["hits"], 1)
+
+    def test_invalid_not_cached(self):
+        with self.assertRaises(Exception):
+            ParameterSet({}).restore_qs(b"iso=foo")
+        self.assertEqual(len(QS_CACHE), 0)
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        for k in "abc":
+            cache.put(k, k)
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.get("b"), "b")
+        cache.put("d", "d")
+        self.assertIn("b", cache)
+        self.assertNotIn("c", cache)
+
+    def test_threads(self):
+        queries = [ParameterSet({"brightness": b}).urlencode() for b in range(20)]
+        errors = []
+
+        def restore():
+            for qs in queries * 5:
+                param_set = ParameterSet({})
+                param_set.restore_qs(qs)
+                if param_set["brightness"].val != int(qs.split(b"=")[1]):
+                    errors.append(qs)
+
+        threads = [threading.Thread(target=restore) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        stats = QS_CACHE.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 400)
+
+
+class RecordingCamera:
+    """Plain object standing in for a PiCamera, records every attribute write"""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+        self.writes = []
+
+    def __setattr__(self, name, value):
+        if name != "writes":
+            self.writes.append(name)
+        super().__setattr__(name, value)
+
+
+class FailingCamera(RecordingCamera):
+
+    def __setattr__(self, name, value):
+        if name == "iso" and "writes" in self.__dict__:
+            raise ValueError(f"Invalid iso {value}")
+        super().__setattr__(name, value)
+
+
+class TestParameterSetApply(unittest.TestCase):
+
+    def setUp(self):
+        self.param_set = ParameterSet({"iso": 100, "brightness": 60, "exposure_mode": "off", "shutter_speed": 25000, "exposure_speed": 100})
+        self.param_set.cross_verify()
+        self.camera = RecordingCamera(iso=0, brightness=60, exposure_mode="auto", shutter_speed=0, exposure_speed=0)
+
+    def test_writes_only_delta(self):
+        result = self.param_set.apply(self.camera)
+        self.assertEqual(sorted(result.written), ["exposure_mode", "iso", "shutter_speed"])
+        self.assertEqual(result.skipped, ["brightness"])
+        self.assertTrue(result.ok)
+        self.assertEqual(self.camera.iso, 100)
+        self.assertEqual(self.camera.writes.index("exposure_mode") < self.camera.writes.index("shutter_speed"), True)
+        self.assertNotIn("exposure_speed", self.camera.writes)
+
+    def test_reapply_with_known_state(self):
+        result = self.param_set.apply(self.camera)
+        self.camera.writes.clear()
+        result = self.param_set.apply(self.camera, known=result.state)
+        self.assertEqual(result.written, [])
+        self.assertEqual(self.camera.writes, [])
+
+    def test_failed(self):
+        camera = FailingCamera(iso=0, brightness=0, exposure_mode="off", shutter_speed=0, exposure_speed=0)
+        result = self.param_set.apply(camera)
+        self.assertIn("iso", result.failed)
+        self.assertIn("iso", result.timings)
+        self.assertIn("brightness", result.written)
+        self.assertFalse(result.ok)
+
 if __name__ == '__main__':
     unittest.main()
 
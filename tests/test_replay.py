@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.replay import Replay, history_from_pickles
+from picamera_attributes.variables import ParameterSet
+
+
+class FakeClock:
+    r"""Time that only moves when slept or advanced"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SlowReplay(Replay):
+    r"""Every write takes latency seconds of the fake clock"""
+
+    latency = 0.03
+
+    def write(self, param_set):
+        super().write(param_set)
+        self.clock.sleep(self.latency)
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        # one state every 100 ms, with a burst of three in 10 ms in the middle
+        times = [0.0, 0.1, 0.2, 0.205, 0.21, 0.3]
+        self.history = [(1000.0 + t, {"brightness": 40 + i}) for i, t in enumerate(times)]
+
+    def replay(self, camera, history, replay_class=Replay, **kwargs):
+        clock = FakeClock()
+        return replay_class(camera, history, clock=clock, sleep=clock.sleep, **kwargs)
+
+    def test_original_pace(self):
+        camera = simulation.FakeCamera()
+        report = self.replay(camera, self.history, speed=1).run()
+        self.assertEqual(report.applied, 6)
+        self.assertEqual(report.collapsed, 0)
+        self.assertAlmostEqual(report.elapsed, 0.3)
+        self.assertAlmostEqual(report.max_lag, 0)
+        self.assertEqual(camera.brightness, 45)
+
+    def test_real_clock(self):
+        camera = simulation.FakeCamera()
+        report = Replay(camera, self.history, speed=1).run()
+        self.assertEqual(report.applied + report.collapsed, 6)
+        self.assertGreaterEqual(report.elapsed, 0.3)
+        self.assertEqual(camera.brightness, 45)
+
+    def test_accelerated(self):
+        camera = simulation.FakeCamera()
+        report = self.replay(camera, self.history, speed=10).run()
+        self.assertAlmostEqual(report.elapsed, 0.03)
+        self.assertAlmostEqual(report.achieved_speed, 10)
+        self.assertEqual(camera.brightness, 45)
+
+    def test_collapse(self):
+        camera = simulation.FakeCamera()
+        report = self.replay(camera, self.history, speed=1, settle=0.05).run()
+        self.assertEqual(report.applied, 4)
+        self.assertEqual(report.collapsed, 2)
+        self.assertEqual([e.timestamp for e in report.entries], [1000.0, 1000.1, 1000.21, 1000.3])
+        self.assertEqual(camera.writes["brightness"], 4)
+        self.assertEqual(camera.brightness, 45)
+
+    def test_collapse_when_late(self):
+        # every write takes longer than the gap to the next state
+        camera = simulation.FakeCamera()
+        history = [(i * 0.01, {"brightness": i}) for i in range(10)]
+        report = self.replay(camera, history, replay_class=SlowReplay, speed=1).run()
+        self.assertLess(report.applied, 10)
+        self.assertEqual(report.applied + report.collapsed, 10)
+        self.assertEqual(camera.brightness, 9)
+
+    def test_as_fast_as_possible(self):
+        camera = simulation.FakeCamera()
+        report = self.replay(camera, self.history, speed=None, settle=1).run()
+        self.assertEqual(report.applied, 6)
+        self.assertIsNone(report.entries[0].requested)
+        self.assertEqual(camera.writes["brightness"], 6)
+
+    def test_pickles(self):
+        directory = tempfile.mkdtemp()
+        try:
+            paths = []
+            for i, b in enumerate((10, 20)):
+                path = os.path.join(directory, f"{i}.pickle")
+                ParameterSet({"brightness": b}).pickle(path)
+                os.utime(path, (100 + i, 100 + i))
+                paths.append(path)
+            history = history_from_pickles(reversed(paths))
+            self.assertEqual([t for t, _ in history], [100, 101])
+            camera = simulation.FakeCamera()
+            Replay(camera, history, speed=None).run()
+            self.assertEqual(camera.brightness, 20)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_lazy(self):
+        read = []
+
+        def history():
+            for timestamp, params in self.history:
+                read.append(timestamp)
+                yield timestamp, params
+
+        ahead = []
+
+        class Recorder(Replay):
+            def write(self, param_set):
+                super().write(param_set)
+                ahead.append(len(read) - len(ahead))
+
+        report = self.replay(simulation.FakeCamera(), history(), replay_class=Recorder, speed=1).run()
+        self.assertEqual(report.applied, 6)
+        # the history is read at most one state ahead of the one written
+        self.assertEqual(ahead, [2, 2, 2, 2, 2, 1])
+
+    def test_invalid(self):
+        camera = simulation.FakeCamera()
+        with self.assertRaises(ValueError):
+            self.replay(camera, [(1, {"brightness": 10}), (0, {"brightness": 20})], speed=None).run()
+        with self.assertRaises(ValueError):
+            Replay(None, [], speed=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+from picamera_attributes.metrics import METRICS
+from picamera_attributes.scheduler import Scheduler, dependency_graph, topological_stages
+from picamera_attributes.variables import ParameterSet, AnalogGain, DigitalGain, ExposureMode, ShutterSpeed
+
+
+class InstantGain(AnalogGain):
+    """Gain written with setattr, so no MMAL is needed"""
+
+    def _set(self, camera, wait=True):
+        setattr(camera, self._name, self._value)
+        return camera
+
+
+class InstantDigitalGain(DigitalGain):
+
+    def _set(self, camera, wait=True):
+        setattr(camera, self._name, self._value)
+        return camera
+
+
+class RefusedDigitalGain(DigitalGain):
+
+    def _set(self, camera, wait=True):
+        raise ValueError("refused")
+
+
+class CountingScheduler(Scheduler):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = []
+
+    def settle(self, camera, pending):
+        if pending:
+            self.waits.append(sorted(pending.keys()))
+        return super().settle(camera, pending)
+
+
+class Camera:
+    analog_gain = 1.0
+    digital_gain = 1.0
+    exposure_mode = "auto"
+    shutter_speed = 0
+    exposure_speed = 0
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_order(self):
+        param_set = ParameterSet({"shutter_speed": 10000, "exposure_mode": "off", "iso": 100})
+        self.assertEqual(dependency_graph(param_set)["shutter_speed"], ["exposure_mode"])
+        stages = Scheduler(param_set).stages
+        self.assertEqual(stages, [["exposure_mode", "iso"], ["shutter_speed"]])
+
+    def test_missing_dependency_is_ignored(self):
+        param_set = ParameterSet({"shutter_speed": 10000})
+        self.assertEqual(Scheduler(param_set).order(), ["shutter_speed"])
+
+    def test_deep_chain(self):
+        graph = {"c": ["b"], "b": ["a"], "a": []}
+        self.assertEqual(topological_stages(graph), [["a"], ["b"], ["c"]])
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            topological_stages({"a": ["b"], "b": ["a"]})
+
+    def test_single_settle_window(self):
+        analog_gain = InstantGain(value=2.0)
+        analog_gain.validate()
+        digital_gain = InstantDigitalGain(value=3.0)
+        digital_gain.validate()
+        params = {"analog_gain": analog_gain, "digital_gain": digital_gain, "exposure_mode": ExposureMode(value="off")}
+        params["exposure_mode"].validate()
+
+        camera = Camera()
+        scheduler = CountingScheduler(params, timeout=0.1)
+        self.assertTrue(scheduler.run(camera))
+        self.assertEqual(scheduler.waits, [["analog_gain", "digital_gain"]])
+        self.assertEqual(camera.analog_gain, 2.0)
+        self.assertEqual(camera.exposure_mode, "off")
+
+    def test_settle_before_dependent(self):
+
+        class GainDependent(ShutterSpeed):
+            _depends_on = {"analog_gain": 2.0}
+
+        analog_gain = InstantGain(value=2.0)
+        analog_gain.validate()
+        dependent = GainDependent(value=100)
+        dependent.validate()
+
+        scheduler = CountingScheduler({"analog_gain": analog_gain, "shutter_speed": dependent}, timeout=0.1)
+        self.assertEqual(scheduler.stages, [["analog_gain"], ["shutter_speed"]])
+        scheduler.run(Camera())
+        self.assertEqual(scheduler.waits, [["analog_gain"]])
+
+    def test_unwritten_gains_are_not_waited_for(self):
+        # analog_gain is already 1.0 in the camera and digital_gain cannot be written
+        analog_gain = InstantGain(value=1.0)
+        analog_gain.validate()
+        digital_gain = RefusedDigitalGain(value=3.0)
+        digital_gain.validate()
+
+        METRICS.reset()
+        scheduler = CountingScheduler({"analog_gain": analog_gain, "digital_gain": digital_gain}, timeout=0.5)
+        self.assertTrue(scheduler.run(Camera()))
+        self.assertEqual(scheduler.waits, [])
+        self.assertEqual(METRICS.snapshot()["settle_timeouts_total"], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
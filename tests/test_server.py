@@ -0,0 +1,125 @@
+import asyncio
+import json
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.server import ControlServer
+
+
+async def request(port, target, method="GET", body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split(b" ")[1])
+    return status, json.loads(body)
+
+
+class RejectingCamera(simulation.FakeCamera):
+    r"""Refuses every ISO above 400"""
+
+    @property
+    def iso(self):
+        return self._values["iso"]
+
+    @iso.setter
+    def iso(self, value):
+        if value > 400:
+            raise ValueError(f"ISO {value} refused")
+        self._values["iso"] = value
+
+
+class TestControlServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.camera = simulation.FakeCamera(write_latency=0.01)
+        self.server = await ControlServer(self.camera, debounce=0.05).start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def test_coalesce(self):
+        # a slider being dragged
+        requests = [request(self.server.port, f"/set?brightness={b}") for b in range(40, 50)]
+        requests.append(request(self.server.port, "/set", method="POST", body=b"contrast=10"))
+        responses = await asyncio.gather(*requests)
+
+        for status, state in responses:
+            self.assertEqual(status, 200)
+            self.assertEqual(state["brightness"], 49)
+            self.assertEqual(state["contrast"], 10)
+
+        self.assertEqual(self.camera.brightness, 49)
+        self.assertEqual(self.camera.writes["brightness"], 1)
+        self.assertEqual(self.camera.writes["contrast"], 1)
+
+        status, state = await request(self.server.port, "/state")
+        self.assertEqual(state, {"brightness": 49, "contrast": 10})
+
+    async def test_merge_with_applied_state(self):
+        await request(self.server.port, "/set?brightness=30")
+        status, state = await request(self.server.port, "/set?iso=200")
+        self.assertEqual(state, {"brightness": 30, "iso": 200})
+        # brightness did not change, so it is not written again
+        self.assertEqual(self.camera.writes["brightness"], 1)
+
+    async def test_invalid(self):
+        status, content = await request(self.server.port, "/set?iso=foo")
+        self.assertEqual(status, 400)
+        status, content = await request(self.server.port, "/set?foo=1")
+        self.assertEqual(status, 400)
+        self.assertIn("foo", content["error"])
+        status, content = await request(self.server.port, "/nowhere")
+        self.assertEqual(status, 404)
+        self.assertEqual(sum(self.camera.writes.values()), 0)
+
+    async def test_refused(self):
+        server = await ControlServer(RejectingCamera(), debounce=0.01).start()
+        try:
+            await request(server.port, "/set?iso=200")
+            status, content = await request(server.port, "/set?iso=800")
+            self.assertEqual(status, 502)
+            self.assertIn("iso", content["failed"])
+            self.assertEqual(content["state"], {"iso": 200})
+            status, state = await request(server.port, "/state")
+            self.assertEqual(state, {"iso": 200})
+        finally:
+            await server.close()
+
+    async def test_close_applies_pending(self):
+        server = await ControlServer(self.camera, debounce=10, max_wait=10).start()
+        response = asyncio.ensure_future(request(server.port, "/set?iso=200"))
+        while not server._pending:
+            await asyncio.sleep(0.01)
+
+        await server.close()
+        status, state = await asyncio.wait_for(response, 1)
+        self.assertEqual(status, 200)
+        self.assertEqual(state, {"iso": 200})
+        self.assertEqual(self.camera.iso, 200)
+
+        # updates submitted after close are refused, not left waiting
+        server.debounce = 0.01
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(server.submit({"iso": 400}), 1)
+
+    async def test_events(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        writer.write(b"GET /events HTTP/1.1\r\n\r\n")
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")
+
+        first = await reader.readuntil(b"\n\n")
+        self.assertEqual(json.loads(first[len(b"data: "):]), {})
+
+        status, _ = await request(self.server.port, "/set?sharpness=20")
+        self.assertEqual(status, 200)
+        event = await asyncio.wait_for(reader.readuntil(b"\n\n"), 1)
+        self.assertEqual(json.loads(event[len(b"data: "):]), {"sharpness": 20})
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import time
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.settle import wait_until_settled, _is_stable
+
+
+class TestWaitUntilSettled(unittest.TestCase):
+
+    def test_converges(self):
+        camera = simulation.FakeCamera(auto_tau=0.05, auto_analog_gain=4.0, auto_awb_gains=(1.8, 1.3))
+        result = wait_until_settled(camera, timeout=2)
+        self.assertTrue(result.settled)
+        self.assertAlmostEqual(result.values["analog_gain"], 4.0, places=1)
+        self.assertAlmostEqual(result.values["awb_gains"][0], 1.8, places=1)
+        # much faster than a worst case sleep
+        self.assertLess(result.elapsed, 1.5)
+
+    def test_timeout(self):
+        camera = simulation.FakeCamera(auto_tau=10, auto_analog_gain=8.0)
+        result = wait_until_settled(camera, params=("analog_gain", ), timeout=0.2, tolerance=0.0001)
+        self.assertFalse(result.settled)
+        self.assertGreaterEqual(result.elapsed, 0.2)
+
+    def test_backoff(self):
+        camera = simulation.FakeCamera(auto_tau=10, auto_analog_gain=8.0)
+        result = wait_until_settled(
+            camera, params=("analog_gain", ), timeout=0.3, tolerance=0.0001,
+            initial_interval=0.01, max_interval=0.1
+        )
+        # 0.01 + 0.02 + 0.04 + 0.08 + 0.1 + ... instead of one reading every 10 ms
+        self.assertLess(result.polls, 10)
+
+    def test_lock(self):
+        camera = simulation.FakeCamera(auto_tau=0.02)
+        result = wait_until_settled(camera, timeout=2, lock=True)
+        locked = result.locked
+        self.assertEqual(locked["exposure_mode"].machine(), "off")
+        self.assertEqual(locked["awb_mode"].machine(), "off")
+        self.assertTrue(locked["shutter_speed"]._active)
+        self.assertTrue(locked["awb_gains"]._active)
+        self.assertEqual(locked["shutter_speed"].machine(), result.values["exposure_speed"])
+
+        with simulation.install():
+            locked.update_cam(camera)
+        self.assertEqual(camera.exposure_mode, "off")
+        self.assertEqual(camera.awb_mode, "off")
+        # the auto loops are off, so the values stay
+        camera.auto_analog_gain = 8.0
+        time.sleep(0.05)
+        self.assertEqual(camera.exposure_speed, int(result.values["exposure_speed"]))
+        self.assertAlmostEqual(float(camera.analog_gain), result.values["analog_gain"], places=2)
+
+    def test_is_stable(self):
+        self.assertTrue(_is_stable([0.0, 0.0, 0.0], 3, 0.01))
+        self.assertTrue(_is_stable([5.0, 1.0, 1.0, 1.0], 3, 0.01))
+        self.assertFalse(_is_stable([1.0, 1.0], 3, 0.01))
+        self.assertFalse(_is_stable([(1.0, 1.0), (1.0, 2.0), (1.0, 1.0)], 3, 0.01))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import sys
+import time
+import unittest
+
+from picamera_attributes import simulation
+from picamera_attributes.helpers import set_gain
+from picamera_attributes.variables import ParameterSet
+
+
+class TestFakeCamera(unittest.TestCase):
+
+    def test_gain_delay(self):
+        camera = simulation.FakeCamera(gain_delay=0.05)
+        camera.exposure_mode = "off"
+        with simulation.install():
+            self.assertTrue(set_gain(camera, "analog_gain", 4.0, wait=False))
+            self.assertNotEqual(float(camera.analog_gain), 4.0)
+            time.sleep(0.06)
+            self.assertEqual(float(camera.analog_gain), 4.0)
+
+    def test_auto_exposure_overrides_gain(self):
+        camera = simulation.FakeCamera(auto_tau=0.01, auto_analog_gain=3.0)
+        with simulation.install():
+            set_gain(camera, "analog_gain", 4.0, wait=False)
+        time.sleep(0.1)
+        self.assertAlmostEqual(float(camera.analog_gain), 3.0, places=2)
+
+    def test_latency(self):
+        camera = simulation.FakeCamera(read_latency=0.01)
+        start = time.monotonic()
+        camera.iso
+        self.assertGreaterEqual(time.monotonic() - start, 0.01)
+        self.assertEqual(camera.reads["iso"], 1)
+
+    def test_install_restores(self):
+        before = sys.modules.get("picamera")
+        with simulation.install() as picamera:
+            import picamera as imported
+            self.assertIs(imported, picamera)
+        self.assertIs(sys.modules.get("picamera"), before)
+
+
+class TestParameterSetSimulated(unittest.TestCase):
+
+    def test_update_cam(self):
+        camera = simulation.FakeCamera(gain_delay=0.05)
+        param_set = ParameterSet({
+            "exposure_mode": "off", "shutter_speed": 10000, "analog_gain": 2.0,
+            "digital_gain": 1.5, "awb_mode": "off", "awb_gains": (1.8, 1.5), "iso": 200
+        })
+        param_set.cross_verify()
+
+        with simulation.install():
+            start = time.monotonic()
+            camera, attributes = param_set.update_cam(camera)
+            elapsed = time.monotonic() - start
+
+        # both gains settle in the same window
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(float(camera.analog_gain), 2.0)
+        self.assertEqual(float(camera.digital_gain), 1.5)
+        self.assertEqual(camera.shutter_speed, 10000)
+        self.assertEqual(tuple(float(g) for g in camera.awb_gains), (1.8, 1.5))
+        self.assertEqual(camera.iso, 200)
+        self.assertEqual(attributes["iso"], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import pickle
+import time
+import unittest
+
+from picamera_attributes.state import CameraState, read_attribute
+from picamera_attributes.variables import ParameterSet
+
+
+class CountingCamera:
+    """Plain object standing in for a PiCamera, counts attribute reads"""
+
+    def __init__(self, **attributes):
+        object.__setattr__(self, "reads", {})
+        self.__dict__.update(attributes)
+
+    def __getattribute__(self, name):
+        reads = object.__getattribute__(self, "reads")
+        reads[name] = reads.get(name, 0) + 1
+        return object.__getattribute__(self, name)
+
+
+class TestCameraState(unittest.TestCase):
+
+    def setUp(self):
+        self.camera = CountingCamera(iso=0, exposure_mode="off", awb_mode="auto", analog_gain=1.0, awb_gains=(1.0, 1.0), exposure_speed=100)
+        self.state = CameraState(self.camera)
+
+    def test_read_is_cached(self):
+        self.assertEqual(self.state.iso, 0)
+        self.assertEqual(self.state.iso, 0)
+        self.assertEqual(self.camera.reads["iso"], 1)
+
+    def test_write_is_cached(self):
+        self.state.iso = 100
+        self.assertEqual(self.camera.__dict__["iso"], 100)
+        self.assertEqual(self.state.iso, 100)
+        self.assertNotIn("iso", self.camera.reads)
+
+    def test_volatile(self):
+        self.state.exposure_speed
+        self.state.exposure_speed
+        self.assertEqual(self.camera.reads["exposure_speed"], 2)
+
+        # awb_mode is auto
+        self.state.awb_gains
+        self.state.awb_gains
+        self.assertEqual(self.camera.reads["awb_gains"], 2)
+
+        # exposure_mode is off
+        self.state.analog_gain
+        self.state.analog_gain
+        self.assertEqual(self.camera.reads["analog_gain"], 1)
+
+    def test_mode_change_invalidates(self):
+        self.state.analog_gain
+        self.state.exposure_mode = "auto"
+        self.assertIsNone(self.state.age("analog_gain"))
+
+    def test_max_age(self):
+        state = CameraState(self.camera, max_age=0.01)
+        state.iso
+        time.sleep(0.02)
+        self.assertGreater(state.age("iso"), 0.01)
+        state.iso
+        self.assertEqual(self.camera.reads["iso"], 2)
+
+    def test_passthrough(self):
+        self.camera.__dict__["_camera"] = "control"
+        self.assertEqual(self.state._camera, "control")
+
+    def test_read_attribute(self):
+        self.state.iso
+        self.camera.__dict__["iso"] = 200
+        # bypasses the cache and updates it
+        self.assertEqual(read_attribute(self.state, "iso"), 200)
+        self.assertEqual(self.state.iso, 200)
+        self.assertEqual(read_attribute(self.camera, "exposure_speed"), 100)
+
+
+class TestUpdateCamUsesState(unittest.TestCase):
+
+    def test_single_read(self):
+        camera = CountingCamera(iso=0, brightness=50)
+        param_set = ParameterSet({"iso": 100, "brightness": 50})
+        param_set.update_cam(camera)
+        self.assertEqual(camera.__dict__["iso"], 100)
+        self.assertEqual(camera.reads["iso"], 1)
+        self.assertEqual(camera.reads["brightness"], 1)
+
+    def test_readback(self):
+        camera = CountingCamera(iso=0, brightness=50)
+        _, attributes = ParameterSet({"iso": 100}).update_cam(camera)
+        self.assertIs(type(attributes), dict)
+        self.assertEqual(attributes["iso"], 100)
+        self.assertEqual(attributes["brightness"], 50)
+        self.assertIsNone(attributes["zoom"])
+        # written values come from the cache of the camera state
+        self.assertEqual(camera.reads["iso"], 1)
+
+    def test_lazy_readback(self):
+        camera = CountingCamera(iso=0, brightness=50, contrast=10)
+        param_set = ParameterSet({"iso": 100})
+        _, attributes = param_set.update_cam(camera, lazy=True)
+        self.assertEqual(camera.reads.get("contrast", 0), 0)
+        self.assertIsNone(attributes.timestamp)
+
+        self.assertEqual(attributes["contrast"], 10)
+        self.assertIsNotNone(attributes.timestamp)
+        # every attribute was read in the snapshot, once
+        camera.__dict__["brightness"] = 60
+        self.assertEqual(attributes["brightness"], 50)
+        self.assertEqual(attributes["contrast"], 10)
+        self.assertEqual(camera.reads["contrast"], 1)
+        self.assertEqual(attributes["iso"], 100)
+        self.assertEqual(camera.reads["iso"], 1)
+
+        values = attributes.materialise()
+        self.assertEqual(len(values), len(attributes))
+        self.assertIsNone(values["zoom"])
+        self.assertEqual(attributes, values)
+        self.assertEqual(pickle.loads(pickle.dumps(attributes)), values)
+        with self.assertRaises(KeyError):
+            attributes["foo"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from picamera_attributes.sweep import ParameterSweep
+from picamera_attributes.variables import ParameterSet
+
+
+class TestParameterSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.sweep = ParameterSweep(
+            {"iso": [100, 200, 400], "analog_gain": [1, 2], "resolution": [(640, 480), (1280, 960)]},
+            base={"exposure_mode": "off", "shutter_speed": 10000}
+        )
+
+    def test_len(self):
+        self.assertEqual(len(self.sweep), 12)
+        self.assertEqual(len(list(self.sweep)), 12)
+
+    def test_covers_grid(self):
+        points = {tuple(sorted(self.sweep.point(i).items())) for i in range(len(self.sweep))}
+        self.assertEqual(len(points), 12)
+
+    def test_expensive_axis_outermost(self):
+        self.assertEqual(self.sweep.names, ["resolution", "analog_gain", "iso"])
+        changes = self.sweep.changes()
+        self.assertEqual(changes["resolution"], 1)
+        self.assertEqual(changes["analog_gain"], 2)
+
+    def test_single_change_between_points(self):
+        previous = self.sweep.point(0)
+        for i in range(1, len(self.sweep)):
+            point = self.sweep.point(i)
+            changed = [k for k in point if point[k] != previous[k]]
+            self.assertEqual(len(changed), 1)
+            previous = point
+
+    def test_points_are_validated_sets(self):
+        param_set = self.sweep[0]
+        self.assertIsInstance(param_set, ParameterSet)
+        self.assertTrue(param_set["shutter_speed"]._active)
+        self.assertTrue(param_set["iso"]._active)
+
+    def test_cost(self):
+        self.assertLess(self.sweep.cost(), self.sweep.naive_cost())
+
+    def test_invalid_value(self):
+        with self.assertRaises(AssertionError):
+            ParameterSweep({"iso": [150]})
+
+
+if __name__ == '__main__':
+    unittest.main()
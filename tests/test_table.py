@@ -0,0 +1,77 @@
+import unittest
+
+try:
+    import numpy as np
+    from picamera_attributes.table import ParameterTable
+except ImportError:
+    np = None
+
+from picamera_attributes.variables import ParameterSet
+
+
+def make_set(**params):
+    param_set = ParameterSet(params)
+    param_set.cross_verify()
+    return param_set
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestParameterTable(unittest.TestCase):
+
+    def setUp(self):
+        self.sets = [
+            make_set(iso=100, exposure_mode="off", shutter_speed=10000, awb_gains=(1.8, 1.5)),
+            make_set(iso=100, exposure_mode="off", shutter_speed=10000, awb_gains=(1.8, 1.5)),
+            make_set(iso=200, exposure_mode="auto", shutter_speed=10000, awb_gains=(1.8, 1.2)),
+            make_set(iso=200),
+        ]
+        self.table = ParameterTable.from_sets(self.sets)
+
+    def test_roundtrip(self):
+        self.assertEqual(len(self.table), 4)
+        for i, param_set in enumerate(self.sets):
+            self.assertTrue(self.table.row(i) == param_set)
+
+    def test_equals_matches_parameterset(self):
+        expected = [self.sets[0] == s for s in self.sets]
+        self.assertEqual(self.table.equals(self.sets[0]).tolist(), expected)
+
+    def test_diff_matches_sub(self):
+        diff = self.table.diff(self.table[0])
+        for i, param_set in enumerate(self.sets):
+            changed = sorted(k for k, d in diff.items() if d[i])
+            self.assertEqual(changed, sorted((param_set - self.sets[0]).keys()))
+
+    def test_changes(self):
+        changes = self.table.changes()
+        self.assertFalse(changes["iso"][1])
+        self.assertTrue(changes["iso"][2])
+        self.assertTrue(changes["iso"][0])
+
+    def test_validate(self):
+        table = ParameterTable.from_columns({
+            "iso": [100, 150, 800],
+            "exposure_mode": ["off", "auto", "foo"],
+            "zoom": [(0, 0, 1, 1), (0, 0, 2, 1), (0.5, 0.5, 0.5, 0.5)],
+        })
+        validation = table.validate()
+        self.assertEqual(validation["iso"].tolist(), [True, False, True])
+        self.assertEqual(validation["exposure_mode"].tolist(), [True, True, False])
+        self.assertEqual(validation["zoom"].tolist(), [True, False, True])
+        self.assertTrue(validation["brightness"].all())
+        self.assertEqual(table.valid().tolist(), [True, False, False])
+
+    def test_filter(self):
+        mask = self.table.where(iso=100, exposure_mode="off")
+        self.assertEqual(mask.tolist(), [True, True, False, False])
+        self.assertEqual(len(self.table[mask]), 2)
+        self.assertEqual(self.table["iso"].tolist(), [100, 100, 200, 200])
+
+    def test_filter_longer_string(self):
+        table = ParameterTable.from_sets([make_set(exposure_mode="night"), make_set(exposure_mode="auto")])
+        self.assertEqual(table.where(exposure_mode="nightpreview").tolist(), [False, False])
+        self.assertEqual(table.where(exposure_mode="night").tolist(), [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
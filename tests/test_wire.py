@@ -0,0 +1,104 @@
+import unittest
+
+from picamera_attributes import wire
+from picamera_attributes.variables import ParameterSet
+
+
+class TestWire(unittest.TestCase):
+
+    def setUp(self):
+        self.param_set = ParameterSet({
+            "zoom": (0, 0, 1, 1), "iso": 100, "shutter_speed": 25000, "exposure_mode": "auto",
+            "awb_mode": "off", "awb_gains": (1.8, 1.5), "analog_gain": 2.5, "resolution": (1280, 960)
+        })
+        self.param_set.validate()
+        self.param_set.cross_verify()
+
+    def test_roundtrip(self):
+        data = self.param_set.pack()
+        self.assertEqual(len(data), wire.RECORD.size)
+        restored = ParameterSet({})
+        restored.restore_bytes(data)
+        self.assertTrue(restored == self.param_set)
+        # shutter_speed is not active under auto exposure
+        self.assertFalse(restored["shutter_speed"]._active)
+        self.assertEqual(restored["awb_gains"].val, "1.8,1.5")
+
+    def test_view(self):
+        data = bytearray(self.param_set.pack())
+        view = wire.WireView(memoryview(data))
+        self.assertEqual(view["iso"], 100)
+        self.assertEqual(view["exposure_mode"], "auto")
+        self.assertEqual(view["zoom"], (0.0, 0.0, 1.0, 1.0))
+        self.assertNotIn("brightness", view)
+        self.assertTrue(view.is_active("iso"))
+        self.assertEqual(sorted(view.keys()), sorted(self.param_set.keys()))
+        with self.assertRaises(KeyError):
+            view["brightness"]
+
+    def test_sparse(self):
+        data = wire.pack(self.param_set, sparse=True)
+        self.assertLess(len(data), wire.RECORD.size)
+        self.assertTrue(wire.unpack(data) == self.param_set)
+
+        view = wire.WireView(data)
+        self.assertEqual(view["awb_gains"], (1.8, 1.5))
+        self.assertEqual(view["resolution"], (1280, 960))
+        self.assertNotIn("brightness", view)
+
+        self.assertEqual(len(wire.pack(ParameterSet({}), sparse=True)), wire.HEADER.size)
+
+    def test_invalid_record(self):
+        data = bytearray(self.param_set.pack())
+        data[2] = wire.VERSION + 1
+        with self.assertRaises(ValueError):
+            wire.unpack(data)
+        with self.assertRaises(ValueError):
+            wire.unpack(b"PA")
+
+    def test_invalid_category(self):
+        self.param_set["exposure_mode"]._value = "foo"
+        with self.assertRaises(ValueError):
+            self.param_set.pack()
+
+    def test_out_of_bounds(self):
+        data = bytearray(self.param_set.pack())
+        field = wire.FIELDS_BY_NAME["analog_gain"]
+        field.struct.pack_into(data, field.offset, 1e9)
+        with self.assertRaises(ValueError):
+            ParameterSet({}).restore_bytes(data)
+        with self.assertRaises(ValueError):
+            wire.WireView(data)["analog_gain"]
+
+    def test_invalid_code(self):
+        data = bytearray(self.param_set.pack())
+        field = wire.FIELDS_BY_NAME["exposure_mode"]
+        field.struct.pack_into(data, field.offset, 200)
+        with self.assertRaises(ValueError):
+            wire.unpack(data)
+
+    def test_plural_out_of_bounds(self):
+        data = bytearray(self.param_set.pack())
+        field = wire.FIELDS_BY_NAME["zoom"]
+        field.struct.pack_into(data, field.offset, 0.0, 0.0, 2.0, 1.0)
+        with self.assertRaises(ValueError):
+            wire.unpack(data)
+
+    def test_pack_plural_out_of_bounds(self):
+        # validate keeps the plural active, pack refuses it as unpack would
+        param_set = ParameterSet({"zoom": (0, 0, 2, 1)})
+        param_set.validate()
+        self.assertTrue(param_set["zoom"]._active)
+        with self.assertRaises(ValueError):
+            wire.pack(param_set)
+        with self.assertRaises(ValueError):
+            wire.pack(param_set, sparse=True)
+
+        # every record pack writes is read back
+        param_set = ParameterSet({"zoom": (0, 0, 0.5, 1)})
+        param_set.validate()
+        self.assertTrue(wire.unpack(wire.pack(param_set, sparse=True)) == param_set)
+
+
+if __name__ == '__main__':
+    unittest.main()